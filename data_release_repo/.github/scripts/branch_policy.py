@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+分支策略批量检查 - 合并 check_branch_naming.py 和 check_pr_target.py 的规则
+
+所有命名规则在加载时编译为一个带命名分组的正则，PR目标规则预先展开为集合，
+一个进程内可以检查任意数量的分支，适合作为服务端钩子处理自动化工具的批量推送。
+
+用法:
+  branch_policy.py                      pre-receive钩子模式，stdin每行 "<old-sha> <new-sha> <refname>"
+  branch_policy.py --pr                 stdin每行 "<source_branch> <target_branch>"
+  branch_policy.py --pr <source> <target>
+"""
+
+import re
+import sys
+import time
+import argparse
+from typing import Dict, FrozenSet, List, Tuple
+
+from check_branch_naming import get_branch_naming_rules, get_suggestions
+from check_pr_target import get_valid_pr_targets, get_branch_type
+
+BRANCH_REF_PREFIX = 'refs/heads/'
+
+
+class BranchPolicy:
+    """预编译的分支命名和PR目标规则"""
+
+    def __init__(self):
+        rules = get_branch_naming_rules()
+        self.rule_descriptions = [description for _, description in rules]
+        # 每条规则去掉首尾锚点后放入命名分组 r<i>，一次匹配即可得到命中的规则
+        alternatives = '|'.join(f"(?P<r{i}>{pattern.lstrip('^').rstrip('$')})"
+                                for i, (pattern, _) in enumerate(rules))
+        self.naming_pattern = re.compile(f"^(?:{alternatives})$")
+        self.pr_targets: Dict[str, FrozenSet[str]] = {
+            source_type: frozenset(targets) for source_type, targets in get_valid_pr_targets().items()}
+
+    def check_branch_name(self, branch_name: str) -> Tuple[bool, str]:
+        """验证分支名称，返回值与 check_branch_naming.validate_branch_name 相同"""
+        if not branch_name:
+            return False, "分支名称不能为空"
+        match = self.naming_pattern.match(branch_name)
+        if match is None:
+            return False, "分支名称不符合任何命名规范"
+        return True, f"匹配规则: {self.rule_descriptions[int(match.lastgroup[1:])]}"
+
+    def check_pr_target(self, source_branch: str, target_branch: str) -> Tuple[bool, str]:
+        """验证PR目标分支，返回值与 check_pr_target.validate_pr_target 相同"""
+        source_type = get_branch_type(source_branch)
+        target_type = get_branch_type(target_branch)
+
+        allowed_targets = self.pr_targets.get(source_type)
+        if allowed_targets is None:
+            return False, f"未知的源分支类型: {source_type}"
+
+        # 特殊处理：develop可以合并到任何release分支
+        if source_type == 'develop' and target_type == 'release':
+            return True, f"develop分支可以合并到release分支"
+
+        if target_branch in allowed_targets or target_type in allowed_targets:
+            return True, f"合法的PR目标: {source_type} -> {target_branch}"
+
+        return False, f"不允许的PR目标: {source_type}分支不能合并到{target_branch}"
+
+    def check_ref_update(self, old_sha: str, new_sha: str, refname: str) -> Tuple[bool, str]:
+        """
+        检查一条pre-receive引用更新
+
+        只检查分支的创建和更新；删除分支、Tag及其他引用直接通过
+        """
+        if not refname.startswith(BRANCH_REF_PREFIX):
+            return True, "非分支引用"
+        if new_sha.strip('0') == '':
+            return True, "删除分支"
+        return self.check_branch_name(refname[len(BRANCH_REF_PREFIX):])
+
+    def check_pr(self, source_branch: str, target_branch: str) -> List[str]:
+        """检查PR的源分支命名和目标分支，返回错误信息列表"""
+        errors = []
+        is_valid, message = self.check_branch_name(source_branch)
+        if not is_valid:
+            errors.append(f"{source_branch}: {message}")
+        is_valid, message = self.check_pr_target(source_branch, target_branch)
+        if not is_valid:
+            errors.append(message)
+        return errors
+
+
+def _parse_lines(lines, fields: int) -> List[List[str]]:
+    """按空白切分stdin中的非空行，字段数不符时报错退出"""
+    records = []
+    for number, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != fields:
+            print(f"❌ 第{number}行格式错误: {line.rstrip()}")
+            sys.exit(1)
+        records.append(parts)
+    return records
+
+
+def run_pre_receive(policy: BranchPolicy, lines) -> int:
+    """pre-receive钩子模式，返回被拒绝的引用数"""
+    started = time.perf_counter()
+    updates = _parse_lines(lines, 3)
+    rejected = 0
+    for old_sha, new_sha, refname in updates:
+        is_valid, message = policy.check_ref_update(old_sha, new_sha, refname)
+        if not is_valid:
+            rejected += 1
+            print(f"❌ {refname}: {message}")
+            for suggestion in get_suggestions(refname[len(BRANCH_REF_PREFIX):]):
+                print(f"   • {suggestion}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if rejected:
+        print(f"\n📋 有效的分支命名规范:")
+        for description in policy.rule_descriptions:
+            print(f"   • {description}")
+        print(f"❌ {len(updates)} 个引用更新中 {rejected} 个不符合分支规范 ({elapsed_ms:.1f}ms)")
+    else:
+        print(f"✅ {len(updates)} 个引用更新通过分支规范检查 ({elapsed_ms:.1f}ms)")
+    return rejected
+
+
+def run_pr_checks(policy: BranchPolicy, pairs: List[List[str]]) -> int:
+    """PR批量检查模式，返回未通过的PR数"""
+    started = time.perf_counter()
+    failed = 0
+    for source_branch, target_branch in pairs:
+        errors = policy.check_pr(source_branch, target_branch)
+        if errors:
+            failed += 1
+            print(f"❌ {source_branch} → {target_branch}")
+            for error in errors:
+                print(f"   • {error}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if failed:
+        print(f"❌ {len(pairs)} 个PR中 {failed} 个不符合分支规范 ({elapsed_ms:.1f}ms)")
+    else:
+        print(f"✅ {len(pairs)} 个PR通过分支规范检查 ({elapsed_ms:.1f}ms)")
+    return failed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="分支命名和PR目标批量检查")
+    parser.add_argument('--pr', action='store_true', help='检查PR的源分支和目标分支')
+    parser.add_argument('branches', nargs='*', help='--pr 时的 <source_branch> <target_branch>，省略时从stdin读取')
+    args = parser.parse_args()
+
+    policy = BranchPolicy()
+    if args.pr:
+        if args.branches and len(args.branches) != 2:
+            parser.error("--pr 需要 <source_branch> <target_branch> 两个参数")
+        pairs = [args.branches] if args.branches else _parse_lines(sys.stdin, 2)
+        failed = run_pr_checks(policy, pairs)
+    elif args.branches:
+        parser.error("pre-receive模式从stdin读取引用更新，不接受位置参数")
+    else:
+        failed = run_pre_receive(policy, sys.stdin)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
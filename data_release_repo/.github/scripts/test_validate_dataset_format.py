@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+validate_dataset_format 的回归测试：内存验证与流式验证对同一文件报告相同的错误
+
+运行: python -m pytest data_release_repo/.github/scripts/test_validate_dataset_format.py
+"""
+
+import os
+import re
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import validate_dataset_format as vdf
+
+BUNDLE_VERSION = "v1.0.0-20250101-120000"
+
+
+def _meta(**overrides):
+    meta = {
+        "release_name": "r",
+        "consumer_version": "v1.0.0",
+        "bundle_versions": [BUNDLE_VERSION],
+        "created_at": "2025-01-01",
+        "description": "d",
+        "version": "v1.0.0",
+    }
+    meta.update(overrides)
+    return meta
+
+
+def _entry(name, **overrides):
+    entry = {"name": name, "obs_path": f"obs://b/{name}", "bundle_versions": [], "duplicate": 1}
+    entry.update(overrides)
+    return entry
+
+
+def _normalize(errors):
+    """去掉流式验证特有的偏移信息；重复名称只比较名称集合"""
+    normalized = []
+    for error in errors:
+        if error.startswith("数据集名称重复"):
+            names = re.findall(r"'([^']*)'", error) or re.findall(r"(?:: |, )([^(,:]+)\(偏移", error)
+            normalized.append(("duplicates", tuple(sorted(names))))
+        else:
+            normalized.append(re.sub(r"\(偏移[\d, ]+\)", "", error))
+    return sorted(normalized, key=str)
+
+
+def _validate_both(tmp_path, document):
+    path = tmp_path / "x_training_dataset.json"
+    path.write_text(json.dumps(document, indent=1), encoding="utf-8")
+    return (vdf.validate_dataset_file(str(path), stream=False),
+            vdf.validate_dataset_file(str(path), stream=True))
+
+
+@pytest.mark.parametrize("document", [
+    {"meta": _meta(version="v1.1.0", status="completed"),
+     "dataset_index": [_entry("a", duplicate=0), _entry("a", obs_path=""), _entry("b", status="pending"),
+                       _entry("a"), _entry("c", status="bad")]},
+    {"meta": _meta()},
+    {"dataset_index": 5},
+    [1],
+    {"meta": {"version": 3}, "dataset_index": []},
+])
+def test_memory_and_streaming_report_same_errors(tmp_path, document):
+    in_memory, streaming = _validate_both(tmp_path, document)
+    assert in_memory
+    assert _normalize(in_memory) == _normalize(streaming)
+
+
+def test_duplicates_found_past_bloom_threshold(tmp_path, monkeypatch):
+    """名称数超过Bloom阈值后，内存验证仍能报告阈值之后出现的重复名称"""
+    monkeypatch.setattr(vdf, "BLOOM_THRESHOLD", 10)
+    names = [str(i) for i in range(50)] + ["5"]
+    document = {"meta": _meta(), "dataset_index": [_entry(name) for name in names]}
+
+    in_memory, streaming = _validate_both(tmp_path, document)
+    assert _normalize(in_memory) == [("duplicates", ("5",))]
+    assert _normalize(in_memory) == _normalize(streaming)
@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 """
 验证提交信息格式是否符合结构化规范
+
+默认验证最新提交；--range 验证提交范围内的所有提交（如合并请求的 origin/main..HEAD）：
+一次 git log 取出全部提交信息和变更文件列表（NUL分隔），提交较多时分发到进程池并行解析和验证。
 """
 
 import os
 import re
 import sys
+import argparse
 import subprocess
-from typing import Dict, List, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
 import yaml
 
+# 提交数不少于该值时使用进程池
+PARALLEL_THRESHOLD = 64
+# git log 输出中每个提交以该字符开头，提交内的哈希、提交信息和文件名以NUL分隔
+RECORD_SEPARATOR = '\x1e'
+
 def get_latest_commit_message() -> str:
     """获取最新的提交信息"""
     try:
@@ -142,6 +152,63 @@ def validate_data_operation_commit(parsed: Dict[str, Any]) -> List[str]:
     
     return errors
 
+def find_dataset_files(changed_files: List[str]) -> List[str]:
+    """变更文件中的训练数据集文件"""
+    return [f for f in changed_files if 'training_dataset' in f and f.endswith('.json')]
+
+def validate_commit(message: str, changed_files: List[str]) -> List[str]:
+    """验证单个提交的信息，changed_files为该提交修改的文件"""
+    parsed = parse_commit_message(message)
+    errors = validate_commit_structure(parsed)
+    errors.extend(validate_data_operation_commit(parsed))
+    
+    # 修改了数据集文件的提交应该有结构化信息
+    if find_dataset_files(changed_files) and not parsed.get("yaml_body"):
+        errors.append("修改数据集文件的提交必须包含结构化的YAML信息")
+    return errors
+
+def collect_commits(commit_range: str) -> List[Dict[str, Any]]:
+    """
+    一次 git log 取出范围内所有提交的哈希、提交信息和变更文件
+    
+    Returns:
+        [{'sha', 'message', 'files'}, ...]，按git log顺序（新提交在前）
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'log', '-z', '--name-only', '--format=%x1e%H%x00%B%x00', commit_range, '--'],
+            capture_output=True,
+            check=True
+        )
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 获取提交范围失败: {commit_range}: {e.stderr.decode('utf-8', 'replace').strip()}")
+        sys.exit(1)
+    
+    commits = []
+    for record in result.stdout.decode('utf-8', 'replace').split(RECORD_SEPARATOR):
+        if not record:
+            continue
+        sha, message, files = record.split('\0', 2)
+        commits.append({
+            'sha': sha,
+            'message': message.strip(),
+            'files': [f.strip('\n') for f in files.split('\0') if f.strip('\n')]
+        })
+    return commits
+
+def _validate_commit_record(commit: Dict[str, Any]) -> List[str]:
+    return validate_commit(commit['message'], commit['files'])
+
+def validate_commits(commits: List[Dict[str, Any]], workers: Optional[int] = None) -> List[List[str]]:
+    """验证多个提交，返回与commits一一对应的错误列表"""
+    workers = workers or os.cpu_count() or 1
+    if len(commits) < PARALLEL_THRESHOLD or workers <= 1:
+        return [_validate_commit_record(commit) for commit in commits]
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_validate_commit_record, commits,
+                                 chunksize=max(1, len(commits) // (workers * 4))))
+
 def check_commit_file_changes() -> List[str]:
     """检查提交是否修改了训练数据集文件"""
     try:
@@ -153,36 +220,79 @@ def check_commit_file_changes() -> List[str]:
         )
         changed_files = result.stdout.strip().split('\n')
         
-        dataset_files = [f for f in changed_files if 'training_dataset' in f and f.endswith('.json')]
-        return dataset_files
+        return find_dataset_files(changed_files)
     except subprocess.CalledProcessError:
         return []
 
+def print_format_example():
+    """输出标准提交信息格式示例"""
+    print("\n💡 标准格式示例:")
+    print("""
+对收费站场景数据进行质量清洗
+
+date: "2025-09-23"
+type: "modify(clean)"
+description: "对收费站场景数据进行质量清洗"
+task_tag: "TASK-12345"
+details:
+  dataset: "toll_station_scenarios_v2"
+  total_clips_before: 150000
+  clips_removed: 15000
+  clips_after: 135000
+  quality_threshold: 0.95
+    """)
+
+def validate_range(commit_range: str, workers: Optional[int] = None):
+    """验证提交范围内的所有提交并逐个报告"""
+    commits = collect_commits(commit_range)
+    if not commits:
+        print(f"ℹ️  提交范围 {commit_range} 中没有提交")
+        return
+    
+    print(f"🔍 验证 {len(commits)} 个提交: {commit_range}")
+    failed = 0
+    for commit, errors in zip(commits, validate_commits(commits, workers)):
+        title = commit['message'].split('\n')[0]
+        if errors:
+            failed += 1
+            print(f"❌ {commit['sha'][:8]} {title}")
+            for error in errors:
+                print(f"   • {error}")
+        else:
+            print(f"✅ {commit['sha'][:8]} {title}")
+    
+    print(f"\n=== 验证完成 ===")
+    print(f"检查提交数: {len(commits)}")
+    print(f"未通过提交数: {failed}")
+    if failed:
+        print_format_example()
+        sys.exit(1)
+    print("🎉 所有提交信息验证通过!")
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="验证提交信息格式")
+    parser.add_argument('--range', dest='commit_range',
+                        help='验证提交范围内的所有提交 (如: origin/main..HEAD)，默认只验证最新提交')
+    parser.add_argument('--workers', type=int, help='--range 的并行进程数 (默认: CPU核数)')
+    args = parser.parse_args()
+    
     print("=== 提交信息格式验证 ===")
     
+    if args.commit_range:
+        validate_range(args.commit_range, args.workers)
+        return
+    
     # 获取提交信息
     commit_message = get_latest_commit_message()
     print(f"📝 提交信息:\n{commit_message}\n")
     
-    # 解析提交信息
-    parsed = parse_commit_message(commit_message)
-    
-    # 验证结构
-    errors = validate_commit_structure(parsed)
-    
-    # 额外的数据操作验证
-    errors.extend(validate_data_operation_commit(parsed))
-    
     # 检查文件变更
     changed_dataset_files = check_commit_file_changes()
     if changed_dataset_files:
         print(f"📁 修改了数据集文件: {changed_dataset_files}")
-        
-        # 如果修改了数据集文件，提交应该有结构化信息
-        if not parsed.get("yaml_body"):
-            errors.append("修改数据集文件的提交必须包含结构化的YAML信息")
+    
+    errors = validate_commit(commit_message, changed_dataset_files)
     
     # 输出结果
     if errors:
@@ -190,22 +300,7 @@ def main():
         for error in errors:
             print(f"   • {error}")
         
-        print("\n💡 标准格式示例:")
-        print("""
-对收费站场景数据进行质量清洗
-
-date: "2025-09-23"
-type: "modify(clean)"
-description: "对收费站场景数据进行质量清洗"
-task_tag: "TASK-12345"
-details:
-  dataset: "toll_station_scenarios_v2"
-  total_clips_before: 150000
-  clips_removed: 15000
-  clips_after: 135000
-  quality_threshold: 0.95
-        """)
-        
+        print_format_example()
         sys.exit(1)
     else:
         print("✅ 提交信息格式验证通过!")
@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 """
 验证训练数据集JSON文件格式
+
+Schema在模块加载时编译一次；文件较多时分发到进程池并行验证。
+CI中可通过 --changed-only 只验证当前分支相对 --base-ref（按merge-base比较）变更过的数据集文件，
+验证脚本本身有变更时仍验证全部文件。
+超大文件（或指定 --stream）逐条流式验证dataset_index，内存占用不随条目数增长。
 """
 
 import json
 import os
+import re
 import sys
-from typing import Dict, List, Any
-from jsonschema import validate, ValidationError
+import math
+import hashlib
+import argparse
+import functools
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
+from jsonschema import Draft7Validator
 
 # 训练数据集JSON Schema
 TRAINING_DATASET_SCHEMA = {
@@ -53,6 +65,97 @@ TRAINING_DATASET_SCHEMA = {
     }
 }
 
+_FAST_TYPES = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+}
+_FAST_KEYWORDS = {'type', 'required', 'properties', 'items', 'enum', 'minimum', 'pattern'}
+
+def compile_fast_check(schema: Dict[str, Any]) -> Optional[Callable[[Any], bool]]:
+    """
+    将schema编译为快速判定函数，只支持本文件用到的关键字子集
+    
+    返回True表示一定通过schema验证；返回False时需要用jsonschema给出具体错误
+    （判定是保守的，不会把无效数据判为通过）。schema包含不支持的关键字时返回None。
+    """
+    if set(schema) - _FAST_KEYWORDS:
+        return None
+    checks: List[Callable[[Any], bool]] = []
+    
+    if 'type' in schema:
+        if schema['type'] not in _FAST_TYPES:
+            return None
+        checks.append(_FAST_TYPES[schema['type']])
+    if 'required' in schema:
+        required = tuple(schema['required'])
+        checks.append(lambda v: not isinstance(v, dict) or all(k in v for k in required))
+    if 'properties' in schema:
+        properties = {}
+        for name, sub_schema in schema['properties'].items():
+            sub_check = compile_fast_check(sub_schema)
+            if sub_check is None:
+                return None
+            properties[name] = sub_check
+        checks.append(lambda v: not isinstance(v, dict) or all(
+            check(v[name]) for name, check in properties.items() if name in v))
+    if 'items' in schema:
+        item_check = compile_fast_check(schema['items'])
+        if item_check is None:
+            return None
+        checks.append(lambda v: not isinstance(v, list) or all(item_check(item) for item in v))
+    if 'enum' in schema:
+        enum = schema['enum']
+        if not all(isinstance(e, str) for e in enum):
+            return None
+        checks.append(lambda v: isinstance(v, str) and v in enum)
+    if 'minimum' in schema:
+        minimum = schema['minimum']
+        checks.append(lambda v: isinstance(v, bool) or not isinstance(v, (int, float)) or v >= minimum)
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+        checks.append(lambda v: not isinstance(v, str) or pattern.search(v) is not None)
+    
+    return lambda v: all(check(v) for check in checks)
+
+# 编译一次，避免每个文件都重新构建validator
+TRAINING_DATASET_VALIDATOR = Draft7Validator(TRAINING_DATASET_SCHEMA)
+
+# 流式验证时逐条使用的子schema
+META_VALIDATOR = Draft7Validator(TRAINING_DATASET_SCHEMA['properties']['meta'])
+ENTRY_VALIDATOR = Draft7Validator(TRAINING_DATASET_SCHEMA['properties']['dataset_index']['items'])
+
+# 快速判定通过时跳过jsonschema，只有可能出错的数据才交给jsonschema生成错误信息
+DATASET_FAST_CHECK = compile_fast_check(TRAINING_DATASET_SCHEMA)
+ENTRY_FAST_CHECK = compile_fast_check(TRAINING_DATASET_SCHEMA['properties']['dataset_index']['items'])
+
+# 超过该大小的文件自动使用流式验证
+STREAM_SIZE_THRESHOLD = 64 * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+# 单个JSON值（如一条dataset_index）的大小上限
+MAX_STREAM_VALUE_SIZE = 16 * 1024 * 1024
+# 名称数超过该值后改用Bloom过滤器检测重复
+BLOOM_THRESHOLD = 1_000_000
+# 估算条目数时使用的单条最小字节数
+MIN_ENTRY_BYTES = 64
+# 流式验证时每个文件最多报告的错误/重复名称/偏移数
+MAX_REPORTED_ERRORS = 1000
+MAX_REPORTED_DUPLICATES = 20
+MAX_REPORTED_OFFSETS = 5
+
+# 遍历时跳过的目录
+SKIP_DIRS = {'.git', '.github', 'node_modules', '__pycache__', '.venv', 'venv'}
+
+# 文件数低于该值时串行验证
+PARALLEL_THRESHOLD = 8
+
+def is_dataset_file(filepath: str) -> bool:
+    """是否为训练数据集JSON文件"""
+    filename = os.path.basename(filepath)
+    return filename.endswith('.json') and 'training_dataset' in filename
+
 def find_dataset_files() -> List[str]:
     """查找所有训练数据集JSON文件"""
     dataset_files = []
@@ -62,34 +165,77 @@ def find_dataset_files() -> List[str]:
         if os.path.exists(filename):
             dataset_files.append(filename)
     
-    # 查找子目录中的数据集文件
+    # 查找子目录中的数据集文件，原地剪枝不需要进入的目录
     for root, dirs, files in os.walk('.'):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
         for file in files:
-            if file.endswith(('.json',)) and 'training_dataset' in file:
-                filepath = os.path.join(root, file)
+            if is_dataset_file(file):
+                filepath = os.path.normpath(os.path.join(root, file))
                 if filepath not in dataset_files:
                     dataset_files.append(filepath)
     
     return dataset_files
 
-def validate_dataset_file(filepath: str) -> List[str]:
-    """验证单个数据集文件"""
+def _git_output(args: List[str]) -> str:
+    return subprocess.run(['git'] + args, capture_output=True, text=True, check=True).stdout
+
+def find_changed_dataset_files(base_ref: str) -> Optional[List[str]]:
+    """
+    查找当前分支相对base_ref变更过的数据集文件（不含已删除的文件）
+    
+    与base_ref和HEAD的merge-base比较（等同 base_ref...HEAD，另含未提交的修改），
+    base_ref上游的新提交不计入。git输出的路径相对仓库根目录，返回的路径相对当前目录，
+    只包含当前目录下的文件（与 find_dataset_files 的范围一致）。
+    
+    Returns:
+        文件列表；git命令失败，或验证脚本/schema本身有变更（需要重新验证全部文件）时返回None
+    """
+    try:
+        merge_base = _git_output(['merge-base', base_ref, 'HEAD']).strip()
+        repo_root = _git_output(['rev-parse', '--show-toplevel']).strip()
+        changed = _git_output(['diff', '--name-only', '--diff-filter=d', merge_base, '--']).splitlines()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"⚠️  无法获取相对 {base_ref} 的变更文件: {e}")
+        return None
+    
+    changed_paths = [os.path.normpath(os.path.join(repo_root, path)) for path in changed]
+    # schema定义在本脚本中，验证规则变化时所有数据集都需要重新验证
+    validator_path = os.path.realpath(__file__)
+    if any(os.path.realpath(path) == validator_path for path in changed_paths):
+        print(f"⚠️  验证脚本相对 {base_ref} 有变更")
+        return None
+    
+    cwd = os.getcwd()
+    return [os.path.relpath(path, cwd) for path in changed_paths
+            if is_dataset_file(path) and os.path.exists(path)
+            and os.path.commonpath([cwd, path]) == cwd]
+
+def validate_dataset_file(filepath: str, stream: Optional[bool] = None) -> List[str]:
+    """
+    验证单个数据集文件
+    
+    Args:
+        filepath: 数据集文件路径
+        stream: 是否使用流式验证，默认文件超过 STREAM_SIZE_THRESHOLD 时自动启用
+    """
     errors = []
     
     try:
+        if stream is None:
+            stream = os.path.getsize(filepath) > STREAM_SIZE_THRESHOLD
+        if stream:
+            return validate_dataset_file_streaming(filepath)
+        
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # 基本schema验证
-        validate(instance=data, schema=TRAINING_DATASET_SCHEMA)
-        
-        # 额外的业务逻辑验证
-        errors.extend(validate_business_logic(data, filepath))
+        # 快速判定通过时整个文档符合schema，直接做业务检查
+        if DATASET_FAST_CHECK is not None and DATASET_FAST_CHECK(data):
+            return validate_business_logic(data, filepath)
+        errors.extend(validate_document_parts(data, filepath))
         
     except json.JSONDecodeError as e:
         errors.append(f"JSON格式错误: {e}")
-    except ValidationError as e:
-        errors.append(f"Schema验证错误: {e.message}")
     except FileNotFoundError:
         errors.append(f"文件不存在: {filepath}")
     except Exception as e:
@@ -97,64 +243,458 @@ def validate_dataset_file(filepath: str) -> List[str]:
     
     return errors
 
-def validate_business_logic(data: Dict[str, Any], filepath: str) -> List[str]:
-    """验证业务逻辑"""
-    errors = []
+class BloomFilter:
+    """定长位数组的Bloom过滤器（双重哈希）"""
     
-    meta = data.get('meta', {})
-    dataset_index = data.get('dataset_index', [])
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.01):
+        expected_items = max(1, expected_items)
+        self.num_bits = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self.bits = bytearray(self.num_bits // 8 + 1)
     
-    # 1. 验证DAgger文件的training_type字段
-    if 'dagger' in filepath and meta.get('training_type') != 'dagger':
-        errors.append("DAgger文件必须设置training_type为'dagger'")
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
     
-    # 2. 验证status字段一致性
-    meta_status = meta.get('status')
-    if meta_status == 'completed':
-        # 如果meta状态为completed，所有dataset应该为produced
-        for idx, dataset in enumerate(dataset_index):
-            if dataset.get('status') not in ['produced', None]:
-                errors.append(f"数据集索引{idx}: meta状态为completed时，所有数据集状态应为produced")
+    def add(self, item: str) -> bool:
+        """加入元素，返回加入前是否(可能)已存在"""
+        present = True
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+class DuplicateNameDetector:
+    """
+    O(n)的数据集名称重复检测
+    
+    名称数不超过bloom_threshold时使用哈希集合精确检测；超过后迁移到Bloom过滤器以限制内存，
+    命中的名称只作为候选，需要调用方再扫描一遍确认。bloom_threshold为None时始终精确检测。
+    """
+    
+    def __init__(self, bloom_threshold: Optional[int] = BLOOM_THRESHOLD, expected_items: int = 0):
+        self.bloom_threshold = bloom_threshold
+        self.expected_items = expected_items
+        self.seen = set()
+        self.bloom: Optional[BloomFilter] = None
+        self.duplicates = set()     # 精确确认的重复名称
+        self.candidates = set()     # Bloom过滤器命中的候选名称
+    
+    def add(self, name: str):
+        if self.bloom is not None:
+            if self.bloom.add(name):
+                self.candidates.add(name)
+            return
+        
+        if name in self.seen:
+            self.duplicates.add(name)
+            return
+        self.seen.add(name)
+        if self.bloom_threshold is not None and len(self.seen) > self.bloom_threshold:
+            self.bloom = BloomFilter(max(self.expected_items, 2 * len(self.seen)))
+            for seen_name in self.seen:
+                self.bloom.add(seen_name)
+            self.seen = set()
+    
+    @property
+    def suspects(self) -> set:
+        """需要确认的名称（精确重复 + Bloom候选）"""
+        return self.duplicates | self.candidates
+
+class DatasetChecker:
+    """
+    训练数据集业务逻辑检查，按meta和单条dataset_index增量执行
+    
+    内存加载和流式验证共用同一套规则。
+    """
+    
+    def __init__(self, filepath: str, max_errors: Optional[int] = None, expected_entries: int = 0,
+                 exact_names: bool = False):
+        """
+        Args:
+            exact_names: 名称去重始终使用哈希集合；内存验证时整个文档已在内存中，
+                不需要Bloom过滤器，也无法像流式验证那样再扫描一遍文件确认候选
+        """
+        self.filepath = filepath
+        self.max_errors = max_errors
+        self.errors: List[str] = []
+        self.error_count = 0
+        self.meta_status = None
+        self.entry_count = 0
+        self.names = DuplicateNameDetector(None if exact_names else BLOOM_THRESHOLD, expected_entries)
+        # meta可能出现在dataset_index之后，completed一致性检查延迟到finish
+        self._not_produced: List[tuple] = []
+        self._not_produced_count = 0
     
-    # 3. 验证obs_path一致性
-    for idx, dataset in enumerate(dataset_index):
+    def add_error(self, message: str):
+        self.error_count += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append(message)
+    
+    @staticmethod
+    def location(idx: int, offset: Optional[int] = None) -> str:
+        return f"数据集索引{idx}" if offset is None else f"数据集索引{idx}(偏移{offset})"
+    
+    def check_meta(self, meta: Dict[str, Any]):
+        """检查meta（DAgger类型、版本号一致性、bundle_versions格式）"""
+        self.meta_status = meta.get('status')
+        
+        # 1. 验证DAgger文件的training_type字段
+        if 'dagger' in self.filepath and meta.get('training_type') != 'dagger':
+            self.add_error("DAgger文件必须设置training_type为'dagger'")
+        
+        # 4. 验证版本号一致性
+        consumer_version = meta.get('consumer_version', '')
+        dataset_version = meta.get('version', '')
+        if consumer_version and dataset_version:
+            # 移除v前缀进行比较
+            consumer_ver = consumer_version.lstrip('v')
+            dataset_ver = dataset_version.lstrip('v')
+            if consumer_ver != dataset_ver:
+                self.add_error(f"consumer_version({consumer_version})和version({dataset_version})不一致")
+        
+        # 5. 验证bundle_versions格式
+        bundle_versions = meta.get('bundle_versions', [])
+        for bundle_version in bundle_versions:
+            if not bundle_version.startswith('v'):
+                self.add_error(f"Bundle版本{bundle_version}应以'v'开头")
+    
+    def check_entry(self, idx: int, dataset: Dict[str, Any], offset: Optional[int] = None):
+        """检查单条dataset_index"""
+        self.entry_count += 1
+        location = self.location(idx, offset)
+        
+        # 2. 记录非produced的数据集，用于meta状态一致性检查
+        if dataset.get('status') not in ['produced', None]:
+            self._not_produced_count += 1
+            if self.max_errors is None or len(self._not_produced) < self.max_errors:
+                self._not_produced.append((idx, offset))
+        
+        # 3. 验证obs_path一致性
         obs_path = dataset.get('obs_path', '')
         status = dataset.get('status', 'produced')
         
         if status == 'produced' and not obs_path:
-            errors.append(f"数据集索引{idx}: 状态为produced时，obs_path不能为空")
+            self.add_error(f"{location}: 状态为produced时，obs_path不能为空")
         elif status == 'pending' and obs_path:
-            errors.append(f"数据集索引{idx}: 状态为pending时，obs_path应为空")
-    
-    # 4. 验证版本号一致性
-    consumer_version = meta.get('consumer_version', '')
-    dataset_version = meta.get('version', '')
-    if consumer_version and dataset_version:
-        # 移除v前缀进行比较
-        consumer_ver = consumer_version.lstrip('v')
-        dataset_ver = dataset_version.lstrip('v')
-        if consumer_ver != dataset_ver:
-            errors.append(f"consumer_version({consumer_version})和version({dataset_version})不一致")
-    
-    # 5. 验证bundle_versions格式
-    bundle_versions = meta.get('bundle_versions', [])
-    for bundle_version in bundle_versions:
-        if not bundle_version.startswith('v'):
-            errors.append(f"Bundle版本{bundle_version}应以'v'开头")
-    
-    # 6. 验证数据集名称唯一性
-    dataset_names = [ds.get('name') for ds in dataset_index]
-    duplicates = [name for name in dataset_names if dataset_names.count(name) > 1]
-    if duplicates:
-        errors.append(f"数据集名称重复: {set(duplicates)}")
+            self.add_error(f"{location}: 状态为pending时，obs_path应为空")
+        
+        # 6. 收集名称用于唯一性检查
+        self.names.add(dataset.get('name'))
     
-    return errors
+    def finish(self, duplicates: Optional[Dict[str, List[int]]] = None) -> List[str]:
+        """
+        完成检查并返回错误列表
+        
+        Args:
+            duplicates: 流式验证确认后的 {重复名称: [偏移, ...]}，为None时使用精确检测结果
+        """
+        if self.meta_status == 'completed':
+            # 如果meta状态为completed，所有dataset应该为produced
+            for idx, offset in self._not_produced:
+                self.add_error(f"{self.location(idx, offset)}: meta状态为completed时，所有数据集状态应为produced")
+            self.error_count += self._not_produced_count - len(self._not_produced)
+        
+        if duplicates is None:
+            if self.names.candidates:
+                raise RuntimeError("名称去重已切换到Bloom过滤器，需要传入确认后的duplicates")
+            if self.names.duplicates:
+                self.add_error(f"数据集名称重复: {self.names.duplicates}")
+        elif duplicates:
+            shown = list(duplicates.items())[:MAX_REPORTED_DUPLICATES]
+            details = ', '.join(f"{name}(偏移{', '.join(map(str, offsets))})" for name, offsets in shown)
+            more = len(duplicates) - len(shown)
+            self.add_error(f"数据集名称重复: {details}" + (f" 等{len(duplicates)}个" if more > 0 else ""))
+        
+        if self.error_count > len(self.errors):
+            self.errors.append(f"... 另有 {self.error_count - len(self.errors)} 个错误未显示")
+        return self.errors
+
+def validate_business_logic(data: Dict[str, Any], filepath: str) -> List[str]:
+    """验证业务逻辑"""
+    checker = DatasetChecker(filepath, exact_names=True)
+    checker.check_meta(data.get('meta', {}))
+    for idx, dataset in enumerate(data.get('dataset_index', [])):
+        checker.check_entry(idx, dataset)
+    return checker.finish()
+
+def validate_document_parts(data: Any, filepath: str) -> List[str]:
+    """
+    分别对meta和每条dataset_index做schema验证，通过验证的部分继续做业务检查
+
+    与 validate_dataset_file_streaming 的处理方式一致，两种模式对同一文件报告相同的错误。
+    """
+    if not isinstance(data, dict):
+        return [f"Schema验证错误: <root>: {error.message}" for error in TRAINING_DATASET_VALIDATOR.iter_errors(data)]
+    
+    checker = DatasetChecker(filepath, exact_names=True)
+    if 'meta' in data:
+        meta_errors = list(META_VALIDATOR.iter_errors(data['meta']))
+        for error in meta_errors:
+            location = '/'.join(str(p) for p in error.absolute_path)
+            checker.add_error(f"Schema验证错误: meta{'/' + location if location else ''}: {error.message}")
+        if not meta_errors:
+            checker.check_meta(data['meta'])
+    
+    if 'dataset_index' in data:
+        dataset_index = data['dataset_index']
+        if not isinstance(dataset_index, list):
+            checker.add_error(f"Schema验证错误: dataset_index: {dataset_index!r} is not of type 'array'")
+            dataset_index = []
+        for idx, dataset in enumerate(dataset_index):
+            entry_errors = []
+            if ENTRY_FAST_CHECK is None or not ENTRY_FAST_CHECK(dataset):
+                entry_errors = list(ENTRY_VALIDATOR.iter_errors(dataset))
+            for error in entry_errors:
+                location = '/'.join(str(p) for p in error.absolute_path)
+                checker.add_error(f"Schema验证错误: dataset_index/{idx}" + (f"/{location}" if location else "")
+                                  + f": {error.message}")
+            if not entry_errors:
+                checker.check_entry(idx, dataset)
+    
+    for required in TRAINING_DATASET_SCHEMA['required']:
+        if required not in data:
+            checker.add_error(f"Schema验证错误: <root>: '{required}' is a required property")
+    return checker.finish()
+
+class StreamFormatError(ValueError):
+    """流式解析时的JSON格式错误，offset为文件中的字符偏移"""
+    
+    def __init__(self, msg: str, offset: int):
+        super().__init__(f"{msg} (偏移{offset})")
+        self.msg = msg
+        self.offset = offset
+
+class JsonStreamReader:
+    """
+    基于 JSONDecoder.raw_decode 的增量JSON读取器
+    
+    按块读取文件，每次只解码一个值并丢弃已消费的缓冲区，offset为字符偏移。
+    """
+    
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.base = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    
+    @property
+    def offset(self) -> int:
+        return self.base + self.pos
+    
+    def _fill(self) -> bool:
+        chunk = self.f.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符，文件结束返回空串"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+    
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buf, self.pos)
+        self.pos += 1
+    
+    def value(self) -> Any:
+        """解码下一个完整的JSON值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # 值被块边界截断时继续读取；单个值过大视为格式错误，避免读入整个文件
+                if len(self.buf) - self.pos > MAX_STREAM_VALUE_SIZE or not self._fill():
+                    raise
+                continue
+            # 顶层数字可能恰好在块边界处被截断
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_dataset_stream(filepath: str):
+    """
+    流式遍历训练数据集文件
+    
+    Yields:
+        ('key', 键名, 值, 偏移)            顶层的普通键（meta等）
+        ('index', 'dataset_index', None, 偏移)  dataset_index数组开始
+        ('entry', 索引, 条目, 偏移)         dataset_index中的单个条目
+        ('root', None, 值, 偏移)            顶层不是对象时的整个值（只会出现这一项）
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        reader = JsonStreamReader(f)
+        try:
+            yield from _walk_dataset_stream(reader)
+        except json.JSONDecodeError as e:
+            raise StreamFormatError(e.msg, reader.base + e.pos) from None
+
+def _walk_dataset_stream(reader: JsonStreamReader):
+    """iter_dataset_stream 的解析主体"""
+    first = reader.peek()
+    if first and first != '{':
+        offset = reader.offset
+        yield 'root', None, reader.value(), offset
+        return
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    
+    while True:
+        key_offset = reader.pos
+        key = reader.value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", reader.buf, key_offset)
+        reader.expect(':')
+        
+        if key == 'dataset_index' and reader.peek() == '[':
+            yield 'index', key, None, reader.offset
+            reader.pos += 1
+            idx = 0
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    offset = reader.offset
+                    yield 'entry', idx, reader.value(), offset
+                    idx += 1
+                    if reader.peek() == ',':
+                        reader.pos += 1
+                        continue
+                    reader.expect(']')
+                    break
+        else:
+            offset = reader.offset
+            yield 'key', key, reader.value(), offset
+        
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        break
+    
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
+
+def _confirm_duplicates(filepath: str, suspects: set) -> Dict[str, List[int]]:
+    """第二遍扫描，精确统计可疑名称的出现位置"""
+    occurrences: Dict[str, List[int]] = {}
+    counts: Dict[str, int] = {}
+    for kind, idx, entry, offset in iter_dataset_stream(filepath):
+        if kind != 'entry' or not isinstance(entry, dict):
+            continue
+        name = entry.get('name')
+        if name in suspects:
+            counts[name] = counts.get(name, 0) + 1
+            if counts[name] <= MAX_REPORTED_OFFSETS:
+                occurrences.setdefault(name, []).append(offset)
+    return {name: occurrences[name] for name, count in counts.items() if count > 1}
+
+def validate_dataset_file_streaming(filepath: str) -> List[str]:
+    """
+    流式验证数据集文件，内存占用与dataset_index条目数无关（名称去重除外）
+    
+    逐条对dataset_index做schema和业务检查，错误带字符偏移；最多报告 MAX_REPORTED_ERRORS 条错误。
+    """
+    expected_entries = os.path.getsize(filepath) // MIN_ENTRY_BYTES
+    checker = DatasetChecker(filepath, max_errors=MAX_REPORTED_ERRORS, expected_entries=expected_entries)
+    present = set()
+    
+    try:
+        for kind, key, value, offset in iter_dataset_stream(filepath):
+            if kind == 'entry':
+                entry_errors = []
+                if ENTRY_FAST_CHECK is None or not ENTRY_FAST_CHECK(value):
+                    entry_errors = list(ENTRY_VALIDATOR.iter_errors(value))
+                for error in entry_errors:
+                    location = '/'.join(str(p) for p in error.absolute_path)
+                    path = f"dataset_index/{key}" + (f"/{location}" if location else "")
+                    checker.add_error(f"Schema验证错误: {path}(偏移{offset}): {error.message}")
+                if not entry_errors:
+                    checker.check_entry(key, value, offset)
+                continue
+            
+            if kind == 'root':
+                return [f"Schema验证错误: <root>: {error.message}"
+                        for error in TRAINING_DATASET_VALIDATOR.iter_errors(value)]
+            
+            present.add(key)
+            if kind == 'key' and key == 'meta':
+                meta_errors = list(META_VALIDATOR.iter_errors(value))
+                for error in meta_errors:
+                    location = '/'.join(str(p) for p in error.absolute_path)
+                    checker.add_error(f"Schema验证错误: meta{'/' + location if location else ''}: {error.message}")
+                if not meta_errors:
+                    checker.check_meta(value)
+            elif kind == 'key' and key == 'dataset_index':
+                checker.add_error(f"Schema验证错误: dataset_index: {value!r} is not of type 'array'")
+    except StreamFormatError as e:
+        return [f"JSON格式错误 (偏移{e.offset}): {e.msg}"]
+    
+    for required in TRAINING_DATASET_SCHEMA['required']:
+        if required not in present:
+            checker.add_error(f"Schema验证错误: <root>: '{required}' is a required property")
+    
+    suspects = checker.names.suspects
+    duplicates = _confirm_duplicates(filepath, suspects) if suspects else {}
+    return checker.finish(duplicates)
+
+def validate_files(dataset_files: List[str], workers: Optional[int] = None,
+                   stream: Optional[bool] = None) -> List[List[str]]:
+    """
+    验证多个数据集文件，文件较多时使用进程池
+    
+    Returns:
+        与dataset_files顺序一致的错误列表
+    """
+    validate = functools.partial(validate_dataset_file, stream=stream)
+    workers = workers or os.cpu_count() or 1
+    if len(dataset_files) < PARALLEL_THRESHOLD or workers <= 1:
+        return [validate(f) for f in dataset_files]
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(dataset_files))) as executor:
+        return list(executor.map(validate, dataset_files))
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="验证训练数据集JSON文件格式")
+    parser.add_argument('--changed-only', action='store_true', help='只验证当前分支相对base-ref(merge-base)变更过的数据集文件')
+    parser.add_argument('--base-ref', default='HEAD~1', help='--changed-only的比较基准 (默认: HEAD~1)')
+    parser.add_argument('--workers', type=int, help='并行进程数 (默认: CPU核数)')
+    parser.add_argument('--stream', action='store_true',
+                        help='对所有文件使用流式验证 (默认仅超过64MB的文件)')
+    args = parser.parse_args()
+    
     print("=== 数据集格式验证 ===")
     
-    dataset_files = find_dataset_files()
+    dataset_files = None
+    if args.changed_only:
+        dataset_files = find_changed_dataset_files(args.base_ref)
+        if dataset_files is not None and not dataset_files:
+            print(f"✅ 相对 {args.base_ref} 没有变更的训练数据集文件")
+            return
+        if dataset_files is None:
+            print("⚠️  回退为验证全部数据集文件")
+    if dataset_files is None:
+        dataset_files = find_dataset_files()
     
     if not dataset_files:
         print("❌ 未找到训练数据集文件")
@@ -162,9 +702,8 @@ def main():
     
     total_errors = 0
     
-    for filepath in dataset_files:
+    for filepath, errors in zip(dataset_files, validate_files(dataset_files, args.workers, True if args.stream else None)):
         print(f"\n📁 验证文件: {filepath}")
-        errors = validate_dataset_file(filepath)
         
         if errors:
             print(f"❌ 发现 {len(errors)} 个错误:")
@@ -185,4 +724,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -5,10 +5,24 @@
 """
 
 import os
+import sys
 import json
 import yaml
 from pathlib import Path
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from stage_snapshot import StageSnapshotCache
+
+def _load_stage_from_snapshot(stage, variant=None):
+    """从阶段快照中获取阶段配置，快照不可用时返回None"""
+    if not os.path.exists('stage_config.yaml'):
+        return None
+    try:
+        return StageSnapshotCache('.').stage_document(stage, variant)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"⚠️  阶段快照不可用: {e}")
+        return None
+
 def get_dataset_config():
     """获取数据集配置，支持阶段化加载"""
     
@@ -29,10 +43,16 @@ def get_dataset_config():
             active_stage = yaml.safe_load(f)
         
         current_stage = active_stage.get('current_stage')
+        current_variant = active_stage.get('current_variant')
         config_file = active_stage.get('config_file')
         
         print(f"📊 当前激活阶段: {current_stage}")
         
+        config = _load_stage_from_snapshot(current_stage, current_variant)
+        if config is not None:
+            print(f"✅ 使用阶段快照: {current_stage}" + (f" ({current_variant})" if current_variant else ""))
+            return config
+        
         if config_file and os.path.exists(config_file):
             print(f"✅ 使用阶段配置文件: {config_file}")
             with open(config_file, 'r', encoding='utf-8') as f:
@@ -42,6 +62,10 @@ def get_dataset_config():
     env_stage = os.getenv('TRAINING_STAGE')
     if env_stage:
         print(f"🌍 环境变量指定阶段: {env_stage}")
+        config = _load_stage_from_snapshot(env_stage, os.getenv('AB_VARIANT'))
+        if config is not None:
+            print(f"✅ 使用环境变量阶段配置(快照): {env_stage}")
+            return config
         stage_file = f"stages/{env_stage}.json"
         if os.path.exists(stage_file):
             print(f"✅ 使用环境变量阶段配置: {stage_file}")
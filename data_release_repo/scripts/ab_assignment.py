@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+A/B变体分配 - 按clip ID的稳定哈希把样本分配到stage_config.yaml中ab_testing的各个变体
+
+  - 分配只取决于 (salt, 数据集名, clip键)：epoch计划中的clip序号是子集索引中的位置，先经 clip_subsetter
+    生成的键索引换算为clip键再哈希，重新抽样子集、改写或重排JSONL都不会改变已有clip的变体
+  - clip键是每条记录ID字段(data_strategy.clip_id_field，默认clip_id)的FNV-1a哈希；缺少ID字段的记录退回使用
+    字节偏移，这部分clip只有在数据集文件只追加时才保持稳定
+  - 哈希映射到[0, 1)后与变体权重的累积分布比较，调整权重时只有边界附近的clip会改变变体
+  - 整个样本索引一次向量化计算：整数ID使用splitmix64，字符串ID逐字节列计算FNV-1a后再经splitmix64混合
+  - 各变体共享同一个计划文件（如 epoch_sampler 生成的 epoch_XXXX.npy），只取各自的位置索引，不复制索引文件
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Any, Sequence
+
+import numpy as np
+
+from stage_snapshot import StageSnapshotCache
+from epoch_sampler import MANIFEST_FILENAME
+from clip_subsetter import load_subset_keys, fnv1a64
+
+_SM_INCREMENT = np.uint64(0x9e3779b97f4a7c15)
+_SM_MUL1 = np.uint64(0xbf58476d1ce4e5b9)
+_SM_MUL2 = np.uint64(0x94d049bb133111eb)
+DEFAULT_AB_STAGE = "ab_testing"
+
+
+def splitmix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64混合函数（uint64向量化，溢出按模2^64回绕）"""
+    z = values.astype(np.uint64) + _SM_INCREMENT
+    z = (z ^ (z >> np.uint64(30))) * _SM_MUL1
+    z = (z ^ (z >> np.uint64(27))) * _SM_MUL2
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_clip_ids(clip_ids, salt: str = "") -> np.ndarray:
+    """
+    计算clip ID的稳定64位哈希
+
+    Args:
+        clip_ids: 整数数组或字符串序列
+        salt: 实验盐值，不同实验的分配相互独立
+    """
+    salt_hash = fnv1a64([salt])[0]
+    ids = np.asarray(clip_ids)
+    if ids.dtype.kind in 'iu':
+        return splitmix64(ids.astype(np.uint64) ^ salt_hash)
+    return splitmix64(fnv1a64([str(v) for v in ids.ravel()]) ^ salt_hash)
+
+
+def unit_interval(hashes: np.ndarray) -> np.ndarray:
+    """把64位哈希映射为[0, 1)的浮点数（取高53位）"""
+    return (hashes >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+class VariantAssigner:
+    """按权重的确定性变体分配器"""
+
+    def __init__(self, variants: Dict[str, float], salt: str = DEFAULT_AB_STAGE):
+        """
+        Args:
+            variants: 变体名 -> 权重（自动归一化）
+            salt: 实验盐值
+        """
+        if not variants:
+            raise ValueError("至少需要一个变体")
+        weights = np.array(list(variants.values()), dtype=np.float64)
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError(f"变体权重必须为非负数且总和大于0: {variants}")
+
+        self.names = list(variants.keys())
+        self.weights = weights / weights.sum()
+        self.salt = salt
+        # 最后一个边界设为无穷，避免浮点误差让u落在分布之外
+        self.boundaries = np.cumsum(self.weights)
+        self.boundaries[-1] = np.inf
+
+    @classmethod
+    def from_stage_config(cls, stage_config: Dict[str, Any], stage: str = DEFAULT_AB_STAGE) -> 'VariantAssigner':
+        """从stage_config.yaml中阶段的variants创建分配器（盐值默认为阶段名，可由ab_salt覆盖）"""
+        stage_def = (stage_config.get('stages') or {}).get(stage)
+        if not stage_def or not stage_def.get('variants'):
+            raise ValueError(f"阶段 {stage} 没有定义variants")
+        variants = {name: variant.get('weight', 1.0) for name, variant in stage_def['variants'].items()}
+        return cls(variants, salt=stage_def.get('ab_salt', stage))
+
+    def variant_id(self, name: str) -> int:
+        if name not in self.names:
+            raise ValueError(f"未知的变体: {name}，可用: {', '.join(self.names)}")
+        return self.names.index(name)
+
+    def assign_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """哈希 -> 变体序号(uint8)"""
+        return np.searchsorted(self.boundaries, unit_interval(hashes), side='right').astype(np.uint8)
+
+    def assign(self, clip_ids) -> np.ndarray:
+        """clip ID -> 变体序号(uint8)"""
+        return self.assign_hashes(hash_clip_ids(clip_ids, self.salt))
+
+    def _clip_hashes(self, dataset_names: List[str], dataset_ids: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        # 每个数据集的名字哈希作为盐值，与clip键组合
+        dataset_salts = hash_clip_ids(dataset_names, self.salt)
+        return splitmix64(dataset_salts[dataset_ids] ^ keys.astype(np.uint64))
+
+    def assign_keys(self, dataset_name: str, keys) -> np.ndarray:
+        """(数据集名, clip键) -> 变体序号(uint8)，与 assign_plan 对同一clip的分配一致"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        return self.assign_hashes(self._clip_hashes([dataset_name], np.zeros(len(keys), dtype=np.intp), keys))
+
+    def assign_record_ids(self, dataset_name: str, record_ids: Sequence[str]) -> np.ndarray:
+        """(数据集名, 记录的clip ID) -> 变体序号(uint8)"""
+        return self.assign_keys(dataset_name, fnv1a64([str(v) for v in record_ids]))
+
+    def assign_plan(self, plan: np.ndarray, dataset_names: List[str],
+                    clip_keys: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        为epoch计划中的每个样本分配变体
+
+        Args:
+            plan: epoch计划，plan['clip'] 为子集索引中的位置
+            dataset_names: 计划manifest中的数据集名，与plan['dataset']对应
+            clip_keys: 各数据集的clip键索引（load_clip_keys），与dataset_names一一对应
+        """
+        if len(clip_keys) != len(dataset_names):
+            raise ValueError(f"键索引数({len(clip_keys)})与数据集数({len(dataset_names)})不一致")
+        if len(plan) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        lengths = np.array([len(keys) for keys in clip_keys], dtype=np.int64)
+        datasets = plan['dataset'].astype(np.intp)
+        clips = plan['clip'].astype(np.int64)
+        if len(plan) and (clips >= lengths[datasets]).any():
+            raise ValueError("计划中的clip序号超出子集索引范围，计划需要基于同一个子集目录生成")
+
+        # 所有数据集的键拼接为一个数组，一次索引完成 位置 -> clip键 的换算
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        all_keys = np.concatenate([np.asarray(keys, dtype=np.uint64) for keys in clip_keys])
+        keys = all_keys[starts[datasets] + clips]
+        return self.assign_hashes(self._clip_hashes(dataset_names, datasets, keys))
+
+    def variant_positions(self, plan: np.ndarray, dataset_names: List[str],
+                          clip_keys: Sequence[np.ndarray], variant: str) -> np.ndarray:
+        """变体在共享计划中的位置索引（按原顺序），训练时以 plan[positions] 读取"""
+        return np.flatnonzero(self.assign_plan(plan, dataset_names, clip_keys) == self.variant_id(variant))
+
+
+def load_clip_keys(subset_dir: str, dataset_names: List[str]) -> List[np.ndarray]:
+    """按数据集顺序加载clip_subsetter生成的键索引（内存映射）"""
+    return [load_subset_keys(subset_dir, name) for name in dataset_names]
+
+
+def main():
+    """命令行接口"""
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='A/B变体分配')
+    parser.add_argument('--repo-root', default=default_root, help='数据仓库根目录')
+    parser.add_argument('--stage', default=DEFAULT_AB_STAGE, help='定义variants的阶段')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    assign_parser = subparsers.add_parser('assign', help='查询clip的变体')
+    assign_parser.add_argument('dataset', help='数据集名称')
+    assign_parser.add_argument('clip_ids', nargs='+', help='记录的clip ID (clip_id_field的值)')
+    assign_parser.add_argument('--by-offset', action='store_true',
+                               help='clip_ids为字节偏移（记录缺少ID字段时的退回方式）')
+
+    split_parser = subparsers.add_parser('split', help='统计epoch计划在各变体间的划分')
+    split_parser.add_argument('plan', help='epoch计划文件 (epoch_sampler生成的 .npy)')
+    split_parser.add_argument('--subset-dir', required=True, help='生成计划时使用的clip_subsetter子集目录')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        cache = StageSnapshotCache(args.repo_root)
+        assigner = VariantAssigner.from_stage_config(cache.stage_config(), args.stage)
+
+        if args.command == 'assign':
+            if args.by_offset:
+                variants = assigner.assign_keys(args.dataset, [int(v) for v in args.clip_ids])
+            else:
+                variants = assigner.assign_record_ids(args.dataset, args.clip_ids)
+            for clip_id, variant in zip(args.clip_ids, variants):
+                print(f"   {args.dataset}@{clip_id} → {assigner.names[variant]}")
+
+        elif args.command == 'split':
+            manifest_path = os.path.join(os.path.dirname(os.path.abspath(args.plan)), MANIFEST_FILENAME)
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                dataset_names = [ds['name'] for ds in json.load(f)['datasets']]
+
+            plan = np.load(args.plan, mmap_mode='r')
+            clip_keys = load_clip_keys(args.subset_dir, dataset_names)
+            counts = np.bincount(assigner.assign_plan(plan, dataset_names, clip_keys),
+                                 minlength=len(assigner.names))
+            print(f"🧪 {args.plan}: {len(plan):,} 个样本 (salt: {assigner.salt})")
+            for name, weight, count in zip(assigner.names, assigner.weights, counts):
+                print(f"   • {name}: {count:,} ({count / max(1, len(plan)):.2%}, 目标 {weight:.2%})")
+
+    except (ValueError, OSError, KeyError) as e:
+        print(f"❌ 执行失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,45 +5,73 @@
 """
 
 import os
-import subprocess
+import time
 import sys
 import argparse
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import json
 
+from git_session import GitSession, GitError
+
+PROTECTED_BRANCHES = ['main', 'develop']
+# 一次取出所有分支的元数据：完整引用名、提交时间戳、显示用提交时间
+REF_FIELDS = ['refname', 'committerdate:unix', 'committerdate:iso']
+
 class BranchManager:
-    def __init__(self):
-        self.repo_root = self._get_repo_root()
-        
-    def _get_repo_root(self) -> str:
-        """获取Git仓库根目录"""
+    def __init__(self, fetch_interval: Optional[float] = None):
         try:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--show-toplevel'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
+            self.git = GitSession(fetch_interval=fetch_interval)
+        except GitError:
             print("❌ 当前目录不是Git仓库")
             sys.exit(1)
+        self.repo_root = self.git.repo_root
+        # 分支元数据缓存，按FETCH_HEAD签名失效（每次fetch后重新收集）
+        self._refs_cache: Optional[Tuple[Optional[Tuple[int, int]], List[Dict[str, any]]]] = None
     
     def _run_git_command(self, cmd: List[str]) -> str:
         """执行Git命令"""
-        try:
-            result = subprocess.run(
-                ['git'] + cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Git命令执行失败: {' '.join(cmd)}")
-            print(f"错误信息: {e.stderr}")
-            return ""
+        return self.git.run(cmd)
+    
+    def invalidate_branch_cache(self):
+        """本地分支发生变化（创建/删除）后清除元数据缓存"""
+        self._refs_cache = None
+    
+    def get_branch_refs(self) -> List[Dict[str, any]]:
+        """
+        用一次 git for-each-ref 收集所有本地和origin远程分支的元数据
+        
+        Returns:
+            [{'name', 'type': local|remote, 'location': local|origin, 'timestamp', 'last_commit'}, ...]
+        """
+        signature = self.git.fetch_signature()
+        if self._refs_cache is not None and self._refs_cache[0] == signature:
+            return self._refs_cache[1]
+        
+        refs = []
+        for fields in self.git.for_each_ref(['refs/heads', 'refs/remotes/origin'], REF_FIELDS):
+            if len(fields) != 3:
+                continue
+            refname, timestamp, last_commit = fields
+            if refname.startswith('refs/heads/'):
+                name, ref_type, location = refname[len('refs/heads/'):], 'local', 'local'
+            else:
+                name, ref_type, location = refname[len('refs/remotes/origin/'):], 'remote', 'origin'
+            if name == 'HEAD':
+                continue
+            refs.append({
+                'name': name,
+                'type': ref_type,
+                'location': location,
+                'timestamp': int(timestamp) if timestamp.isdigit() else 0,
+                'last_commit': last_commit
+            })
+        
+        self._refs_cache = (signature, refs)
+        return refs
+    
+    def _branch_exists(self, branch_name: str) -> bool:
+        """本地或origin上是否已有同名分支"""
+        return any(ref['name'] == branch_name for ref in self.get_branch_refs())
     
     def create_feature_branch(self, topic: str, method: str, base_branch: str = "develop") -> bool:
         """创建功能数据集分支"""
@@ -52,19 +80,19 @@ class BranchManager:
         print(f"🌿 创建功能分支: {branch_name}")
         
         # 检查分支是否已存在
-        existing_branches = self._run_git_command(['branch', '-a'])
-        if branch_name in existing_branches:
+        if self._branch_exists(branch_name):
             print(f"❌ 分支 {branch_name} 已存在")
             return False
         
         # 确保基础分支是最新的
         print(f"📥 更新基础分支: {base_branch}")
-        self._run_git_command(['fetch', 'origin'])
+        self.git.fetch()
         self._run_git_command(['checkout', base_branch])
         self._run_git_command(['pull', 'origin', base_branch])
         
         # 创建新分支
         self._run_git_command(['checkout', '-b', branch_name])
+        self.invalidate_branch_cache()
         
         print(f"✅ 成功创建分支: {branch_name}")
         print(f"💡 现在可以开始进行 {topic} 场景的 {method} 操作")
@@ -78,20 +106,20 @@ class BranchManager:
         print(f"🧪 创建实验分支: {branch_name}")
         
         # 检查分支是否已存在
-        existing_branches = self._run_git_command(['branch', '-a'])
-        if branch_name in existing_branches:
+        if self._branch_exists(branch_name):
             print(f"❌ 分支 {branch_name} 已存在")
             return False
         
         # 确保基础分支是最新的
         print(f"📥 更新基础分支: {base_branch}")
-        self._run_git_command(['fetch', 'origin'])
+        self.git.fetch()
         self._run_git_command(['checkout', base_branch])
         if base_branch != 'main':  # main分支通常是保护的，可能不需要pull
             self._run_git_command(['pull', 'origin', base_branch])
         
         # 创建新分支
         self._run_git_command(['checkout', '-b', branch_name])
+        self.invalidate_branch_cache()
         
         print(f"✅ 成功创建实验分支: {branch_name}")
         print(f"💡 现在可以开始进行 {topic} 的 {trial} 实验")
@@ -109,19 +137,19 @@ class BranchManager:
         print(f"🚀 创建发布分支: {branch_name}")
         
         # 检查分支是否已存在
-        existing_branches = self._run_git_command(['branch', '-a'])
-        if branch_name in existing_branches:
+        if self._branch_exists(branch_name):
             print(f"❌ 分支 {branch_name} 已存在")
             return False
         
         # 确保基础分支是最新的
         print(f"📥 更新基础分支: {base_branch}")
-        self._run_git_command(['fetch', 'origin'])
+        self.git.fetch()
         self._run_git_command(['checkout', base_branch])
         self._run_git_command(['pull', 'origin', base_branch])
         
         # 创建新分支
         self._run_git_command(['checkout', '-b', branch_name])
+        self.invalidate_branch_cache()
         
         print(f"✅ 成功创建发布分支: {branch_name}")
         print(f"💡 请在此分支上准备 {version} 版本的发布")
@@ -132,53 +160,15 @@ class BranchManager:
         """列出长期未更新的分支"""
         print(f"🔍 查找 {days} 天内未更新的分支...")
         
-        self._run_git_command(['fetch', 'origin'])
-        
-        # 获取所有分支及其最后提交时间
-        branches_info = []
-        
-        # 获取本地分支
-        local_branches = self._run_git_command(['branch', '--format=%(refname:short)']).split('\n')
-        for branch in local_branches:
-            if branch and branch not in ['main', 'develop']:
-                last_commit = self._run_git_command(['log', '-1', '--format=%ci', branch])
-                if last_commit:
-                    branches_info.append({
-                        'name': branch,
-                        'type': 'local',
-                        'last_commit': last_commit,
-                        'location': 'local'
-                    })
-        
-        # 获取远程分支
-        remote_branches = self._run_git_command(['branch', '-r', '--format=%(refname:short)']).split('\n')
-        for branch in remote_branches:
-            if branch and 'origin/' in branch:
-                branch_name = branch.replace('origin/', '')
-                if branch_name not in ['main', 'develop', 'HEAD']:
-                    last_commit = self._run_git_command(['log', '-1', '--format=%ci', branch])
-                    if last_commit:
-                        branches_info.append({
-                            'name': branch_name,
-                            'type': 'remote',
-                            'last_commit': last_commit,
-                            'location': 'origin'
-                        })
-        
-        # 过滤出过期的分支
-        cutoff_date = datetime.now() - timedelta(days=days)
-        stale_branches = []
-        
-        for branch_info in branches_info:
-            try:
-                # 解析时间格式: 2025-09-23 10:30:00 +0800
-                commit_date_str = branch_info['last_commit'].split(' +')[0]
-                commit_date = datetime.strptime(commit_date_str, '%Y-%m-%d %H:%M:%S')
-                
-                if commit_date < cutoff_date:
-                    stale_branches.append(branch_info)
-            except ValueError:
-                continue  # 跳过无法解析的日期
+        self.git.fetch()
+        
+        # 按提交时间戳过滤过期分支（本地分支在前，远程分支在后）
+        cutoff = time.time() - days * 86400
+        stale_branches = [
+            ref for ref in self.get_branch_refs()
+            if ref['name'] not in PROTECTED_BRANCHES and ref['timestamp'] < cutoff
+        ]
+        stale_branches.sort(key=lambda ref: ref['type'] != 'local')
         
         return stale_branches
     
@@ -186,22 +176,17 @@ class BranchManager:
         """清理已合并的分支"""
         print("🧹 查找已合并的分支...")
         
-        self._run_git_command(['fetch', 'origin'])
-        
-        # 获取已合并到main的分支
-        merged_to_main = self._run_git_command(['branch', '--merged', 'main']).split('\n')
-        merged_to_main = [b.strip() for b in merged_to_main if b.strip() and not b.strip().startswith('*')]
+        self.git.fetch()
         
-        # 获取已合并到develop的分支
-        merged_to_develop = self._run_git_command(['branch', '--merged', 'develop']).split('\n')
-        merged_to_develop = [b.strip() for b in merged_to_develop if b.strip() and not b.strip().startswith('*')]
-        
-        # 合并列表并去重
-        all_merged = list(set(merged_to_main + merged_to_develop))
+        # 获取已合并到main或develop的本地分支（排除当前分支）
+        current_branch = self._run_git_command(['branch', '--show-current'])
+        all_merged = set()
+        for base in PROTECTED_BRANCHES:
+            merged = self.git.for_each_ref(['refs/heads'], ['refname:short'], merged=base)
+            all_merged.update(fields[0] for fields in merged if fields[0] != current_branch)
         
         # 排除主要分支
-        protected_branches = ['main', 'develop']
-        cleanable_branches = [b for b in all_merged if b not in protected_branches]
+        cleanable_branches = sorted(b for b in all_merged if b not in PROTECTED_BRANCHES)
         
         if not cleanable_branches:
             print("✅ 没有找到可清理的已合并分支")
@@ -217,6 +202,7 @@ class BranchManager:
             for branch in cleanable_branches:
                 print(f"   删除: {branch}")
                 self._run_git_command(['branch', '-d', branch])
+            self.invalidate_branch_cache()
             print("✅ 分支清理完成")
         
         return cleanable_branches
@@ -225,12 +211,11 @@ class BranchManager:
         """获取分支状态信息"""
         print("📊 收集分支状态信息...")
         
-        self._run_git_command(['fetch', 'origin'])
+        self.git.fetch()
         
         current_branch = self._run_git_command(['branch', '--show-current'])
         
-        # 统计各类型分支数量
-        all_branches = self._run_git_command(['branch', '-a']).split('\n')
+        # 统计各类型分支数量（本地和远程分支分别计数）
         branch_types = {
             'feature_dataset': 0,
             'experiment': 0,
@@ -239,10 +224,8 @@ class BranchManager:
             'other': 0
         }
         
-        for branch in all_branches:
-            branch = branch.strip().replace('*', '').strip()
-            if 'origin/' in branch:
-                branch = branch.replace('origin/', '')
+        for ref in self.get_branch_refs():
+            branch = ref['name']
             
             if branch.startswith('feature_dataset/'):
                 branch_types['feature_dataset'] += 1
@@ -252,7 +235,7 @@ class BranchManager:
                 branch_types['release'] += 1
             elif branch.startswith('hotfix/'):
                 branch_types['hotfix'] += 1
-            elif branch and branch not in ['main', 'develop', 'HEAD']:
+            elif branch and branch not in PROTECTED_BRANCHES:
                 branch_types['other'] += 1
         
         # 检查工作目录状态
@@ -276,6 +259,7 @@ class BranchManager:
 
 def main():
     parser = argparse.ArgumentParser(description='分支管理工具')
+    parser.add_argument('--fetch-interval', type=float, help='距上次fetch不足该秒数时跳过fetch (默认: $DRR_GIT_FETCH_INTERVAL 或 300)')
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
     
     # 创建功能分支
@@ -313,7 +297,7 @@ def main():
         parser.print_help()
         return
     
-    manager = BranchManager()
+    manager = BranchManager(args.fetch_interval)
     
     if args.command == 'create-feature':
         manager.create_feature_branch(args.topic, args.method, args.base)
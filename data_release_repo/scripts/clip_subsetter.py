@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Clip子集生成 - 按data_strategy的max/min_clips_per_dataset对每个数据集的JSONL做单遍水库抽样
+
+  - 每行一个clip，clip由其在JSONL中的字节偏移定位；索引只保存选中行的偏移(uint64)，按文件顺序排列
+  - 抽样完成后只读取选中行的ID字段(data_strategy.clip_id_field，默认clip_id)，计算稳定的clip键供A/B分配使用；
+    缺少ID字段的行退回以字节偏移作为键，只有数据集文件只追加时才稳定
+  - 换行符定位在4MB块上向量化完成，不解析JSON；抽样使用Algorithm L，只在被选中的位置执行Python代码
+  - 内存占用与max_clips_per_dataset成正比，与数据集大小无关；随机数由 (seed, 数据集名) 派生，结果可复现
+  - 数据集clips少于min_clips_per_dataset时在manifest中标记，--strict 时视为失败
+
+输出目录 (默认 subsets/<stage>[_<variant>]/):
+  <dataset>.npy     选中clip的字节偏移，训练时第k个clip位于 offsets[k]
+  <dataset>.ids.npy 选中clip的键(uint64)，与偏移一一对应：ID字段的FNV-1a哈希，缺少ID时为字节偏移
+  manifest.json     各数据集的总clips数、选中数、限制值和源文件签名，源文件与限制未变化时跳过重新抽样
+
+EpochSampler 可通过 load_subset_counts 使用子集的clip数代替 metadata.estimated_clips。
+"""
+
+import os
+import sys
+import json
+import zlib
+import argparse
+from typing import Dict, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from stage_snapshot import StageSnapshotCache
+from jsonl_reader import resolve_obs_path
+
+SUBSET_MANIFEST_FILENAME = "manifest.json"
+DEFAULT_CLIP_ID_FIELD = "clip_id"
+FNV_OFFSET_BASIS = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+SCAN_CHUNK_SIZE = 4 << 20
+NEWLINE = 10
+
+
+def iter_line_offsets(path: str, chunk_size: int = SCAN_CHUNK_SIZE):
+    """按块生成文件中非空行的起始偏移数组（uint64）"""
+    position = 0
+    pending_start = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == NEWLINE).astype(np.uint64)
+            if len(newlines):
+                newlines += np.uint64(position)
+                starts = np.concatenate((np.array([pending_start], dtype=np.uint64), newlines[:-1] + np.uint64(1)))
+                yield starts[newlines > starts]
+                pending_start = int(newlines[-1]) + 1
+            position += len(chunk)
+    if pending_start < position:
+        yield np.array([pending_start], dtype=np.uint64)
+
+
+def fnv1a64(values: Sequence[str]) -> np.ndarray:
+    """对字符串ID批量计算64位FNV-1a（按字节列向量化，循环次数为最长ID的字节数）"""
+    encoded = np.array([str(v).encode('utf-8') for v in values], dtype=bytes)
+    if encoded.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    width = encoded.dtype.itemsize
+    columns = encoded.view(np.uint8).reshape(len(encoded), width)
+    lengths = np.char.str_len(encoded)
+
+    hashes = np.full(len(encoded), FNV_OFFSET_BASIS, dtype=np.uint64)
+    for i in range(width):
+        active = lengths > i
+        mixed = (hashes ^ columns[:, i].astype(np.uint64)) * FNV_PRIME
+        hashes = np.where(active, mixed, hashes)
+    return hashes
+
+
+def read_clip_keys(path: str, offsets: np.ndarray, id_field: str = DEFAULT_CLIP_ID_FIELD) -> Tuple[np.ndarray, int]:
+    """
+    读取各偏移处clip的ID字段并计算clip键
+
+    Returns:
+        (与offsets一一对应的键(uint64), 缺少ID字段的clip数)；缺少ID或行无法解析时以字节偏移作为键
+    """
+    offsets = np.asarray(offsets, dtype=np.uint64)
+    ids = []
+    missing = np.zeros(len(offsets), dtype=bool)
+    with open(path, 'rb') as f:
+        # 偏移按文件顺序排列，相邻行的seek落在同一个读缓冲内
+        for i, offset in enumerate(offsets):
+            f.seek(int(offset))
+            try:
+                value = json.loads(f.readline()).get(id_field)
+            except (ValueError, AttributeError):
+                value = None
+            if value is None or value == '':
+                missing[i] = True
+                value = ''
+            ids.append(str(value))
+    keys = fnv1a64(ids)
+    keys[missing] = offsets[missing]
+    return keys, int(missing.sum())
+
+
+class ReservoirSampler:
+    """Algorithm L 水库抽样（从未知长度的序列中等概率选取k个元素）"""
+
+    def __init__(self, k: int, rng: np.random.Generator):
+        self.k = k
+        self.rng = rng
+        self.reservoir = np.empty(k, dtype=np.uint64)
+        self.seen = 0
+        self.filled = 0
+        self._w = 1.0
+        self._next = 0
+
+    def _advance(self):
+        self._w *= np.exp(np.log(self.rng.random()) / self.k)
+        # 跳过的元素个数服从几何分布
+        self._next += int(np.floor(np.log(self.rng.random()) / np.log1p(-self._w))) + 1
+
+    def feed(self, items: np.ndarray):
+        """按顺序输入一批元素"""
+        count = len(items)
+        if self.filled < self.k:
+            take = min(self.k - self.filled, count)
+            self.reservoir[self.filled:self.filled + take] = items[:take]
+            self.filled += take
+            if self.filled == self.k:
+                self._next = self.seen + take - 1
+                self._advance()
+
+        end = self.seen + count
+        while self.filled == self.k and self._next < end:
+            self.reservoir[self.rng.integers(self.k)] = items[self._next - self.seen]
+            self._advance()
+        self.seen = end
+
+    def result(self) -> np.ndarray:
+        """选中的元素（按原顺序排列）"""
+        return np.sort(self.reservoir[:self.filled])
+
+
+def subset_dataset(path: str, max_clips: Optional[int], seed: int, name: str) -> Dict[str, Any]:
+    """
+    对单个JSONL文件抽样
+
+    Returns:
+        {'offsets': 选中行的偏移, 'total_clips': 总行数}；max_clips为空时选中全部行
+    """
+    if not max_clips:
+        offsets = list(iter_line_offsets(path))
+        selected = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.uint64)
+        return {'offsets': selected, 'total_clips': len(selected)}
+
+    sampler = ReservoirSampler(int(max_clips), np.random.default_rng([seed, zlib.crc32(name.encode('utf-8'))]))
+    for starts in iter_line_offsets(path):
+        sampler.feed(starts)
+    return {'offsets': sampler.result(), 'total_clips': sampler.seen}
+
+
+def load_subset_manifest(subset_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(subset_dir, SUBSET_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_subset_counts(subset_dir: str) -> Dict[str, int]:
+    """子集中各数据集的clip数 {name: selected}，可作为 EpochSampler 的 clip_counts"""
+    return {name: entry['selected'] for name, entry in load_subset_manifest(subset_dir).get('datasets', {}).items()}
+
+
+def load_subset_offsets(subset_dir: str, dataset: str) -> np.ndarray:
+    """以只读内存映射打开数据集的clip偏移索引"""
+    return np.load(os.path.join(subset_dir, f"{dataset}.npy"), mmap_mode='r')
+
+
+def load_subset_keys(subset_dir: str, dataset: str) -> np.ndarray:
+    """以只读内存映射打开数据集的clip键索引（与偏移索引一一对应）"""
+    return np.load(os.path.join(subset_dir, f"{dataset}.ids.npy"), mmap_mode='r')
+
+
+def read_clip(path: str, offset: int) -> bytes:
+    """读取偏移处的一行"""
+    with open(path, 'rb') as f:
+        f.seek(int(offset))
+        return f.readline()
+
+
+class ClipSubsetter:
+    """按阶段data_strategy生成各数据集的clip子集"""
+
+    def __init__(self, repo_root: str, stage: str, variant: Optional[str] = None,
+                 local_root: Optional[str] = None, output_dir: Optional[str] = None):
+        self.repo_root = os.path.abspath(repo_root)
+        self.stage = stage
+        self.variant = variant
+        self.local_root = local_root
+        self.output_dir = output_dir or os.path.join(
+            self.repo_root, 'subsets', stage + (f"_{variant}" if variant else ""))
+
+        document = StageSnapshotCache(self.repo_root).stage_document(stage, variant)
+        if document is None:
+            raise ValueError(f"阶段配置不可用: {stage}" + (f" ({variant})" if variant else ""))
+        self.document = document
+        strategy = document.get('meta', {}).get('stage_config', {}).get('data_strategy', {})
+        self.max_clips = strategy.get('max_clips_per_dataset')
+        self.min_clips = strategy.get('min_clips_per_dataset', 0)
+        self.seed = int(strategy.get('seed', 0))
+        self.id_field = strategy.get('clip_id_field', DEFAULT_CLIP_ID_FIELD)
+
+    def build(self, force: bool = False, progress: bool = True) -> Dict[str, Any]:
+        """生成所有启用数据集的子集，返回manifest"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        previous = load_subset_manifest(self.output_dir).get('datasets', {})
+        manifest = {
+            'stage': self.stage,
+            'variant': self.variant,
+            'seed': self.seed,
+            'max_clips_per_dataset': self.max_clips,
+            'min_clips_per_dataset': self.min_clips,
+            'clip_id_field': self.id_field,
+            'datasets': {}
+        }
+
+        for dataset in self.document.get('dataset_index', []):
+            if not dataset.get('enabled', True) or not dataset.get('obs_path'):
+                continue
+            name = dataset['name']
+            path = resolve_obs_path(dataset['obs_path'], self.local_root)
+            stat = os.stat(path)
+            source = [stat.st_size, stat.st_mtime_ns]
+            index_file = f"{name}.npy"
+            keys_file = f"{name}.ids.npy"
+
+            cached = previous.get(name)
+            if (not force and cached and cached['source'] == source and cached['max_clips'] == self.max_clips
+                    and cached['seed'] == self.seed and cached.get('id_field') == self.id_field
+                    and os.path.exists(os.path.join(self.output_dir, index_file))
+                    and os.path.exists(os.path.join(self.output_dir, keys_file))):
+                entry = dict(cached)
+            else:
+                result = subset_dataset(path, self.max_clips, self.seed, name)
+                keys, missing_ids = read_clip_keys(path, result['offsets'], self.id_field)
+                self._write_index(index_file, result['offsets'])
+                self._write_index(keys_file, keys)
+                entry = {
+                    'file': index_file,
+                    'keys_file': keys_file,
+                    'id_field': self.id_field,
+                    'missing_ids': missing_ids,
+                    'obs_path': dataset['obs_path'],
+                    'source': source,
+                    'seed': self.seed,
+                    'max_clips': self.max_clips,
+                    'total_clips': int(result['total_clips']),
+                    'selected': int(len(result['offsets']))
+                }
+            entry['below_min'] = entry['total_clips'] < self.min_clips
+            manifest['datasets'][name] = entry
+
+            if progress:
+                icon = "⚠️ " if entry['below_min'] else "✅"
+                print(f"   {icon} {name}: {entry['selected']:,} / {entry['total_clips']:,} clips")
+                if entry['missing_ids']:
+                    print(f"      ⚠️  {entry['missing_ids']:,} 个clip缺少 {self.id_field} 字段，以字节偏移作为键")
+
+        self._save_manifest(manifest)
+        return manifest
+
+    def _write_index(self, index_file: str, offsets: np.ndarray):
+        path = os.path.join(self.output_dir, index_file)
+        tmp_path = os.path.join(self.output_dir, f".{index_file}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, offsets.astype(np.uint64))
+        os.replace(tmp_path, path)
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        path = os.path.join(self.output_dir, SUBSET_MANIFEST_FILENAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def main():
+    """命令行接口"""
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Clip子集生成')
+    parser.add_argument('--repo-root', default=default_root, help='数据仓库根目录')
+    parser.add_argument('--local-root', help='obs://对应的本地目录 (默认: $OBS_LOCAL_ROOT)')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    build_parser = subparsers.add_parser('build', help='按max/min_clips_per_dataset生成子集索引')
+    build_parser.add_argument('stage', help='阶段名称')
+    build_parser.add_argument('--variant', help='阶段变体')
+    build_parser.add_argument('--output-dir', help='输出目录 (默认: subsets/<stage>[_<variant>])')
+    build_parser.add_argument('--force', action='store_true', help='忽略已有结果重新抽样')
+    build_parser.add_argument('--strict', action='store_true', help='有数据集少于min_clips_per_dataset时返回失败')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        subsetter = ClipSubsetter(args.repo_root, args.stage, args.variant, args.local_root, args.output_dir)
+        print(f"✂️  生成clip子集: {args.stage}" + (f" ({args.variant})" if args.variant else "") +
+              f" | max: {subsetter.max_clips} | min: {subsetter.min_clips} | seed: {subsetter.seed}"
+              f" | ID字段: {subsetter.id_field}")
+        manifest = subsetter.build(force=args.force)
+        print(f"💾 子集索引: {subsetter.output_dir}")
+
+        below_min = [name for name, entry in manifest['datasets'].items() if entry['below_min']]
+        if below_min:
+            print(f"⚠️  {len(below_min)} 个数据集少于min_clips_per_dataset: {', '.join(below_min)}")
+            if args.strict:
+                sys.exit(1)
+
+    except (ValueError, OSError) as e:
+        print(f"❌ 执行失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+训练数据集版本对比 - 直接从Git对象读取两个版本的training_dataset.json，按数据集名称对比dataset_index
+
+  - 两个版本都通过 GitSession 的常驻 cat-file 进程读取，不检出工作区
+  - dataset_index 按name建立字典后逐项比较，复杂度O(n)
+  - 比较字段默认为 duplicate、bundle_versions、obs_path；meta中的版本字段单独比较
+  - 结果可输出为JSON，或作为 tag_release_helper.py 生成Release说明时的“数据集变更”章节
+"""
+
+import re
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional, Any, Tuple
+
+try:
+    import orjson
+
+    def _loads(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    orjson = None
+
+    def _loads(data: bytes) -> Any:
+        return json.loads(data)
+
+from git_session import GitSession, GitError
+
+TRAINING_DATASET_FILES = ['training_dataset.json', 'training_dataset.dagger.json']
+DIFF_FIELDS = ('duplicate', 'bundle_versions', 'obs_path')
+META_DIFF_FIELDS = ('version', 'consumer_version', 'bundle_versions', 'training_type')
+TRAINING_TAG_PREFIX = "training/"
+VERSION_PATTERN = re.compile(r'^v?\d+\.\d+\.\d+')
+# Release说明中每类变更最多列出的数据集数
+MAX_LISTED_ENTRIES = 50
+
+
+def training_tag(version: str) -> str:
+    """版本号对应的训练数据集Tag，如 1.2.0 -> training/v1.2.0；已是引用名时原样返回"""
+    if not VERSION_PATTERN.match(version):
+        return version
+    return TRAINING_TAG_PREFIX + (version if version.startswith('v') else f"v{version}")
+
+
+def index_by_name(dataset_index: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """按name建立索引，返回 (索引, 重复出现的名称)；重复名称以最后一项为准"""
+    indexed: Dict[str, Dict[str, Any]] = {}
+    duplicated = []
+    for position, entry in enumerate(dataset_index):
+        name = entry.get('name') or f"<unnamed#{position}>"
+        if name in indexed:
+            duplicated.append(name)
+        indexed[name] = entry
+    return indexed, duplicated
+
+
+def diff_dataset_index(old_index: List[Dict[str, Any]], new_index: List[Dict[str, Any]],
+                       fields: Tuple[str, ...] = DIFF_FIELDS) -> Dict[str, Any]:
+    """
+    对比两个版本的dataset_index
+
+    Returns:
+        {'added': [entry], 'removed': [entry], 'changed': [{'name', 'changes': {field: [old, new]}}],
+         'unchanged': 数量, 'duplicated_names': {'old': [...], 'new': [...]}, 'clips': {'old', 'new'}}
+        added/changed按新版本顺序排列，removed按旧版本顺序排列
+    """
+    old, old_duplicated = index_by_name(old_index)
+    new, new_duplicated = index_by_name(new_index)
+
+    added, changed = [], []
+    unchanged = 0
+    for name, entry in new.items():
+        previous = old.get(name)
+        if previous is None:
+            added.append(entry)
+            continue
+        changes = {field: [previous.get(field), entry.get(field)]
+                   for field in fields if previous.get(field) != entry.get(field)}
+        if changes:
+            changed.append({'name': name, 'changes': changes})
+        else:
+            unchanged += 1
+    removed = [entry for name, entry in old.items() if name not in new]
+
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'unchanged': unchanged,
+        'duplicated_names': {'old': old_duplicated, 'new': new_duplicated},
+        'clips': {
+            'old': sum(entry.get('duplicate', 1) for entry in old_index),
+            'new': sum(entry.get('duplicate', 1) for entry in new_index)
+        }
+    }
+
+
+def diff_datasets(old_data: Dict[str, Any], new_data: Dict[str, Any],
+                  fields: Tuple[str, ...] = DIFF_FIELDS) -> Dict[str, Any]:
+    """对比两个完整的训练数据集文档（meta版本字段 + dataset_index）"""
+    old_meta, new_meta = old_data.get('meta', {}), new_data.get('meta', {})
+    result = diff_dataset_index(old_data.get('dataset_index', []), new_data.get('dataset_index', []), fields)
+    result['meta'] = {field: [old_meta.get(field), new_meta.get(field)]
+                      for field in META_DIFF_FIELDS if old_meta.get(field) != new_meta.get(field)}
+    return result
+
+
+def load_dataset_at(git: GitSession, rev: str, filename: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    从Git对象读取rev中的训练数据集文件（路径相对当前目录，与 TagReleaseHelper.get_dataset_info 一致）
+
+    Returns:
+        (文件名, 文档)，未找到时为 (None, None)
+    """
+    candidates = [filename] if filename else TRAINING_DATASET_FILES
+    blobs = git.read_blobs([(rev, f"./{name}") for name in candidates])
+    for name in candidates:
+        data = blobs[(rev, f"./{name}")]
+        if data is None:
+            continue
+        try:
+            return name, _loads(data)
+        except ValueError:
+            continue
+    return None, None
+
+
+def diff_revisions(git: GitSession, old_rev: str, new_rev: Optional[str] = None,
+                   filename: Optional[str] = None) -> Dict[str, Any]:
+    """
+    对比两个Git版本中的训练数据集
+
+    Args:
+        old_rev: 旧版本（Tag、分支或提交）
+        new_rev: 新版本，None表示工作区中的文件
+        filename: 数据集文件名，默认依次尝试 training_dataset.json、training_dataset.dagger.json
+
+    Raises:
+        ValueError: 某个版本中没有可解析的数据集文件
+    """
+    old_name, old_data = load_dataset_at(git, old_rev, filename)
+    if old_data is None:
+        raise ValueError(f"{old_rev} 中没有可解析的训练数据集文件")
+
+    if new_rev is None:
+        # 新版本默认与旧版本使用同一个文件
+        new_name = filename or old_name
+        try:
+            with open(new_name, 'rb') as f:
+                new_data = _loads(f.read())
+        except (OSError, ValueError) as e:
+            raise ValueError(f"无法读取工作区中的 {new_name}: {e}") from None
+    else:
+        new_name, new_data = load_dataset_at(git, new_rev, filename or old_name)
+        if new_data is None:
+            raise ValueError(f"{new_rev} 中没有可解析的训练数据集文件")
+
+    result = diff_datasets(old_data, new_data)
+    result.update({'old': {'rev': old_rev, 'file': old_name},
+                   'new': {'rev': new_rev or '工作区', 'file': new_name}})
+    return result
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value) or '[]'
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def _limit(lines: List[str], total: int, max_entries: int) -> List[str]:
+    if total > max_entries:
+        return lines[:max_entries] + [f"- ... 另有 {total - max_entries} 个"]
+    return lines
+
+
+def format_diff_markdown(diff: Dict[str, Any], max_entries: int = MAX_LISTED_ENTRIES) -> str:
+    """格式化为Release说明中的“数据集变更”章节（每类最多列出max_entries个数据集）"""
+    clips = diff['clips']
+    lines = ["### 数据集变更",
+             f"- 对比: {diff['old']['rev']} → {diff['new']['rev']}",
+             f"- 新增 {len(diff['added'])} 个, 移除 {len(diff['removed'])} 个, "
+             f"变更 {len(diff['changed'])} 个, 未变 {diff['unchanged']} 个",
+             f"- 总Clips: {clips['old']:,} → {clips['new']:,} ({clips['new'] - clips['old']:+,})"]
+    for field, (old, new) in diff.get('meta', {}).items():
+        lines.append(f"- meta.{field}: {_format_value(old)} → {_format_value(new)}")
+
+    if diff['added']:
+        lines.append("\n#### 新增数据集")
+        lines.extend(_limit([f"- **{entry.get('name')}** - {entry.get('duplicate', 1):,} clips"
+                             f" ({_format_value(entry.get('bundle_versions', []))})"
+                             for entry in diff['added'][:max_entries]], len(diff['added']), max_entries))
+    if diff['removed']:
+        lines.append("\n#### 移除数据集")
+        lines.extend(_limit([f"- **{entry.get('name')}** - {entry.get('duplicate', 1):,} clips"
+                             for entry in diff['removed'][:max_entries]], len(diff['removed']), max_entries))
+    if diff['changed']:
+        lines.append("\n#### 变更数据集")
+        changed_lines = []
+        for item in diff['changed'][:max_entries]:
+            changes = "; ".join(f"{field}: {_format_value(old)} → {_format_value(new)}"
+                                for field, (old, new) in item['changes'].items())
+            changed_lines.append(f"- **{item['name']}** - {changes}")
+        lines.extend(_limit(changed_lines, len(diff['changed']), max_entries))
+
+    for side, label in (('old', diff['old']['rev']), ('new', diff['new']['rev'])):
+        if diff['duplicated_names'][side]:
+            lines.append(f"\n⚠️  {label} 中存在重复的数据集名称: {', '.join(sorted(set(diff['duplicated_names'][side])))}")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description='训练数据集版本对比')
+    parser.add_argument('old', help='旧版本 (版本号如 1.1.0 对应 training/v1.1.0，也可以是任意Git引用)')
+    parser.add_argument('new', nargs='?', help='新版本 (默认: 工作区)')
+    parser.add_argument('--file', help='数据集文件名 (默认: training_dataset.json 或 training_dataset.dagger.json)')
+    parser.add_argument('--json', action='store_true', help='输出JSON')
+    args = parser.parse_args()
+
+    try:
+        with GitSession() as git:
+            diff = diff_revisions(git, training_tag(args.old), training_tag(args.new) if args.new else None, args.file)
+    except (GitError, ValueError) as e:
+        print(f"❌ 对比失败: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+    else:
+        print(format_diff_markdown(diff))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Epoch采样计划生成器 - 根据阶段配置的data_strategy生成确定性的逐epoch样本索引
+
+采样规则:
+  - 每个数据集的可用clips数为 metadata.estimated_clips，受 max_clips_per_dataset 限制
+  - epoch总样本数默认为 Σ 可用clips × duplicate
+  - data_ratio 按场景分配样本数（场景匹配 metadata.scenario_type 或数据集名前缀，未匹配的归入others）
+  - 场景内按 stage_weight × duplicate × 可用clips 分配到各数据集；没有data_ratio时直接在全体数据集间分配
+  - 数据集内先完整重复若干遍，余数部分无放回抽样
+  - 随机数由 (seed, epoch[, 数据集序号]) 派生，同一配置重复生成的计划完全一致
+
+计划以结构化数组 (dataset, clip) 写入 .npy 文件，dataloader worker 通过内存映射共享读取。
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from stage_snapshot import StageSnapshotCache
+from clip_subsetter import load_subset_counts
+
+PLAN_DTYPE = np.dtype([('dataset', '<u4'), ('clip', '<u8')])
+MANIFEST_FILENAME = "manifest.json"
+
+
+def largest_remainder(total: int, weights: np.ndarray) -> np.ndarray:
+    """按权重把total分配为整数，保证总和等于total"""
+    if total <= 0 or weights.sum() <= 0:
+        return np.zeros(len(weights), dtype=np.int64)
+    exact = weights / weights.sum() * total
+    counts = np.floor(exact).astype(np.int64)
+    remainder = total - counts.sum()
+    if remainder > 0:
+        # 余数相同时按序号稳定排序，保证确定性
+        order = np.argsort(-(exact - counts), kind='stable')
+        counts[order[:remainder]] += 1
+    return counts
+
+
+def fill_plan(out: np.ndarray, blocks, positions: Optional[np.ndarray] = None):
+    """
+    把 (数据集序号, clip索引) 块依次写入计划
+
+    Args:
+        out: PLAN_DTYPE数组（内存数组或内存映射）
+        blocks: 可迭代的 (dataset_id, clips)
+        positions: 打乱用的排列，第i个样本写入 out[positions[i]]；None表示按顺序写入
+    """
+    start = 0
+    for dataset_id, clips in blocks:
+        end = start + len(clips)
+        if positions is None:
+            out['dataset'][start:end] = dataset_id
+            out['clip'][start:end] = clips
+        else:
+            block = positions[start:end]
+            out['dataset'][block] = dataset_id
+            out['clip'][block] = clips
+        start = end
+
+
+def write_plan_file(plan_path: str, total: int, fill) -> str:
+    """创建内存映射的.npy计划文件，由fill(out)写入内容后原子替换到plan_path"""
+    directory, filename = os.path.split(plan_path)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.tmp.npy")
+    plan = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=PLAN_DTYPE, shape=(total,))
+    try:
+        fill(plan)
+        plan.flush()
+    finally:
+        del plan
+    os.replace(tmp_path, plan_path)
+    return plan_path
+
+
+class EpochSampler:
+    """基于阶段配置的epoch采样计划生成器"""
+
+    def __init__(self, stage_document: Dict[str, Any], clip_counts: Optional[Dict[str, int]] = None,
+                 epoch_size: Optional[int] = None):
+        """
+        Args:
+            stage_document: 阶段配置文件内容（stages/*.json）
+            clip_counts: 覆盖各数据集的可用clips数 {name: count}，默认使用metadata.estimated_clips
+            epoch_size: 每个epoch的样本数，默认为 Σ 可用clips × duplicate
+        """
+        self.document = stage_document
+        self.meta = stage_document.get('meta', {})
+        self.strategy = self.meta.get('stage_config', {}).get('data_strategy', {})
+        self.seed = int(self.strategy.get('seed', 0))
+        self.shuffle = bool(self.strategy.get('shuffle', True))
+        self.warnings: List[str] = []
+
+        self.datasets = self._collect_datasets(clip_counts or {})
+        natural_size = int(sum(ds['clips'] * ds['duplicate'] for ds in self.datasets))
+        self.epoch_size = int(epoch_size) if epoch_size is not None else natural_size
+        self.targets = self._allocate_targets()
+
+    @classmethod
+    def from_stage(cls, repo_root: str, stage: str, variant: Optional[str] = None, **kwargs) -> 'EpochSampler':
+        """从阶段快照创建采样器"""
+        document = StageSnapshotCache(repo_root).stage_document(stage, variant)
+        if document is None:
+            raise ValueError(f"阶段配置不可用: {stage}" + (f" ({variant})" if variant else ""))
+        return cls(document, **kwargs)
+
+    def _collect_datasets(self, clip_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        """整理参与采样的数据集"""
+        max_clips = self.strategy.get('max_clips_per_dataset')
+        min_clips = self.strategy.get('min_clips_per_dataset', 0)
+        datasets = []
+
+        for dataset in self.document.get('dataset_index', []):
+            if not dataset.get('enabled', True):
+                continue
+            name = dataset['name']
+            metadata = dataset.get('metadata', {})
+            clips = int(clip_counts.get(name, metadata.get('estimated_clips', 0)))
+            if max_clips:
+                clips = min(clips, int(max_clips))
+            if clips <= 0:
+                self.warnings.append(f"{name}: 没有可用clips，已跳过")
+                continue
+            if clips < min_clips:
+                self.warnings.append(f"{name}: 可用clips({clips})少于min_clips_per_dataset({min_clips})")
+
+            datasets.append({
+                'name': name,
+                'obs_path': dataset.get('obs_path', ''),
+                'scenario': metadata.get('scenario_type', 'others'),
+                'clips': clips,
+                'duplicate': int(dataset.get('duplicate', 1)),
+                'stage_weight': float(dataset.get('stage_weight', 1.0))
+            })
+
+        return datasets
+
+    def _match_ratio_key(self, dataset: Dict[str, Any], data_ratio: Dict[str, float]) -> Optional[str]:
+        """确定数据集归属的data_ratio场景"""
+        if dataset['scenario'] in data_ratio:
+            return dataset['scenario']
+        for key in data_ratio:
+            if dataset['name'].startswith(key):
+                return key
+        return 'others' if 'others' in data_ratio else None
+
+    def _allocate_targets(self) -> np.ndarray:
+        """计算每个数据集在一个epoch中的样本数"""
+        if not self.datasets:
+            return np.zeros(0, dtype=np.int64)
+
+        weights = np.array([ds['stage_weight'] * ds['duplicate'] * ds['clips'] for ds in self.datasets],
+                           dtype=np.float64)
+        data_ratio = self.strategy.get('data_ratio') or {}
+        if not data_ratio:
+            return largest_remainder(self.epoch_size, weights)
+
+        groups: Dict[str, List[int]] = {}
+        for i, dataset in enumerate(self.datasets):
+            key = self._match_ratio_key(dataset, data_ratio)
+            if key is None:
+                self.warnings.append(f"{dataset['name']}: 场景 {dataset['scenario']} 不在data_ratio中，已跳过")
+                continue
+            groups.setdefault(key, []).append(i)
+
+        missing = [key for key in data_ratio if key not in groups]
+        if missing:
+            self.warnings.append(f"data_ratio中的场景没有对应数据集: {', '.join(missing)}")
+
+        # 只在有数据集的场景间重新归一化比例
+        keys = [key for key in data_ratio if key in groups]
+        scenario_counts = largest_remainder(
+            self.epoch_size, np.array([data_ratio[key] for key in keys], dtype=np.float64))
+
+        targets = np.zeros(len(self.datasets), dtype=np.int64)
+        for key, count in zip(keys, scenario_counts):
+            members = np.array(groups[key])
+            targets[members] = largest_remainder(int(count), weights[members])
+        return targets
+
+    def config_hash(self) -> str:
+        """计划内容的哈希（配置、数据集和样本数决定计划）"""
+        payload = json.dumps({
+            'seed': self.seed,
+            'shuffle': self.shuffle,
+            'epoch_size': self.epoch_size,
+            'datasets': self.datasets,
+            'targets': self.targets.tolist()
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def dataset_indices(self, epoch: int, dataset_id: int) -> np.ndarray:
+        """生成单个数据集在该epoch的clip索引"""
+        clips = self.datasets[dataset_id]['clips']
+        target = int(self.targets[dataset_id])
+        repeats, remainder = divmod(target, clips)
+
+        parts = []
+        if repeats:
+            parts.append(np.tile(np.arange(clips, dtype=np.uint64), repeats))
+        if remainder:
+            rng = np.random.default_rng([self.seed, epoch, dataset_id])
+            parts.append(rng.choice(clips, size=remainder, replace=False).astype(np.uint64))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+
+    def iter_blocks(self, epoch: int):
+        """按数据集顺序生成 (数据集序号, clip索引) 块"""
+        for dataset_id in range(len(self.datasets)):
+            yield dataset_id, self.dataset_indices(epoch, dataset_id)
+
+    def _fill(self, out: np.ndarray, epoch: int):
+        """把epoch计划写入out（内存数组或内存映射）"""
+        positions = np.random.default_rng([self.seed, epoch]).permutation(len(out)) if self.shuffle else None
+        fill_plan(out, self.iter_blocks(epoch), positions)
+
+    def build_epoch(self, epoch: int) -> np.ndarray:
+        """在内存中生成epoch计划"""
+        plan = np.empty(int(self.targets.sum()), dtype=PLAN_DTYPE)
+        self._fill(plan, epoch)
+        return plan
+
+    def write_epoch(self, epoch: int, output_dir: str) -> str:
+        """
+        生成epoch计划并写入 output_dir/epoch_XXXX.npy
+
+        配置哈希未变化且文件已存在时直接复用。
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        plan_path = os.path.join(output_dir, f"epoch_{epoch:04d}.npy")
+        manifest = load_manifest(output_dir)
+        config_hash = self.config_hash()
+
+        if manifest.get('config_hash') != config_hash:
+            manifest = self._new_manifest(config_hash)
+        elif str(epoch) in manifest['epochs'] and os.path.exists(plan_path):
+            return plan_path
+
+        write_plan_file(plan_path, int(self.targets.sum()), lambda out: self._fill(out, epoch))
+
+        manifest['epochs'][str(epoch)] = os.path.basename(plan_path)
+        save_manifest(output_dir, manifest)
+        return plan_path
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """各数据集的采样摘要"""
+        total = max(1, int(self.targets.sum()))
+        return [{
+            'name': ds['name'],
+            'scenario': ds['scenario'],
+            'clips': ds['clips'],
+            'duplicate': ds['duplicate'],
+            'samples': int(target),
+            'share': int(target) / total,
+            'passes': int(target) / ds['clips']
+        } for ds, target in zip(self.datasets, self.targets)]
+
+    def _new_manifest(self, config_hash: str) -> Dict[str, Any]:
+        return {
+            'stage': self.meta.get('stage'),
+            'config_hash': config_hash,
+            'seed': self.seed,
+            'shuffle': self.shuffle,
+            'epoch_size': int(self.targets.sum()),
+            'dtype': [list(field) for field in PLAN_DTYPE.descr],
+            'datasets': [{'name': ds['name'], 'obs_path': ds['obs_path'], 'clips': ds['clips'],
+                          'samples': int(t)} for ds, t in zip(self.datasets, self.targets)],
+            'epochs': {}
+        }
+
+
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    """读取计划目录的manifest.json，不存在或损坏时返回空字典"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir: str, manifest: Dict[str, Any]):
+    """原子写入计划目录的manifest.json"""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_epoch_plan(plan_path: str, rank: int = 0, world_size: int = 1) -> np.ndarray:
+    """
+    以只读内存映射打开epoch计划
+
+    Args:
+        plan_path: epoch_XXXX.npy 路径
+        rank: 当前worker序号
+        world_size: worker总数，每个worker取 plan[rank::world_size]（视图，不复制数据）
+    """
+    plan = np.load(plan_path, mmap_mode='r')
+    return plan[rank::world_size] if world_size > 1 else plan
+
+
+def parse_epochs(value: str) -> List[int]:
+    """解析 "3" 或 "0-9" 形式的epoch范围"""
+    if '-' in value:
+        start, end = value.split('-', 1)
+        return list(range(int(start), int(end) + 1))
+    return [int(value)]
+
+
+def main():
+    """命令行接口"""
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Epoch采样计划生成器')
+    parser.add_argument('--repo-root', default=default_root, help='数据仓库根目录')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    summary_parser = subparsers.add_parser('summary', help='查看各数据集的采样分配')
+    summary_parser.add_argument('stage', help='阶段名称')
+    summary_parser.add_argument('--variant', help='阶段变体')
+    summary_parser.add_argument('--epoch-size', type=int, help='每个epoch的样本数')
+    summary_parser.add_argument('--subset-dir', help='使用clip_subsetter生成的子集clip数')
+
+    plan_parser = subparsers.add_parser('plan', help='生成epoch采样计划')
+    plan_parser.add_argument('stage', help='阶段名称')
+    plan_parser.add_argument('--variant', help='阶段变体')
+    plan_parser.add_argument('--epochs', default='0', help='epoch或范围，如 0-9 (默认: 0)')
+    plan_parser.add_argument('--epoch-size', type=int, help='每个epoch的样本数')
+    plan_parser.add_argument('--subset-dir', help='使用clip_subsetter生成的子集clip数，clip序号对应子集索引中的位置')
+    plan_parser.add_argument('--output-dir', help='输出目录 (默认: plans/<stage>[_<variant>])')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        clip_counts = load_subset_counts(args.subset_dir) if args.subset_dir else None
+        sampler = EpochSampler.from_stage(args.repo_root, args.stage, args.variant,
+                                          clip_counts=clip_counts, epoch_size=args.epoch_size)
+        for warning in sampler.warnings:
+            print(f"⚠️  {warning}")
+
+        if args.command == 'summary':
+            print(f"📊 采样分配: {args.stage}" + (f" ({args.variant})" if args.variant else ""))
+            print(f"   每epoch样本数: {int(sampler.targets.sum()):,} | seed: {sampler.seed} | shuffle: {sampler.shuffle}")
+            for item in sampler.summary():
+                print(f"   • {item['name']} [{item['scenario']}]")
+                print(f"      样本: {item['samples']:,} ({item['share']:.1%}) | 可用clips: {item['clips']:,} | "
+                      f"遍数: {item['passes']:.2f}")
+
+        elif args.command == 'plan':
+            output_dir = args.output_dir or os.path.join(
+                args.repo_root, 'plans', args.stage + (f"_{args.variant}" if args.variant else ""))
+            for epoch in parse_epochs(args.epochs):
+                path = sampler.write_epoch(epoch, output_dir)
+                print(f"✅ epoch {epoch}: {path}")
+
+    except (ValueError, OSError) as e:
+        print(f"❌ 执行失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Git对象批量读取 - 常驻一个 git cat-file --batch 进程，读取 <rev>:<path> 或对象sha不再每次启动git
+
+本文件在 scripts/ 和 data_release_repo/scripts/ 中各有一份，内容保持完全一致：
+data_release_repo 作为独立仓库发布，两边的脚本不能互相导入。修改时请同时修改两份。
+"""
+
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+
+class GitError(RuntimeError):
+    """Git命令执行失败或不在Git仓库中"""
+
+
+class CatFileReader:
+    """常驻的 git cat-file --batch 进程（非线程安全）"""
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self._process: Optional[subprocess.Popen] = None
+
+    def close(self):
+        """结束常驻进程"""
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+
+    def _kill(self):
+        """强制结束常驻进程（输出流状态未知时使用）"""
+        if self._process is not None:
+            process, self._process = self._process, None
+            process.kill()
+            process.wait()
+            process.stdin.close()
+            process.stdout.close()
+
+    def _ensure_process(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=self.cwd,
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return self._process
+
+    @staticmethod
+    def _read_response(process: subprocess.Popen) -> Optional[Tuple[str, str, bytes]]:
+        header = process.stdout.readline()
+        if not header:
+            raise GitError("git cat-file 进程意外退出")
+        # "<spec> missing" 或 "<spec> ambiguous"，spec本身可能含空格，不能按字段数判断
+        if header.endswith((b' missing\n', b' ambiguous\n')):
+            return None
+        try:
+            sha, object_type, size = header.rstrip(b'\n').rsplit(b' ', 2)
+            size = int(size)
+        except ValueError:
+            raise GitError(f"无法解析 git cat-file 输出: {header!r}") from None
+        data = process.stdout.read(size + 1)
+        if len(data) != size + 1:
+            raise GitError("git cat-file 进程意外退出")
+        return sha.decode(), object_type.decode(), data[:size]
+
+    def read_objects(self, specs: List[str]) -> List[Optional[Tuple[str, str, bytes]]]:
+        """批量读取对象，返回与specs一一对应的 (sha, type, 内容) 或None(不存在)"""
+        if not specs:
+            return []
+        if any('\n' in spec for spec in specs):
+            raise ValueError("对象名不能包含换行符")
+        process = self._ensure_process()
+        request = ''.join(f"{spec}\n" for spec in specs).encode('utf-8')
+
+        # 请求较多时输出管道可能先写满，由单独的线程写入请求，避免双方互相等待
+        def write():
+            try:
+                process.stdin.write(request)
+                process.stdin.flush()
+            except (OSError, ValueError):
+                pass  # 进程已退出或已被结束，由读取端报告错误
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        try:
+            return [self._read_response(process) for _ in specs]
+        except BaseException:
+            # 未读完的响应会错位到下一次请求，直接结束进程，下次调用重新启动
+            self._kill()
+            raise
+        finally:
+            writer.join()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Git会话 - data_release_repo脚本共用的Git访问层
+
+  - fetch去重：以FETCH_HEAD的修改时间为准，距上次fetch不足 fetch_interval 秒时跳过（对所有进程生效），
+    间隔由参数或环境变量 DRR_GIT_FETCH_INTERVAL 指定，默认300秒，0表示每次都fetch
+  - 对象读取：会话内常驻一个 git cat-file --batch 进程（git_cat_file.CatFileReader），读取 <rev>:<path> 不再每次启动git
+  - 批量接口：read_blobs 一次提交全部请求后依次读取结果；for_each_ref / list_tags 一次取出所有引用
+"""
+
+import os
+import json
+import time
+import subprocess
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from git_cat_file import CatFileReader, GitError
+
+FETCH_INTERVAL_ENV = "DRR_GIT_FETCH_INTERVAL"
+DEFAULT_FETCH_INTERVAL = 300.0
+
+
+class GitSession:
+    """一个仓库上的Git会话（非线程安全）"""
+
+    def __init__(self, cwd: Optional[str] = None, fetch_interval: Optional[float] = None):
+        """
+        Args:
+            cwd: 仓库内的任意目录，默认当前目录
+            fetch_interval: 两次fetch之间的最小间隔(秒)
+
+        Raises:
+            GitError: cwd不在Git仓库中
+        """
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        if fetch_interval is None:
+            fetch_interval = float(os.environ.get(FETCH_INTERVAL_ENV, DEFAULT_FETCH_INTERVAL))
+        self.fetch_interval = fetch_interval
+
+        output = self.run(['rev-parse', '--show-toplevel', '--absolute-git-dir', '--git-path', 'FETCH_HEAD'],
+                          check=True, quiet=True)
+        self.repo_root, self.git_dir, fetch_head = output.split('\n')[:3]
+        self.fetch_head_path = os.path.join(self.cwd, fetch_head)
+
+        self._reader = CatFileReader(self.cwd)
+        self._tags: Optional[List[str]] = None
+
+    def __enter__(self) -> 'GitSession':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """结束常驻的cat-file进程"""
+        self._reader.close()
+
+    def run(self, args: List[str], check: bool = False, quiet: bool = False) -> str:
+        """
+        执行Git命令并返回去掉首尾空白的stdout
+
+        check为True时失败抛出GitError，否则打印错误信息(quiet时不打印)并返回空字符串
+        """
+        try:
+            result = subprocess.run(['git'] + args, cwd=self.cwd, capture_output=True, text=True, check=True)
+            return result.stdout.strip()
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = getattr(e, 'stderr', None) or str(e)
+            if check:
+                raise GitError(f"Git命令执行失败: git {' '.join(args)}: {stderr.strip()}") from None
+            if not quiet:
+                print(f"❌ Git命令执行失败: {' '.join(args)}")
+                print(f"错误信息: {stderr}")
+            return ""
+
+    # ---- fetch ----
+
+    def fetch_signature(self) -> Optional[Tuple[int, int]]:
+        """FETCH_HEAD的(mtime_ns, size)，从未fetch过时为None；可用作“每次fetch”缓存的键"""
+        try:
+            stat = os.stat(self.fetch_head_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def fetch(self, remote: str = 'origin', force: bool = False) -> bool:
+        """
+        fetch远程仓库，距上次fetch不足fetch_interval秒时跳过
+
+        Returns:
+            是否实际执行了fetch
+        """
+        signature = self.fetch_signature()
+        if not force and signature and time.time() - signature[0] / 1e9 < self.fetch_interval:
+            return False
+        self.run(['fetch', remote])
+        self._tags = None
+        return True
+
+    # ---- 引用 ----
+
+    def for_each_ref(self, patterns: Iterable[str], fields: List[str], merged: Optional[str] = None) -> List[List[str]]:
+        """
+        一次列出匹配的引用
+
+        Args:
+            patterns: 引用前缀，如 refs/heads
+            fields: for-each-ref格式字段名，如 ['refname', 'committerdate:unix']
+            merged: 只列出已合并到该提交的引用
+
+        Returns:
+            每个引用一行，按fields顺序的字段值
+        """
+        args = ['for-each-ref', '--format=' + '%00'.join(f'%({field})' for field in fields)]
+        if merged:
+            args.append(f'--merged={merged}')
+        output = self.run(args + list(patterns))
+        return [line.split('\0') for line in output.split('\n') if line]
+
+    def list_tags(self, pattern: Optional[str] = None) -> List[str]:
+        """所有Tag名（会话内缓存），pattern为fnmatch风格的过滤条件"""
+        if self._tags is None:
+            self._tags = [fields[0] for fields in self.for_each_ref(['refs/tags'], ['refname:strip=2'])]
+        if not pattern:
+            return list(self._tags)
+        from fnmatch import fnmatchcase
+        return [tag for tag in self._tags if fnmatchcase(tag, pattern)]
+
+    def tag_exists(self, name: str) -> bool:
+        return name in self.list_tags()
+
+    def invalidate_tags(self):
+        """创建或删除Tag后清除缓存"""
+        self._tags = None
+
+    # ---- 对象读取 ----
+
+    def read_object(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        读取单个对象
+
+        Args:
+            spec: 对象名，如 HEAD、training/v1.0.0:training_dataset.json、<sha>
+
+        Returns:
+            (sha, type, 内容)，对象不存在时为None
+        """
+        return self.read_objects([spec])[0]
+
+    def read_objects(self, specs: List[str]) -> List[Optional[Tuple[str, str, bytes]]]:
+        """批量读取对象，返回与specs一一对应的 (sha, type, 内容) 或None"""
+        return self._reader.read_objects(specs)
+
+    def read_blob(self, rev: str, path: str) -> Optional[bytes]:
+        """读取 rev 中 path 文件的内容，不存在时为None"""
+        return self.read_blobs([(rev, path)])[(rev, path)]
+
+    def read_blobs(self, requests: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[bytes]]:
+        """批量读取 (rev, path) 文件内容"""
+        requests = list(dict.fromkeys(requests))
+        results = self.read_objects([f"{rev}:{path}" for rev, path in requests])
+        return {request: (result[2] if result and result[1] == 'blob' else None)
+                for request, result in zip(requests, results)}
+
+    def read_json(self, rev: str, path: str) -> Optional[Any]:
+        """读取并解析 rev 中的JSON文件，不存在或格式错误时为None"""
+        data = self.read_blob(rev, path)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def resolve(self, revs: List[str]) -> Dict[str, Optional[str]]:
+        """批量解析提交名为完整sha（Tag解引用到提交）"""
+        results = self.read_objects([f"{rev}^{{commit}}" for rev in revs])
+        return {rev: (result[0] if result else None) for rev, result in zip(revs, results)}
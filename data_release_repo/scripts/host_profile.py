@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+主机配置覆盖 - host_profiles/<hostname>.yaml 按主机覆盖阶段配置中的loading_config
+
+  hostname: gpu-node-01
+  updated_at: "2025-09-23 10:30:00"
+  stages:
+    pretraining:
+      loading_config: {num_workers: 6, prefetch_factor: 2}
+      benchmark: {...}
+
+阶段JSON保持不变，读取方在stage loading_config之上叠加当前主机的覆盖值。
+"""
+
+import os
+import socket
+from datetime import datetime
+from typing import Dict, Optional, Any
+
+import yaml
+
+HOST_PROFILE_DIR = "host_profiles"
+
+
+def current_hostname() -> str:
+    return socket.gethostname().split('.')[0] or 'unknown'
+
+
+def host_profile_path(repo_root: str, hostname: Optional[str] = None) -> str:
+    return os.path.join(repo_root, HOST_PROFILE_DIR, f"{hostname or current_hostname()}.yaml")
+
+
+def load_host_profile(repo_root: str, hostname: Optional[str] = None) -> Dict[str, Any]:
+    """读取主机配置，不存在或格式错误时返回空字典"""
+    try:
+        with open(host_profile_path(repo_root, hostname), 'r', encoding='utf-8') as f:
+            profile = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return {}
+    return profile if isinstance(profile, dict) else {}
+
+
+def apply_host_profile(loading_config: Dict[str, Any], repo_root: str, stage: str,
+                       hostname: Optional[str] = None) -> Dict[str, Any]:
+    """返回叠加了主机覆盖值的loading_config（不修改传入的字典）"""
+    overrides = (((load_host_profile(repo_root, hostname).get('stages') or {}).get(stage) or {})
+                 .get('loading_config') or {})
+    return {**loading_config, **overrides}
+
+
+def save_stage_profile(repo_root: str, stage: str, loading_config: Dict[str, Any],
+                       benchmark: Optional[Dict[str, Any]] = None, hostname: Optional[str] = None) -> str:
+    """写入(合并)主机配置中某个阶段的覆盖值，保留其他阶段"""
+    hostname = hostname or current_hostname()
+    path = host_profile_path(repo_root, hostname)
+    profile = load_host_profile(repo_root, hostname)
+    profile['hostname'] = hostname
+    profile['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    stage_profile = {'loading_config': loading_config}
+    if benchmark:
+        stage_profile['benchmark'] = benchmark
+    profile.setdefault('stages', {})[stage] = stage_profile
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("# 主机loading_config覆盖值，由 stage_manager.py autotune 生成\n")
+        yaml.dump(profile, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+JSONL数据集流式读取器 - 按loading_config多进程读取dataset_index中obs_path指向的JSONL文件
+
+  - obs://bucket/key 映射到本地目录 <local_root>/bucket/key（对象存储的本地替身），
+    local_root 由参数或环境变量 OBS_LOCAL_ROOT 指定
+  - 所有文件按字节范围均分给 num_workers 个worker，分片边界对齐到行首，每行只被一个worker读取
+  - worker与主进程之间是容量为 num_workers × prefetch_factor 个批次的有界队列，内存占用与文件大小无关
+  - worker只负责读取和切分行，每个批次以一整块原始字节传给主进程，由主进程解析：
+    解析后的记录经队列pickle的开销比解析本身还大。worker在存储I/O是瓶颈时（对象存储、网络盘）有收益，
+    数据在本地盘或页缓存中时解析受主进程单核限制，num_workers=0 通常一样快
+  - 安装了orjson时使用orjson解析，否则回退到标准库json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from queue import Empty
+from typing import List, Optional, Any, Iterator, Tuple
+
+try:
+    import orjson
+
+    def _loads(line: bytes) -> Any:
+        return orjson.loads(line)
+except ImportError:
+    orjson = None
+
+    def _loads(line: bytes) -> Any:
+        return json.loads(line)
+
+from stage_snapshot import StageSnapshotCache
+from host_profile import apply_host_profile
+
+OBS_SCHEME = "obs://"
+OBS_ROOT_ENV = "OBS_LOCAL_ROOT"
+# 小于该字节数的分片不再继续切分
+MIN_SHARD_BYTES = 1 << 20
+# 读取分片时每次读入的字节数
+READ_BLOCK_SIZE = 1 << 20
+# 主进程等待worker批次的轮询间隔(秒)，用于及时发现异常退出的worker
+QUEUE_POLL_INTERVAL = 1.0
+
+# worker队列消息类型
+_BATCH = 'batch'
+_DONE = 'done'
+_ERROR = 'error'
+
+Shard = List[Tuple[str, int, int]]
+
+
+def resolve_obs_path(obs_path: str, local_root: Optional[str] = None) -> str:
+    """
+    将obs://路径映射为本地文件路径，本地路径原样返回
+
+    Raises:
+        ValueError: obs://路径但未指定本地根目录
+    """
+    if not obs_path.startswith(OBS_SCHEME):
+        return obs_path
+    local_root = local_root or os.environ.get(OBS_ROOT_ENV)
+    if not local_root:
+        raise ValueError(f"无法读取 {obs_path}: 请通过 --local-root 或环境变量 {OBS_ROOT_ENV} 指定对象存储的本地目录")
+    return os.path.join(local_root, obs_path[len(OBS_SCHEME):])
+
+
+def plan_shards(files: List[str], num_workers: int) -> List[Shard]:
+    """
+    按字节数把文件切分给各worker
+
+    Returns:
+        每个worker的分片列表 [(path, start, end), ...]；行归属于其起始字节所在的分片
+    """
+    num_workers = max(1, num_workers)
+    sizes = [(path, os.path.getsize(path)) for path in files]
+    total = sum(size for _, size in sizes)
+    per_worker = max(MIN_SHARD_BYTES, -(-total // num_workers))
+
+    shards: List[Shard] = [[] for _ in range(num_workers)]
+    worker, filled = 0, 0
+    for path, size in sizes:
+        start = 0
+        while start < size:
+            take = size - start if worker == num_workers - 1 else min(size - start, per_worker - filled)
+            shards[worker].append((path, start, start + take))
+            start += take
+            filled += take
+            if filled >= per_worker and worker < num_workers - 1:
+                worker, filled = worker + 1, 0
+    return [shard for shard in shards if shard]
+
+
+def iter_shard_lines(path: str, start: int, end: int) -> Iterator[List[bytes]]:
+    """
+    按块读取 [start, end) 内起始的行（不含空行）
+
+    Yields:
+        每次读取的块中完整的行（不含换行符）
+    """
+    with open(path, 'rb') as f:
+        if start > 0:
+            # 从前一个字节开始丢弃半行：若start恰好是行首，只会丢弃前一行的换行符
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()  # buffer首字节在文件中的位置
+        buffer = b''
+        while position < end:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                # 文件末尾没有换行符的最后一行
+                if buffer.strip():
+                    yield [buffer]
+                return
+            buffer += block
+            cut = buffer.rfind(b'\n') + 1
+            if cut == 0:
+                continue
+            complete, buffer = buffer[:cut - 1], buffer[cut:]
+            if position + cut > end:
+                # 只保留起始位置在end之前的行：截到包含第 end-1 字节的那一行为止
+                stop = complete.find(b'\n', end - position - 1)
+                if stop >= 0:
+                    complete = complete[:stop]
+                buffer = b''
+            position += cut
+            yield [line for line in complete.split(b'\n') if line.strip()]
+
+
+def iter_shard_chunks(shard: Shard, batch_size: int) -> Iterator[bytes]:
+    """把分片中的原始行按batch_size拼接为字节块（行之间以换行分隔，不解析）"""
+    pending: List[bytes] = []
+    for path, start, end in shard:
+        for lines in iter_shard_lines(path, start, end):
+            pending.extend(lines)
+            if len(pending) >= batch_size:
+                full = len(pending) - len(pending) % batch_size
+                for i in range(0, full, batch_size):
+                    yield b'\n'.join(pending[i:i + batch_size])
+                del pending[:full]
+    if pending:
+        yield b'\n'.join(pending)
+
+
+def parse_chunk(chunk: bytes) -> List[Any]:
+    """解析 iter_shard_chunks 生成的字节块"""
+    return [_loads(line) for line in chunk.split(b'\n')]
+
+
+def iter_shard_batches(shard: Shard, batch_size: int) -> Iterator[List[Any]]:
+    """解析分片中的记录并按batch_size分批"""
+    for chunk in iter_shard_chunks(shard, batch_size):
+        try:
+            yield parse_chunk(chunk)
+        except ValueError as e:
+            raise ValueError(f"无法解析JSON行 (分片 {shard}): {e}") from None
+
+
+def _reader_worker(worker_id: int, shard: Shard, batch_size: int, queue):
+    """worker进程：读取分片并把原始字节块放入有界队列（队列满时阻塞）"""
+    try:
+        for chunk in iter_shard_chunks(shard, batch_size):
+            queue.put((_BATCH, worker_id, chunk))
+        queue.put((_DONE, worker_id, None))
+    except Exception as e:
+        queue.put((_ERROR, worker_id, f"{type(e).__name__}: {e}"))
+
+
+class JsonlDatasetReader:
+    """多进程JSONL流式读取器"""
+
+    def __init__(self, paths: List[str], batch_size: int = 32, num_workers: int = 0,
+                 prefetch_factor: int = 2, drop_last: bool = False, local_root: Optional[str] = None):
+        """
+        Args:
+            paths: JSONL文件路径，支持obs://
+            batch_size: 每批记录数
+            num_workers: 读取worker进程数，0表示在当前进程中读取（JSON解析始终在当前进程）
+            prefetch_factor: 每个worker预取的批次数
+            drop_last: 丢弃不足batch_size的批次
+            local_root: obs://对应的本地根目录
+        """
+        self.files = [resolve_obs_path(path, local_root) for path in paths]
+        missing = [path for path in self.files if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"数据文件不存在: {', '.join(missing)}")
+
+        self.batch_size = max(1, int(batch_size))
+        self.num_workers = max(0, int(num_workers))
+        self.prefetch_factor = max(1, int(prefetch_factor or 1))
+        self.drop_last = drop_last
+
+    @classmethod
+    def from_stage(cls, repo_root: str, stage: str, variant: Optional[str] = None,
+                   local_root: Optional[str] = None, use_host_profile: bool = True,
+                   **overrides) -> 'JsonlDatasetReader':
+        """
+        按阶段配置的dataset_index和loading_config创建读取器（只包含启用的数据集）
+
+        use_host_profile为True时叠加 host_profiles/<hostname>.yaml 中该阶段的覆盖值，
+        overrides中非None的参数优先级最高。
+        """
+        document = StageSnapshotCache(repo_root).stage_document(stage, variant)
+        if document is None:
+            raise ValueError(f"阶段配置不可用: {stage}" + (f" ({variant})" if variant else ""))
+
+        loading = document.get('meta', {}).get('stage_config', {}).get('loading_config', {})
+        if use_host_profile:
+            loading = apply_host_profile(loading, repo_root, stage)
+        options = {
+            'batch_size': loading.get('batch_size', 32),
+            'num_workers': loading.get('num_workers', 0),
+            'prefetch_factor': loading.get('prefetch_factor', 2),
+            'drop_last': loading.get('drop_last', False)
+        }
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        paths = [ds['obs_path'] for ds in document.get('dataset_index', [])
+                 if ds.get('enabled', True) and ds.get('obs_path')]
+        return cls(paths, local_root=local_root, **options)
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        batches = self._iter_local() if self.num_workers == 0 else self._iter_workers()
+        try:
+            for batch in batches:
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                yield batch
+        finally:
+            # 提前结束迭代时立即停止worker
+            batches.close()
+
+    def _iter_local(self) -> Iterator[List[Any]]:
+        for shard in plan_shards(self.files, 1):
+            yield from iter_shard_batches(shard, self.batch_size)
+
+    def _iter_workers(self) -> Iterator[List[Any]]:
+        shards = plan_shards(self.files, self.num_workers)
+        if not shards:
+            return
+
+        queue = multiprocessing.Queue(maxsize=len(shards) * self.prefetch_factor)
+        workers = [multiprocessing.Process(target=_reader_worker, args=(i, shard, self.batch_size, queue),
+                                           daemon=True)
+                   for i, shard in enumerate(shards)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            pending = set(range(len(workers)))
+            while pending:
+                try:
+                    kind, worker_id, payload = queue.get(timeout=QUEUE_POLL_INTERVAL)
+                except Empty:
+                    dead = [i for i in pending if not workers[i].is_alive() and workers[i].exitcode != 0]
+                    if dead:
+                        raise RuntimeError(f"读取worker异常退出: {dead}")
+                    continue
+
+                if kind == _BATCH:
+                    try:
+                        batch = parse_chunk(payload)
+                    except ValueError as e:
+                        raise ValueError(f"无法解析JSON行 (worker {worker_id}, 分片 {shards[worker_id]}): {e}") from None
+                    yield batch
+                elif kind == _DONE:
+                    pending.discard(worker_id)
+                else:
+                    raise RuntimeError(f"读取worker {worker_id} 失败: {payload}")
+        finally:
+            # 提前结束迭代时，阻塞在put上的worker需要强制结束
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
+            queue.close()
+            queue.cancel_join_thread()
+
+
+def main():
+    """命令行接口"""
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='JSONL数据集流式读取器')
+    parser.add_argument('--repo-root', default=default_root, help='数据仓库根目录')
+    parser.add_argument('--local-root', help=f'obs://对应的本地目录 (默认: ${OBS_ROOT_ENV})')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    scan_parser = subparsers.add_parser('scan', help='读取阶段的全部数据并统计吞吐')
+    scan_parser.add_argument('stage', help='阶段名称')
+    scan_parser.add_argument('--variant', help='阶段变体')
+    scan_parser.add_argument('--batch-size', type=int, help='覆盖loading_config.batch_size')
+    scan_parser.add_argument('--num-workers', type=int, help='覆盖loading_config.num_workers')
+    scan_parser.add_argument('--prefetch-factor', type=int, help='覆盖loading_config.prefetch_factor')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        reader = JsonlDatasetReader.from_stage(
+            args.repo_root, args.stage, args.variant, local_root=args.local_root,
+            batch_size=args.batch_size, num_workers=args.num_workers, prefetch_factor=args.prefetch_factor)
+
+        print(f"📖 读取 {len(reader.files)} 个文件 | batch_size: {reader.batch_size} | "
+              f"workers: {reader.num_workers} | prefetch: {reader.prefetch_factor} | "
+              f"解析器: {'orjson' if orjson else 'json'}")
+        started = time.perf_counter()
+        batches = records = 0
+        for batch in reader:
+            batches += 1
+            records += len(batch)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"✅ {records:,} 条记录, {batches:,} 个批次, 用时 {elapsed:.2f}s ({records / elapsed:,.0f} 条/秒)")
+
+    except (ValueError, OSError, RuntimeError) as e:
+        print(f"❌ 读取失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
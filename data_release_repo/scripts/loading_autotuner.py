@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+loading_config自动调优 - 在本机上用阶段的真实数据读取器测试不同的worker和预取配置
+
+对 num_workers × prefetch_factor 网格中的每个组合运行 JsonlDatasetReader，记录吞吐(samples/s)
+(不含worker启动时间)和主进程加所有worker的峰值内存；吞吐在最优值一定比例以内的组合中选择内存最小的一个，
+结果写入 host_profiles/<hostname>.yaml，阶段JSON保持不变。
+"""
+
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+from typing import Dict, List, Optional, Any
+
+from stage_snapshot import StageSnapshotCache
+from jsonl_reader import JsonlDatasetReader
+from host_profile import save_stage_profile, current_hostname
+
+DEFAULT_WORKER_GRID = [0, 1, 2, 4, 8]
+DEFAULT_PREFETCH_GRID = [1, 2, 4]
+# 吞吐不低于最优值的该比例时视为等价，优先选择内存占用小的配置
+THROUGHPUT_TOLERANCE = 0.95
+# 每隔多少个批次采样一次内存
+MEMORY_SAMPLE_EVERY = 16
+
+
+def _rss_bytes(pid: int) -> int:
+    """读取进程的常驻内存(/proc/<pid>/status中的VmRSS)"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _tree_rss_bytes() -> int:
+    """主进程加读取worker的常驻内存；没有/proc时退回主进程的峰值内存"""
+    if not os.path.exists('/proc/self/status'):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return _rss_bytes(os.getpid()) + sum(_rss_bytes(child.pid) for child in multiprocessing.active_children())
+
+
+def _has_gpu() -> bool:
+    return os.path.exists('/dev/nvidia0') or bool(os.environ.get('CUDA_VISIBLE_DEVICES'))
+
+
+class LoadingAutotuner:
+    """loading_config网格测试"""
+
+    def __init__(self, repo_root: str, stage: str, variant: Optional[str] = None,
+                 local_root: Optional[str] = None, max_batches: int = 2000, max_seconds: float = 10.0):
+        """
+        Args:
+            repo_root: 数据仓库根目录
+            stage: 阶段名称
+            variant: 阶段变体
+            local_root: obs://对应的本地目录
+            max_batches: 每个组合最多读取的批次数
+            max_seconds: 每个组合最长测试时间(秒)
+        """
+        self.repo_root = repo_root
+        self.stage = stage
+        self.variant = variant
+        self.local_root = local_root
+        self.max_batches = max_batches
+        self.max_seconds = max_seconds
+
+        document = StageSnapshotCache(repo_root).stage_document(stage, variant)
+        if document is None:
+            raise ValueError(f"阶段配置不可用: {stage}" + (f" ({variant})" if variant else ""))
+        self.loading_config = document.get('meta', {}).get('stage_config', {}).get('loading_config', {})
+
+    def run_trial(self, num_workers: int, prefetch_factor: int) -> Dict[str, Any]:
+        """测试单个组合"""
+        reader = JsonlDatasetReader.from_stage(
+            self.repo_root, self.stage, self.variant, local_root=self.local_root, use_host_profile=False,
+            num_workers=num_workers, prefetch_factor=prefetch_factor)
+
+        samples = batches = 0
+        peak_rss = _tree_rss_bytes()
+        started = time.perf_counter()
+        startup = None
+        iterator = iter(reader)
+        try:
+            for batch in iterator:
+                if startup is None:
+                    # 第一个批次之前是worker启动时间，单独记录，不计入稳态吞吐
+                    startup = time.perf_counter() - started
+                    started = time.perf_counter()
+                    continue
+                samples += len(batch)
+                batches += 1
+                if batches % MEMORY_SAMPLE_EVERY == 0:
+                    peak_rss = max(peak_rss, _tree_rss_bytes())
+                if batches >= self.max_batches or time.perf_counter() - started >= self.max_seconds:
+                    break
+            peak_rss = max(peak_rss, _tree_rss_bytes())
+        finally:
+            iterator.close()
+        elapsed = max(time.perf_counter() - started, 1e-9)
+
+        return {
+            'num_workers': num_workers,
+            'prefetch_factor': prefetch_factor,
+            'samples': samples,
+            'seconds': round(elapsed, 3),
+            'startup_seconds': round(startup or 0.0, 3),
+            'samples_per_sec': round(samples / elapsed, 1),
+            'peak_rss_mb': round(peak_rss / (1 << 20), 1)
+        }
+
+    def run(self, worker_grid: List[int], prefetch_grid: List[int], progress: bool = True) -> List[Dict[str, Any]]:
+        """测试整个网格（num_workers=0 时预取不起作用，只测试一次）"""
+        results = []
+        for num_workers in worker_grid:
+            for prefetch_factor in (prefetch_grid if num_workers > 0 else prefetch_grid[:1]):
+                result = self.run_trial(num_workers, prefetch_factor)
+                results.append(result)
+                if progress:
+                    print(f"   workers={num_workers:<3} prefetch={prefetch_factor:<3} "
+                          f"{result['samples_per_sec']:>12,.0f} samples/s  {result['peak_rss_mb']:>8.1f} MB")
+        return results
+
+    def recommend(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """在吞吐接近最优的组合中选择内存最小的，返回loading_config覆盖值"""
+        best = max(result['samples_per_sec'] for result in results)
+        candidates = [r for r in results if r['samples_per_sec'] >= best * THROUGHPUT_TOLERANCE]
+        choice = min(candidates, key=lambda r: (r['peak_rss_mb'], r['num_workers'], r['prefetch_factor']))
+
+        recommended = {
+            'num_workers': choice['num_workers'],
+            'prefetch_factor': choice['prefetch_factor'],
+            'pin_memory': bool(self.loading_config.get('pin_memory', False)) and _has_gpu()
+        }
+        if 'batch_size' in self.loading_config:
+            recommended['batch_size'] = self.loading_config['batch_size']
+        return {'loading_config': recommended, 'choice': choice}
+
+
+def _parse_grid(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def autotune_stage(repo_root: str, stage: str, variant: Optional[str] = None, local_root: Optional[str] = None,
+                   workers: Optional[List[int]] = None, prefetch: Optional[List[int]] = None,
+                   max_batches: int = 2000, max_seconds: float = 10.0, dry_run: bool = False) -> Dict[str, Any]:
+    """运行网格测试并写入主机配置，返回推荐结果"""
+    cpu_count = os.cpu_count() or 1
+    worker_grid = workers or [w for w in DEFAULT_WORKER_GRID if w <= cpu_count]
+    prefetch_grid = prefetch or DEFAULT_PREFETCH_GRID
+
+    tuner = LoadingAutotuner(repo_root, stage, variant, local_root, max_batches, max_seconds)
+    print(f"⚙️  调优 {stage}" + (f" ({variant})" if variant else "") +
+          f" @ {current_hostname()} (CPU: {cpu_count}, 当前配置: {tuner.loading_config})")
+    results = tuner.run(worker_grid, prefetch_grid)
+    recommendation = tuner.recommend(results)
+
+    choice = recommendation['choice']
+    print(f"🏆 推荐: {recommendation['loading_config']} "
+          f"({choice['samples_per_sec']:,.0f} samples/s, {choice['peak_rss_mb']:.1f} MB)")
+    if not dry_run:
+        benchmark = {
+            'cpu_count': cpu_count,
+            'samples_per_sec': choice['samples_per_sec'],
+            'peak_rss_mb': choice['peak_rss_mb'],
+            'grid': results
+        }
+        path = save_stage_profile(repo_root, stage, recommendation['loading_config'], benchmark)
+        print(f"💾 已写入主机配置: {path}")
+    return recommendation
+
+
+def add_autotune_arguments(parser: argparse.ArgumentParser):
+    """autotune命令的参数（stage_manager.py 和本脚本共用）"""
+    parser.add_argument('stage', help='阶段名称')
+    parser.add_argument('--variant', help='阶段变体')
+    parser.add_argument('--local-root', help='obs://对应的本地目录 (默认: $OBS_LOCAL_ROOT)')
+    parser.add_argument('--workers', type=_parse_grid, help='num_workers候选值，逗号分隔 (默认: 0,1,2,4,8 中不超过CPU数的值)')
+    parser.add_argument('--prefetch', type=_parse_grid, help='prefetch_factor候选值，逗号分隔 (默认: 1,2,4)')
+    parser.add_argument('--max-batches', type=int, default=2000, help='每个组合最多读取的批次数')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='每个组合最长测试时间(秒)')
+    parser.add_argument('--dry-run', action='store_true', help='只输出推荐结果，不写入主机配置')
+
+
+def run_autotune_command(repo_root: str, args: argparse.Namespace):
+    autotune_stage(repo_root, args.stage, args.variant, args.local_root, args.workers, args.prefetch,
+                   args.max_batches, args.max_seconds, args.dry_run)
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description='loading_config自动调优')
+    parser.add_argument('--repo-root', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='数据仓库根目录')
+    add_autotune_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        run_autotune_command(args.repo_root, args)
+    except (ValueError, OSError, RuntimeError) as e:
+        print(f"❌ 调优失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+课程混合调度 - 按epoch变化的权重混合多个阶段的数据，替代阶段之间的硬切换
+
+stage_config.yaml 中的 mixtures 定义权重关键帧，关键帧之间线性插值，首尾之外保持端点权重:
+
+  mixtures:
+    curriculum_blend:
+      seed: 42
+      keyframes:
+        - epoch: 0
+          weights: {pretraining: 1.0}
+        - epoch: 50
+          weights: {pretraining: 0.7, finetuning: 0.3}
+
+每个epoch的计划预先计算：按权重把epoch样本数分给各阶段，由各阶段的 EpochSampler 生成索引，
+数据集序号映射到统一的数据集表后整体打乱，写入与 epoch_sampler 相同格式的内存映射 .npy。
+manifest中记录每个epoch的内容哈希，权重和阶段配置不变的epoch直接复用，训练时没有逐样本的Python开销。
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from stage_snapshot import StageSnapshotCache
+from epoch_sampler import (EpochSampler, largest_remainder, fill_plan, write_plan_file,
+                           load_manifest, save_manifest, parse_epochs, PLAN_DTYPE)
+
+
+def interpolate_weights(keyframes: List[Dict[str, Any]], epoch: int) -> Dict[str, float]:
+    """计算epoch处的阶段权重（关键帧间线性插值，归一化后返回，权重为0的阶段省略）"""
+    frames = sorted(keyframes, key=lambda frame: frame['epoch'])
+    if epoch <= frames[0]['epoch']:
+        weights = dict(frames[0]['weights'])
+    elif epoch >= frames[-1]['epoch']:
+        weights = dict(frames[-1]['weights'])
+    else:
+        for left, right in zip(frames, frames[1:]):
+            if left['epoch'] <= epoch <= right['epoch']:
+                t = (epoch - left['epoch']) / (right['epoch'] - left['epoch'])
+                stages = list(dict.fromkeys(list(left['weights']) + list(right['weights'])))
+                weights = {stage: (1 - t) * left['weights'].get(stage, 0.0) + t * right['weights'].get(stage, 0.0)
+                           for stage in stages}
+                break
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"epoch {epoch} 的混合权重总和必须大于0")
+    return {stage: weight / total for stage, weight in weights.items() if weight > 0}
+
+
+class MixtureScheduler:
+    """多阶段混合的epoch计划生成器"""
+
+    def __init__(self, repo_root: str, mixture: str):
+        """
+        Args:
+            repo_root: 数据仓库根目录
+            mixture: stage_config.yaml中mixtures下的名称
+        """
+        self.repo_root = os.path.abspath(repo_root)
+        self.name = mixture
+        self.snapshot = StageSnapshotCache(self.repo_root)
+
+        mixtures = self.snapshot.stage_config().get('mixtures') or {}
+        if mixture not in mixtures:
+            raise ValueError(f"未定义的混合配置: {mixture}" + (f"，可用: {', '.join(mixtures)}" if mixtures else ""))
+        self.config = mixtures[mixture]
+        self.keyframes = self.config.get('keyframes') or []
+        if not self.keyframes:
+            raise ValueError(f"混合配置 {mixture} 没有keyframes")
+        self.seed = int(self.config.get('seed', 0))
+        self.epoch_size = self.config.get('epoch_size')
+
+        self.samplers: Dict[str, EpochSampler] = {}
+        for stage in dict.fromkeys(stage for frame in self.keyframes for stage in frame['weights']):
+            document = self.snapshot.stage_document(stage)
+            if document is None:
+                raise ValueError(f"混合配置 {mixture} 引用的阶段不可用: {stage}")
+            self.samplers[stage] = EpochSampler(document)
+
+        # 统一的数据集表：各阶段的数据集依次排列
+        self.offsets: Dict[str, int] = {}
+        self.datasets: List[Dict[str, Any]] = []
+        for stage, sampler in self.samplers.items():
+            self.offsets[stage] = len(self.datasets)
+            self.datasets.extend({'stage': stage, 'name': ds['name'], 'obs_path': ds['obs_path'],
+                                  'clips': ds['clips']} for ds in sampler.datasets)
+
+    @property
+    def warnings(self) -> List[str]:
+        return [f"{stage}: {warning}" for stage, sampler in self.samplers.items() for warning in sampler.warnings]
+
+    def weights_at(self, epoch: int) -> Dict[str, float]:
+        return interpolate_weights(self.keyframes, epoch)
+
+    def stage_counts(self, epoch: int) -> Dict[str, int]:
+        """各阶段在该epoch的样本数"""
+        weights = self.weights_at(epoch)
+        stages = list(weights)
+        if self.epoch_size:
+            total = int(self.epoch_size)
+        else:
+            # 默认按权重平均各阶段自身的epoch大小，混合过程中epoch长度平滑变化
+            total = int(round(sum(weights[s] * self.samplers[s].epoch_size for s in stages)))
+        counts = largest_remainder(total, np.array([weights[s] for s in stages], dtype=np.float64))
+        return {stage: int(count) for stage, count in zip(stages, counts)}
+
+    def _components(self, epoch: int) -> List[Tuple[str, EpochSampler]]:
+        """按该epoch的样本数重新分配各阶段采样器（沿用阶段自身的ratio和seed）"""
+        components = []
+        for stage, count in self.stage_counts(epoch).items():
+            if count > 0:
+                base = self.samplers[stage]
+                components.append((stage, EpochSampler(base.document, epoch_size=count)))
+        return components
+
+    def epoch_hash(self, epoch: int) -> str:
+        """epoch计划内容的哈希"""
+        payload = json.dumps({
+            'seed': self.seed,
+            'datasets': self.datasets,
+            'components': [(stage, sampler.config_hash()) for stage, sampler in self._components(epoch)]
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _fill(self, out: np.ndarray, epoch: int, components: List[Tuple[str, EpochSampler]]):
+        def blocks():
+            for stage, sampler in components:
+                offset = self.offsets[stage]
+                for dataset_id, clips in sampler.iter_blocks(epoch):
+                    yield offset + dataset_id, clips
+
+        positions = np.random.default_rng([self.seed, epoch]).permutation(len(out))
+        fill_plan(out, blocks(), positions)
+
+    def build_epoch(self, epoch: int) -> np.ndarray:
+        """在内存中生成混合后的epoch计划"""
+        components = self._components(epoch)
+        plan = np.empty(sum(int(s.targets.sum()) for _, s in components), dtype=PLAN_DTYPE)
+        self._fill(plan, epoch, components)
+        return plan
+
+    def write_epoch(self, epoch: int, output_dir: str) -> str:
+        """生成epoch计划并写入 output_dir/epoch_XXXX.npy，内容哈希未变化时直接复用"""
+        os.makedirs(output_dir, exist_ok=True)
+        plan_path = os.path.join(output_dir, f"epoch_{epoch:04d}.npy")
+        manifest = load_manifest(output_dir)
+        if manifest.get('datasets') != self.datasets:
+            # 数据集表变化后旧计划中的数据集序号失效
+            manifest = {'mixture': self.name, 'seed': self.seed, 'datasets': self.datasets, 'epochs': {}}
+
+        epoch_hash = self.epoch_hash(epoch)
+        cached = manifest['epochs'].get(str(epoch))
+        if cached and cached['hash'] == epoch_hash and os.path.exists(plan_path):
+            return plan_path
+
+        components = self._components(epoch)
+        total = sum(int(sampler.targets.sum()) for _, sampler in components)
+        write_plan_file(plan_path, total, lambda out: self._fill(out, epoch, components))
+
+        manifest['epochs'][str(epoch)] = {
+            'file': os.path.basename(plan_path),
+            'hash': epoch_hash,
+            'weights': {stage: round(w, 6) for stage, w in self.weights_at(epoch).items()},
+            'samples': {stage: int(sampler.targets.sum()) for stage, sampler in components}
+        }
+        save_manifest(output_dir, manifest)
+        return plan_path
+
+
+def main():
+    """命令行接口"""
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='课程混合调度')
+    parser.add_argument('--repo-root', default=default_root, help='数据仓库根目录')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    weights_parser = subparsers.add_parser('weights', help='查看各epoch的混合权重')
+    weights_parser.add_argument('mixture', help='混合配置名称')
+    weights_parser.add_argument('--epochs', default='0-9', help='epoch或范围 (默认: 0-9)')
+
+    plan_parser = subparsers.add_parser('plan', help='生成混合后的epoch计划')
+    plan_parser.add_argument('mixture', help='混合配置名称')
+    plan_parser.add_argument('--epochs', default='0', help='epoch或范围，如 0-9 (默认: 0)')
+    plan_parser.add_argument('--output-dir', help='输出目录 (默认: plans/mixtures/<mixture>)')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        scheduler = MixtureScheduler(args.repo_root, args.mixture)
+        for warning in scheduler.warnings:
+            print(f"⚠️  {warning}")
+
+        if args.command == 'weights':
+            print(f"🎚️  混合权重: {args.mixture}")
+            for epoch in parse_epochs(args.epochs):
+                counts = scheduler.stage_counts(epoch)
+                parts = [f"{stage} {weight:.1%} ({counts[stage]:,})" for stage, weight in scheduler.weights_at(epoch).items()]
+                print(f"   epoch {epoch:>4}: " + " | ".join(parts))
+
+        elif args.command == 'plan':
+            output_dir = args.output_dir or os.path.join(args.repo_root, 'plans', 'mixtures', args.mixture)
+            for epoch in parse_epochs(args.epochs):
+                path = scheduler.write_epoch(epoch, output_dir)
+                print(f"✅ epoch {epoch}: {path}")
+
+    except (ValueError, OSError) as e:
+        print(f"❌ 执行失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
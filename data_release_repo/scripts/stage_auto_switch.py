@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+阶段自动切换 - 增量读取训练指标JSONL，按stage_config.yaml的auto_switch_conditions触发阶段切换
+
+指标文件每行一个JSON对象，如 {"epoch": 12, "step": 3400, "loss": 0.231}，同名指标以最新一行为准。
+
+  - 只读取上次偏移之后新增的完整行，文件被截断或替换(inode变化)时从头读取
+  - 候选阶段为优先级高于当前阶段、且trigger_mode不是manual的阶段，阶段的全部条件满足时切换
+  - switch_strategy.auto_rollback 开启时，rollback_conditions 中 action 为 rollback 的条件满足后回退到 fallback_stage
+  - 条件在初始化时编译为 (指标, 比较函数, 阈值) 列表；没有新指标行时 poll() 只做一次stat
+  - 读取偏移和最新指标定期保存到状态文件，进程重启后继续从上次位置读取
+"""
+
+import os
+import json
+import time
+import operator
+from typing import Dict, List, Optional, Any, Tuple, Callable
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+# 保存读取状态的最小间隔(秒)，切换阶段时总是立即保存
+STATE_SAVE_INTERVAL = 5.0
+
+Condition = Tuple[str, str, Callable[[Any, Any], bool], Any]
+
+
+def compile_condition(condition: Dict[str, Any]) -> Optional[Condition]:
+    """
+    将auto_switch_conditions中的条目编译为 (指标, 运算符, 比较函数, 阈值)
+
+    epoch条件表示 epoch >= N；metric条件使用operator（默认 <）与threshold比较；
+    仅有描述、无法评估的条目返回None。
+    """
+    if 'epoch' in condition:
+        return 'epoch', '>=', OPERATORS['>='], condition['epoch']
+    if 'metric' in condition and 'threshold' in condition:
+        op = condition.get('operator', '<')
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的运算符: {op}")
+        return condition['metric'], op, OPERATORS[op], condition['threshold']
+    return None
+
+
+def describe_condition(condition: Condition) -> str:
+    metric, op, _, threshold = condition
+    return f"{metric} {op} {threshold}"
+
+
+class StageAutoSwitcher:
+    """基于训练指标的阶段自动切换评估器"""
+
+    def __init__(self, manager, metrics_path: str, state_path: Optional[str] = None):
+        """
+        Args:
+            manager: StageManager实例，提供config、get_current_stage和switch_stage
+            metrics_path: 训练指标JSONL文件
+            state_path: 读取状态文件，默认为 <metrics_path>.autoswitch.json
+        """
+        self.manager = manager
+        self.metrics_path = os.path.abspath(metrics_path)
+        self.state_path = state_path or f"{self.metrics_path}.autoswitch.json"
+
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.metrics: Dict[str, Any] = {}
+        self._dirty = False
+        self._last_saved = 0.0
+        self._load_state()
+
+        self.stages = manager.config['stages']
+        strategy = manager.config.get('switch_strategy', {})
+        self.enabled = strategy.get('mode', 'hybrid') != 'manual'
+        self.fallback_stage = strategy.get('fallback_stage')
+        self.rollback_conditions: List[Condition] = []
+        if strategy.get('auto_rollback'):
+            self.rollback_conditions = [c for c in (compile_condition(cond) for cond in strategy.get('rollback_conditions', [])
+                                                    if cond.get('action') == 'rollback') if c]
+
+        # 阶段名 -> 编译后的条件，按优先级排序
+        self.stage_conditions: List[Tuple[str, int, List[Condition]]] = []
+        for name, stage in self.stages.items():
+            if stage.get('trigger_mode') == 'manual':
+                continue
+            conditions = [c for c in (compile_condition(cond) for cond in stage.get('auto_switch_conditions') or []) if c]
+            if conditions:
+                self.stage_conditions.append((name, stage.get('priority', 999), conditions))
+        self.stage_conditions.sort(key=lambda item: item[1])
+
+    def read_new_metrics(self) -> int:
+        """读取新增的完整行并更新最新指标，返回新增行数"""
+        try:
+            stat = os.stat(self.metrics_path)
+        except OSError:
+            return 0
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # 文件被替换或截断，从头开始读取
+            self.inode, self.offset = stat.st_ino, 0
+            self._dirty = True
+        if stat.st_size == self.offset:
+            return 0
+
+        with open(self.metrics_path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+
+        # 末尾未写完的行留到下次读取
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+
+        count = 0
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                self.metrics.update(record)
+                count += 1
+
+        self.offset += end
+        self._dirty = True
+        return count
+
+    def evaluate(self) -> Optional[Tuple[str, str]]:
+        """
+        按当前指标评估切换条件
+
+        Returns:
+            (目标阶段, 切换原因)，无需切换时返回None
+        """
+        current_stage, _ = self.manager.get_current_stage()
+
+        if self.fallback_stage and current_stage != self.fallback_stage:
+            met = self._all_met(self.rollback_conditions, require_all=False)
+            if met:
+                return self.fallback_stage, f"auto_rollback: {met}"
+
+        if not self.enabled:
+            return None
+
+        current_priority = self.stages.get(current_stage, {}).get('priority', 999)
+        for name, priority, conditions in self.stage_conditions:
+            if priority <= current_priority:
+                continue
+            met = self._all_met(conditions)
+            if met:
+                return name, f"auto_switch: {met}"
+            # 只考虑紧邻的下一个可自动切换的阶段
+            break
+        return None
+
+    def poll(self) -> Optional[str]:
+        """
+        读取新指标并在条件满足时切换阶段（可在每个训练step调用）
+
+        Returns:
+            切换到的阶段，未切换时返回None
+        """
+        if not self.read_new_metrics():
+            self._maybe_save_state()
+            return None
+
+        decision = self.evaluate()
+        if decision is None:
+            self._maybe_save_state()
+            return None
+
+        target_stage, reason = decision
+        # 其他进程可能已经切换过阶段，切换前重新加载激活状态
+        self.manager.active_stage_info = self.manager._load_active_stage()
+        if self.manager.get_current_stage()[0] == target_stage:
+            self._maybe_save_state()
+            return None
+
+        switched = self.manager.switch_stage(target_stage, reason=reason, triggered_by='scheduler')
+        self._save_state()
+        return target_stage if switched else None
+
+    def close(self):
+        """保存读取状态"""
+        if self._dirty:
+            self._save_state()
+
+    def _all_met(self, conditions: List[Condition], require_all: bool = True) -> Optional[str]:
+        """检查条件，满足时返回条件描述"""
+        met = []
+        for condition in conditions:
+            metric, _, compare, threshold = condition
+            value = self.metrics.get(metric)
+            ok = value is not None and compare(value, threshold)
+            if ok:
+                met.append(describe_condition(condition))
+                if not require_all:
+                    return met[0]
+            elif require_all:
+                return None
+        return ', '.join(met) if met else None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('metrics_path') != self.metrics_path:
+            return
+        self.offset = state.get('offset', 0)
+        self.inode = state.get('inode')
+        self.metrics = state.get('metrics', {})
+
+    def _maybe_save_state(self):
+        if self._dirty and time.monotonic() - self._last_saved >= STATE_SAVE_INTERVAL:
+            self._save_state()
+
+    def _save_state(self):
+        state = {
+            'metrics_path': self.metrics_path,
+            'inode': self.inode,
+            'offset': self.offset,
+            'metrics': self.metrics,
+            'updated_at': time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+        self._dirty = False
+        self._last_saved = time.monotonic()
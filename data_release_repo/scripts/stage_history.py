@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+阶段切换历史日志 - 追加写入、按条数轮转的JSONL分段日志
+
+目录结构 (默认 stage_history/，与 active_stage.yaml 一起提交到仓库，克隆后审计记录完整):
+  index.json               分段索引 {'segments': [{'file', 'first_seq', 'count', 'first_at', 'last_at'}], 'next_seq', 'dropped'}
+  segment_000001.jsonl     每行一条已结束的切换记录
+
+active_stage.yaml 只保留当前进行中的记录，结束的记录追加到日志中；
+读取最近N条时只从最后的分段末尾向前读取，不解析完整历史。
+"""
+
+import os
+import json
+from typing import Dict, List, Any
+
+DEFAULT_HISTORY_DIR = "stage_history"
+INDEX_FILENAME = "index.json"
+SEGMENT_MAX_ENTRIES = 1000
+# 保留的分段数，超出后删除最旧的分段
+MAX_SEGMENTS = 100
+_TAIL_BLOCK_SIZE = 8192
+
+
+def _tail_lines(path: str, n: int) -> List[bytes]:
+    """从文件末尾向前按块读取最后n行"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b''
+        while position > 0 and buffer.count(b'\n') <= n:
+            step = min(_TAIL_BLOCK_SIZE, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+    lines = [line for line in buffer.splitlines() if line.strip()]
+    return lines[-n:] if n else []
+
+
+class StageHistoryLog:
+    """阶段切换历史的轮转日志"""
+
+    def __init__(self, history_dir: str, segment_max_entries: int = SEGMENT_MAX_ENTRIES,
+                 max_segments: int = MAX_SEGMENTS):
+        """
+        Args:
+            history_dir: 日志目录
+            segment_max_entries: 单个分段的最大记录数
+            max_segments: 保留的分段数
+        """
+        self.history_dir = history_dir
+        self.index_path = os.path.join(history_dir, INDEX_FILENAME)
+        self.segment_max_entries = segment_max_entries
+        self.max_segments = max_segments
+
+    def append(self, records: List[Dict[str, Any]]):
+        """追加已结束的切换记录，必要时轮转分段"""
+        if not records:
+            return
+        os.makedirs(self.history_dir, exist_ok=True)
+        index = self._load_index()
+
+        for record in records:
+            segments = index['segments']
+            if not segments or segments[-1]['count'] >= self.segment_max_entries:
+                segments.append({
+                    'file': f"segment_{len(segments) + index['dropped'] + 1:06d}.jsonl",
+                    'first_seq': index['next_seq'],
+                    'count': 0,
+                    'first_at': record.get('activated_at'),
+                    'last_at': None
+                })
+            segment = segments[-1]
+            line = json.dumps({'seq': index['next_seq'], **record}, ensure_ascii=False, default=str)
+            with open(os.path.join(self.history_dir, segment['file']), 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            segment['count'] += 1
+            segment['last_at'] = record.get('deactivated_at') or record.get('activated_at')
+            index['next_seq'] += 1
+
+        while len(index['segments']) > self.max_segments:
+            oldest = index['segments'].pop(0)
+            index['dropped'] += 1
+            try:
+                os.unlink(os.path.join(self.history_dir, oldest['file']))
+            except FileNotFoundError:
+                pass
+
+        self._save_index(index)
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """最近n条记录（按时间顺序）"""
+        records: List[Dict[str, Any]] = []
+        for segment in reversed(self._load_index()['segments']):
+            if len(records) >= n:
+                break
+            path = os.path.join(self.history_dir, segment['file'])
+            if not os.path.exists(path):
+                continue
+            lines = _tail_lines(path, n - len(records))
+            records[:0] = [json.loads(line) for line in lines]
+        return records
+
+    def count(self) -> int:
+        """已记录的切换总数（包括已轮转删除的分段）"""
+        return self._load_index()['next_seq']
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'segments': [], 'next_seq': 0, 'dropped': 0}
+
+    def _save_index(self, index: Dict[str, Any]):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
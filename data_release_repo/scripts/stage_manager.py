@@ -5,21 +5,34 @@
 
 import os
 import sys
-import json
 import yaml
 import argparse
 import subprocess
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 import hashlib
+import copy
 from pathlib import Path
 
+from stage_snapshot import StageSnapshotCache
+from stage_auto_switch import StageAutoSwitcher
+from stage_history import StageHistoryLog, DEFAULT_HISTORY_DIR
+from loading_autotuner import add_autotune_arguments, run_autotune_command
+
+# active_stage.yaml中保留的告警历史条数
+MAX_ALERT_HISTORY = 50
+
 class StageManager:
     def __init__(self, config_path: str = None):
         """初始化阶段管理器"""
         self.repo_root = self._get_repo_root()
         self.config_path = config_path or os.path.join(self.repo_root, "stage_config.yaml")
         self.active_stage_path = os.path.join(self.repo_root, "active_stage.yaml")
+        # 阶段配置快照，避免每次验证/预览都重新解析stages/*.json
+        self.snapshot = StageSnapshotCache(self.repo_root, self.config_path)
+        # 已结束的切换记录保存在轮转日志中，active_stage.yaml只保留进行中的记录
+        self.history_log = StageHistoryLog(os.path.join(self.repo_root, DEFAULT_HISTORY_DIR))
         
         # 加载配置
         self.config = self._load_config()
@@ -33,8 +46,7 @@ class StageManager:
     def _load_config(self) -> Dict[str, Any]:
         """加载阶段配置"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return self.snapshot.stage_config()
         except FileNotFoundError:
             print(f"❌ 配置文件不存在: {self.config_path}")
             sys.exit(1)
@@ -109,9 +121,17 @@ class StageManager:
         return default_config
     
     def _save_active_stage(self, config: Dict[str, Any]):
-        """保存激活阶段配置"""
-        with open(self.active_stage_path, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+        """保存激活阶段配置（临时文件 + rename 原子替换，运行中的StageWatcher不会读到半个文件）"""
+        tmp_path = f"{self.active_stage_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.active_stage_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
     
     def _get_stage_config_path(self, stage: str, variant: str = None) -> str:
         """获取阶段配置文件路径"""
@@ -149,70 +169,32 @@ class StageManager:
         
         return sorted(stages, key=lambda x: x['priority'])
     
+    def _snapshot_entry(self, stage: str, variant: str = None) -> Optional[Dict[str, Any]]:
+        """获取阶段(变体)在快照中的条目，阶段不支持变体时忽略variant"""
+        stage_config = self.config['stages'][stage]
+        return self.snapshot.entry(stage, variant if variant and 'variants' in stage_config else None)
+    
     def validate_stage_config(self, stage: str, variant: str = None) -> List[str]:
-        """验证阶段配置文件"""
+        """验证阶段配置文件（使用快照中预先完成的验证结果）"""
         errors = []
         
         try:
             config_path = self._get_stage_config_path(stage, variant)
-            
-            if not os.path.exists(config_path):
+            entry = self._snapshot_entry(stage, variant)
+            if entry is None:
                 errors.append(f"配置文件不存在: {config_path}")
                 return errors
             
-            with open(config_path, 'r', encoding='utf-8') as f:
-                stage_config = json.load(f)
-            
-            # 基本字段验证
-            required_fields = ['meta', 'dataset_index']
-            for field in required_fields:
-                if field not in stage_config:
-                    errors.append(f"缺少必需字段: {field}")
-            
-            # meta字段验证
-            if 'meta' in stage_config:
-                meta = stage_config['meta']
-                required_meta_fields = ['stage', 'consumer_version', 'bundle_versions', 'description', 'version']
-                for field in required_meta_fields:
-                    if field not in meta:
-                        errors.append(f"meta缺少必需字段: {field}")
-                
-                # 验证阶段名称一致性
-                if meta.get('stage') != stage:
-                    errors.append(f"配置文件中的阶段名称({meta.get('stage')})与请求的阶段({stage})不一致")
-            
-            # 数据集索引验证
-            if 'dataset_index' in stage_config:
-                dataset_index = stage_config['dataset_index']
-                if not isinstance(dataset_index, list):
-                    errors.append("dataset_index必须是列表类型")
-                else:
-                    dataset_names = []
-                    for i, dataset in enumerate(dataset_index):
-                        if not isinstance(dataset, dict):
-                            errors.append(f"数据集索引{i}必须是对象类型")
-                            continue
-                        
-                        required_dataset_fields = ['name', 'obs_path', 'bundle_versions', 'duplicate']
-                        for field in required_dataset_fields:
-                            if field not in dataset:
-                                errors.append(f"数据集索引{i}缺少必需字段: {field}")
-                        
-                        # 检查数据集名称唯一性
-                        name = dataset.get('name')
-                        if name in dataset_names:
-                            errors.append(f"数据集名称重复: {name}")
-                        dataset_names.append(name)
-        
-        except json.JSONDecodeError as e:
-            errors.append(f"JSON格式错误: {e}")
+            errors.extend(entry['errors'])
+        
         except Exception as e:
             errors.append(f"配置验证错误: {e}")
         
         return errors
     
-    def switch_stage(self, target_stage: str, variant: str = None, reason: str = "manual_switch") -> bool:
-        """切换到指定阶段"""
+    def switch_stage(self, target_stage: str, variant: str = None, reason: str = "manual_switch",
+                     triggered_by: str = "user") -> bool:
+        """切换到指定阶段（triggered_by: system | user | scheduler）"""
         print(f"🔄 切换阶段: {self.active_stage_info['current_stage']} → {target_stage}")
         
         # 验证目标阶段
@@ -240,13 +222,16 @@ class StageManager:
         current_stage = self.active_stage_info['current_stage']
         
         # 更新历史记录
-        if self.active_stage_info['history']:
-            last_record = self.active_stage_info['history'][-1]
+        history = self.active_stage_info.get('history') or []
+        if history:
+            last_record = history[-1]
             if last_record.get('deactivated_at') is None:
                 last_record['deactivated_at'] = now
                 activated_time = datetime.strptime(last_record['activated_at'], "%Y-%m-%d %H:%M:%S")
                 deactivated_time = datetime.strptime(now, "%Y-%m-%d %H:%M:%S")
                 last_record['duration'] = str(deactivated_time - activated_time)
+        # 结束的记录（包括旧版本文件中累积的完整历史）移入轮转日志
+        self.history_log.append(history)
         
         # 添加新记录
         new_record = {
@@ -256,15 +241,15 @@ class StageManager:
             'deactivated_at': None,
             'duration': None,
             'reason': reason,
-            'triggered_by': 'user'
+            'triggered_by': triggered_by
         }
-        self.active_stage_info['history'].append(new_record)
+        self.active_stage_info['history'] = [new_record]
         
         # 更新当前阶段信息
         self.active_stage_info['current_stage'] = target_stage
         self.active_stage_info['current_variant'] = variant
         self.active_stage_info['activated_at'] = now
-        self.active_stage_info['activated_by'] = 'user'
+        self.active_stage_info['activated_by'] = triggered_by
         self.active_stage_info['switch_reason'] = reason
         self.active_stage_info['config_file'] = self._get_stage_config_path(target_stage, variant)
         
@@ -294,7 +279,9 @@ class StageManager:
             'resolved': True,
             'resolved_at': now
         }
-        self.active_stage_info['alerts']['alert_history'].append(alert)
+        alert_history = self.active_stage_info['alerts']['alert_history']
+        alert_history.append(alert)
+        del alert_history[:-MAX_ALERT_HISTORY]
         
         # 保存配置
         self._save_active_stage(self.active_stage_info)
@@ -356,42 +343,30 @@ class StageManager:
             'current_metrics': self.active_stage_info['current_metrics'],
             'next_stage': self.active_stage_info['next_stage'],
             'active_alerts_count': len(self.active_stage_info['alerts']['active_alerts']),
-            'total_stage_switches': len(self.active_stage_info['history'])
+            'total_stage_switches': self.history_log.count() + len(self.active_stage_info.get('history') or [])
         }
         
         return status
     
+    def get_recent_history(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """最近的切换记录（只读取轮转日志的末尾）"""
+        inline = self.active_stage_info.get('history') or []
+        if len(inline) >= limit:
+            return inline[-limit:]
+        return self.history_log.tail(limit - len(inline)) + inline
+    
     def preview_stage_config(self, stage: str, variant: str = None) -> Dict[str, Any]:
-        """预览阶段配置"""
+        """预览阶段配置（使用快照中预先聚合的统计）"""
         try:
             config_path = self._get_stage_config_path(stage, variant)
+            entry = self._snapshot_entry(stage, variant)
+            if entry is None:
+                return {'error': f"配置文件不存在: {config_path}"}
+            if entry['preview'] is None:
+                return {'error': entry['preview_error']}
             
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            # 提取关键信息
-            preview = {
-                'stage': stage,
-                'variant': variant,
-                'config_file': config_path,
-                'meta': config.get('meta', {}),
-                'dataset_count': len(config.get('dataset_index', [])),
-                'total_clips': sum(ds.get('duplicate', 1) for ds in config.get('dataset_index', [])),
-                'stage_config': config.get('meta', {}).get('stage_config', {}),
-                'datasets': []
-            }
-            
-            # 数据集摘要
-            for dataset in config.get('dataset_index', []):
-                ds_info = {
-                    'name': dataset.get('name'),
-                    'clips': dataset.get('duplicate', 1),
-                    'weight': dataset.get('stage_weight', 0),
-                    'priority': dataset.get('sampling_priority', 'medium'),
-                    'enabled': dataset.get('enabled', True)
-                }
-                preview['datasets'].append(ds_info)
-            
+            preview = copy.deepcopy(entry['preview'])
+            preview['config_file'] = config_path
             return preview
             
         except Exception as e:
@@ -429,8 +404,11 @@ class StageManager:
         
         # 历史记录
         report_lines.append("## 切换历史")
-        if self.active_stage_info['history']:
-            for record in self.active_stage_info['history'][-10:]:  # 最近10次
+        report_lines.append(f"完整历史共 {self.history_log.count()} 条，保存在 {DEFAULT_HISTORY_DIR}/ (随仓库提交)")
+        report_lines.append("")
+        recent_history = self.get_recent_history(10)
+        if recent_history:
+            for record in recent_history:  # 最近10次
                 duration = record.get('duration', '进行中')
                 variant_info = f" ({record['variant']})" if record.get('variant') else ""
                 report_lines.append(f"- **{record['stage']}{variant_info}**")
@@ -499,6 +477,20 @@ def main():
     validate_parser.add_argument('stage', help='阶段名称')
     validate_parser.add_argument('--variant', help='阶段变体')
     
+    # 编译快照
+    subparsers.add_parser('compile-snapshot', help='重新编译阶段配置快照')
+    
+    # 自动切换
+    auto_switch_parser = subparsers.add_parser('auto-switch', help='根据训练指标自动切换阶段')
+    auto_switch_parser.add_argument('--metrics', required=True, help='训练指标JSONL文件')
+    auto_switch_parser.add_argument('--state', help='读取状态文件 (默认: <metrics>.autoswitch.json)')
+    auto_switch_parser.add_argument('--follow', action='store_true', help='持续跟踪指标文件')
+    auto_switch_parser.add_argument('--interval', type=float, default=5.0, help='跟踪间隔(秒)')
+    
+    # 调优loading_config
+    autotune_parser = subparsers.add_parser('autotune', help='在本机测试并推荐loading_config（写入host_profiles）')
+    add_autotune_arguments(autotune_parser)
+    
     # 生成报告
     report_parser = subparsers.add_parser('report', help='生成阶段报告')
     report_parser.add_argument('--output', help='输出文件路径')
@@ -587,6 +579,32 @@ def main():
             else:
                 print(f"✅ 配置验证通过: {args.stage}" + (f" ({args.variant})" if args.variant else ""))
         
+        elif args.command == 'compile-snapshot':
+            snapshot = manager.snapshot.compile()
+            print(f"📦 已编译阶段快照: {manager.snapshot.snapshot_path}")
+            for key, entry in snapshot['entries'].items():
+                status = "❌" if entry['errors'] else "✅"
+                print(f"   {status} {key}" + (f": {len(entry['errors'])} 个错误" if entry['errors'] else ""))
+        
+        elif args.command == 'auto-switch':
+            switcher = StageAutoSwitcher(manager, args.metrics, args.state)
+            try:
+                while True:
+                    switched = switcher.poll()
+                    if switched:
+                        print(f"🤖 已自动切换到阶段: {switched}")
+                    elif not args.follow:
+                        current_stage, _ = manager.get_current_stage()
+                        print(f"📊 当前阶段: {current_stage} | 最新指标: {switcher.metrics}")
+                    if not args.follow:
+                        break
+                    time.sleep(args.interval)
+            finally:
+                switcher.close()
+        
+        elif args.command == 'autotune':
+            run_autotune_command(manager.repo_root, args)
+        
         elif args.command == 'report':
             report = manager.generate_stage_report(args.output)
             if not args.output:
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+阶段配置快照 - 将stage_config.yaml和所有阶段/变体的配置文件编译为一个二进制快照
+
+快照中包含解析后的配置、预先完成的验证结果和聚合统计（数据集数、clips总数等），
+按源文件签名(mtime, size)失效。训练节点查询阶段或预览配置时只需stat源文件并读取一个快照文件。
+"""
+
+import os
+import sys
+import copy
+import json
+import pickle
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+import yaml
+
+SNAPSHOT_FILENAME = ".stage_snapshot.pkl"
+# 快照结构或验证规则变化时递增，使旧快照失效
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def validate_stage_document(stage: str, stage_config: Any) -> List[str]:
+    """验证阶段配置文件内容"""
+    errors = []
+
+    if not isinstance(stage_config, dict):
+        return ["配置文件必须是JSON对象"]
+
+    # 基本字段验证
+    required_fields = ['meta', 'dataset_index']
+    for field in required_fields:
+        if field not in stage_config:
+            errors.append(f"缺少必需字段: {field}")
+
+    # meta字段验证
+    if 'meta' in stage_config:
+        meta = stage_config['meta']
+        required_meta_fields = ['stage', 'consumer_version', 'bundle_versions', 'description', 'version']
+        for field in required_meta_fields:
+            if field not in meta:
+                errors.append(f"meta缺少必需字段: {field}")
+
+        # 验证阶段名称一致性
+        if meta.get('stage') != stage:
+            errors.append(f"配置文件中的阶段名称({meta.get('stage')})与请求的阶段({stage})不一致")
+
+    # 数据集索引验证
+    if 'dataset_index' in stage_config:
+        dataset_index = stage_config['dataset_index']
+        if not isinstance(dataset_index, list):
+            errors.append("dataset_index必须是列表类型")
+        else:
+            dataset_names = set()
+            for i, dataset in enumerate(dataset_index):
+                if not isinstance(dataset, dict):
+                    errors.append(f"数据集索引{i}必须是对象类型")
+                    continue
+
+                required_dataset_fields = ['name', 'obs_path', 'bundle_versions', 'duplicate']
+                for field in required_dataset_fields:
+                    if field not in dataset:
+                        errors.append(f"数据集索引{i}缺少必需字段: {field}")
+
+                # 检查数据集名称唯一性
+                name = dataset.get('name')
+                if name in dataset_names:
+                    errors.append(f"数据集名称重复: {name}")
+                dataset_names.add(name)
+
+    return errors
+
+
+def build_stage_preview(stage: str, variant: Optional[str], stage_config: Dict[str, Any]) -> Dict[str, Any]:
+    """提取阶段配置的预览信息和聚合统计（不含config_file，由调用方补充绝对路径）"""
+    dataset_index = [ds for ds in stage_config.get('dataset_index', []) if isinstance(ds, dict)]
+    meta = stage_config.get('meta', {})
+
+    scenario_clips: Dict[str, int] = {}
+    for dataset in dataset_index:
+        scenario = dataset.get('metadata', {}).get('scenario_type', 'unknown')
+        scenario_clips[scenario] = scenario_clips.get(scenario, 0) + dataset.get('metadata', {}).get('estimated_clips', 0)
+
+    preview = {
+        'stage': stage,
+        'variant': variant,
+        'meta': meta,
+        'dataset_count': len(dataset_index),
+        'total_clips': sum(ds.get('duplicate', 1) for ds in dataset_index),
+        'enabled_count': sum(1 for ds in dataset_index if ds.get('enabled', True)),
+        'total_estimated_clips': sum(scenario_clips.values()),
+        'scenario_clips': scenario_clips,
+        'stage_weight_sum': round(sum(ds.get('stage_weight', 0) for ds in dataset_index), 6),
+        'stage_config': meta.get('stage_config', {}),
+        'datasets': []
+    }
+
+    # 数据集摘要
+    for dataset in dataset_index:
+        preview['datasets'].append({
+            'name': dataset.get('name'),
+            'clips': dataset.get('duplicate', 1),
+            'weight': dataset.get('stage_weight', 0),
+            'priority': dataset.get('sampling_priority', 'medium'),
+            'enabled': dataset.get('enabled', True)
+        })
+
+    return preview
+
+
+def entry_key(stage: str, variant: Optional[str] = None) -> str:
+    """快照条目键"""
+    return f"{stage}/{variant}" if variant else stage
+
+
+class StageSnapshotCache:
+    """阶段配置快照的加载、失效检查和重新编译"""
+
+    def __init__(self, repo_root: str = ".", config_path: Optional[str] = None,
+                 snapshot_path: Optional[str] = None):
+        """
+        Args:
+            repo_root: 数据仓库根目录
+            config_path: stage_config.yaml路径，默认 repo_root/stage_config.yaml
+            snapshot_path: 快照文件路径，默认 repo_root/.stage_snapshot.pkl
+        """
+        self.repo_root = os.path.abspath(repo_root)
+        self.config_path = os.path.abspath(config_path or os.path.join(self.repo_root, "stage_config.yaml"))
+        self.snapshot_path = snapshot_path or os.path.join(self.repo_root, SNAPSHOT_FILENAME)
+        self._snapshot: Optional[Dict[str, Any]] = None
+
+    def load(self) -> Dict[str, Any]:
+        """
+        获取有效的快照：内存 → 快照文件 → 重新编译
+
+        Raises:
+            FileNotFoundError: stage_config.yaml不存在
+            yaml.YAMLError: stage_config.yaml格式错误
+        """
+        if self._snapshot is not None and self._is_fresh(self._snapshot):
+            return self._snapshot
+
+        snapshot = self._read_snapshot()
+        if snapshot is None or not self._is_fresh(snapshot):
+            snapshot = self.compile()
+        self._snapshot = snapshot
+        return snapshot
+
+    def compile(self, write: bool = True) -> Dict[str, Any]:
+        """重新编译快照，write为True时原子写入快照文件（目录不可写时只保留在内存）"""
+        sources = {self.config_path: self._signature(self.config_path)}
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            stage_config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+        entries = {}
+        for stage, variant, rel_path in self._iter_stage_files(stage_config):
+            abs_path = os.path.join(self.repo_root, rel_path)
+            sources[abs_path] = self._signature(abs_path)
+            entries[entry_key(stage, variant)] = self._compile_entry(stage, variant, rel_path, abs_path)
+
+        snapshot = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'compiled_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'sources': sources,
+            'stage_config': stage_config,
+            'entries': entries
+        }
+        if write:
+            self._write_snapshot(snapshot)
+        self._snapshot = snapshot
+        return snapshot
+
+    def stage_config(self) -> Dict[str, Any]:
+        """解析后的stage_config.yaml"""
+        return self.load()['stage_config']
+
+    def entry(self, stage: str, variant: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取阶段(变体)的快照条目，不存在时返回None"""
+        return self.load()['entries'].get(entry_key(stage, variant))
+
+    def stage_document(self, stage: str, variant: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取阶段配置文件内容的副本，文件缺失或无法解析时返回None"""
+        entry = self.entry(stage, variant)
+        if entry is None or entry['document'] is None:
+            return None
+        return copy.deepcopy(entry['document'])
+
+    def config_file(self, entry: Dict[str, Any]) -> str:
+        """快照条目对应配置文件的绝对路径"""
+        return os.path.join(self.repo_root, entry['config_file'])
+
+    def _compile_entry(self, stage: str, variant: Optional[str], rel_path: str, abs_path: str) -> Dict[str, Any]:
+        """编译单个阶段(变体)条目"""
+        entry = {
+            'stage': stage,
+            'variant': variant,
+            'config_file': rel_path,
+            'document': None,
+            'errors': [],
+            'preview': None,
+            'preview_error': None
+        }
+
+        if not os.path.exists(abs_path):
+            entry['errors'] = [f"配置文件不存在: {abs_path}"]
+            entry['preview_error'] = f"[Errno 2] No such file or directory: '{abs_path}'"
+            return entry
+
+        try:
+            with open(abs_path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except json.JSONDecodeError as e:
+            entry['errors'] = [f"JSON格式错误: {e}"]
+            entry['preview_error'] = str(e)
+            return entry
+
+        entry['document'] = document
+        try:
+            entry['errors'] = validate_stage_document(stage, document)
+        except Exception as e:
+            entry['errors'] = [f"配置验证错误: {e}"]
+        try:
+            entry['preview'] = build_stage_preview(stage, variant, document)
+        except Exception as e:
+            entry['preview_error'] = str(e)
+        return entry
+
+    @staticmethod
+    def _iter_stage_files(stage_config: Dict[str, Any]):
+        """遍历所有阶段及变体的配置文件 -> (stage, variant, 相对路径)"""
+        for stage, stage_def in (stage_config.get('stages') or {}).items():
+            if stage_def.get('config_file'):
+                yield stage, None, stage_def['config_file']
+            for variant, variant_def in (stage_def.get('variants') or {}).items():
+                if variant_def.get('config_file'):
+                    yield stage, variant, variant_def['config_file']
+
+    def _is_fresh(self, snapshot: Dict[str, Any]) -> bool:
+        """检查快照的格式版本和所有源文件签名"""
+        if snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            return False
+        if self.config_path not in snapshot['sources']:
+            return False
+        return all(self._signature(path) == signature for path, signature in snapshot['sources'].items())
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        return snapshot if isinstance(snapshot, dict) else None
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            # 只读的训练节点上快照只保留在内存
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description='阶段配置快照工具')
+    parser.add_argument('--repo-root', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='数据仓库根目录')
+    parser.add_argument('--config', help='阶段配置文件路径')
+    args = parser.parse_args()
+
+    try:
+        cache = StageSnapshotCache(args.repo_root, args.config)
+        snapshot = cache.compile()
+    except (OSError, yaml.YAMLError) as e:
+        print(f"❌ 编译快照失败: {e}")
+        sys.exit(1)
+
+    print(f"📦 已编译阶段快照: {cache.snapshot_path}")
+    for key, entry in snapshot['entries'].items():
+        if entry['errors']:
+            print(f"   ❌ {key}: {len(entry['errors'])} 个错误")
+        else:
+            preview = entry['preview']
+            print(f"   ✅ {key}: {preview['dataset_count']} 个数据集, {preview['total_clips']:,} clips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+激活阶段热更新 - 训练进程无需重启即可感知 active_stage.yaml 的阶段切换
+
+  - 后台线程通过inotify（ctypes调用libc）监听仓库目录，不支持inotify的平台回退为定时stat轮询
+  - 检测到阶段(变体)变化后，在后台线程中读取阶段快照并构建新的数据计划，放入待生效槽位
+  - 训练循环在每个epoch结束时调用 epoch_boundary()，待生效的计划在此刻原子替换当前计划
+  - 每个训练step不做任何检查，热更新的开销只发生在后台线程和epoch边界
+
+StageManager 通过临时文件 + os.replace 写入 active_stage.yaml，监听方不会读到写了一半的文件。
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import argparse
+import threading
+import ctypes
+import ctypes.util
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+import yaml
+
+from stage_snapshot import StageSnapshotCache
+
+ACTIVE_STAGE_FILENAME = "active_stage.yaml"
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify事件掩码（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _InotifyBackend:
+    """基于inotify的目录监听（监听目录而不是文件，os.replace会替换文件的inode）"""
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.filename = os.fsencode(os.path.basename(path))
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        directory = os.fsencode(os.path.dirname(os.path.abspath(path)))
+        if libc.inotify_add_watch(self.fd, directory, _INOTIFY_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, "inotify_add_watch失败")
+
+    def wait(self, timeout: float) -> bool:
+        """等待至多timeout秒，目标文件发生变化时返回True"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            offset = 0
+            while offset < len(data):
+                _, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b'\0')
+                offset += name_len
+                if name == self.filename:
+                    changed = True
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    """定时stat轮询，按(mtime_ns, size, inode)判断文件变化"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.signature = self._signature()
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(timeout)
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def close(self):
+        pass
+
+
+class StageWatcher:
+    """监听激活阶段并在epoch边界切换数据计划"""
+
+    def __init__(self, repo_root: str = ".", plan_factory: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True):
+        """
+        Args:
+            repo_root: 数据仓库根目录
+            plan_factory: 由阶段配置文件内容构建数据计划的函数（如 EpochSampler），默认直接使用配置内容
+            poll_interval: 轮询间隔；使用inotify时为后台线程检查停止信号的间隔
+            use_inotify: 是否尝试使用inotify
+        """
+        self.repo_root = os.path.abspath(repo_root)
+        self.active_stage_path = os.path.join(self.repo_root, ACTIVE_STAGE_FILENAME)
+        self.plan_factory = plan_factory or (lambda document: document)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.snapshot = StageSnapshotCache(self.repo_root)
+
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._backend = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # 当前生效的计划和等待epoch边界生效的计划
+        self._current: Optional[Dict[str, Any]] = None
+        self._pending: Optional[Dict[str, Any]] = None
+        self._current = self._load_active()
+        if self._current is None:
+            raise ValueError(f"无法加载激活阶段: {self.active_stage_path}")
+
+    @property
+    def current(self) -> Dict[str, Any]:
+        """当前生效的阶段 {'stage', 'variant', 'activated_at', 'document', 'plan'}"""
+        return self._current
+
+    @property
+    def backend_name(self) -> str:
+        return 'inotify' if isinstance(self._backend, _InotifyBackend) else 'polling'
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """
+        订阅阶段切换通知，回调在后台线程中以待生效的阶段调用
+
+        Returns:
+            取消订阅的函数
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def epoch_boundary(self) -> Dict[str, Any]:
+        """在epoch边界调用：如有待生效的阶段则原子替换，返回本epoch使用的阶段"""
+        if self._pending is not None:
+            with self._lock:
+                if self._pending is not None:
+                    self._current, self._pending = self._pending, None
+                    print(f"🔄 数据计划已切换到阶段: {self._describe(self._current)}")
+        return self._current
+
+    def check(self) -> bool:
+        """同步检查一次激活阶段（不启动后台线程时使用），发现新阶段时返回True"""
+        active = self._load_active()
+        if active is None:
+            return False
+
+        latest = self._pending or self._current
+        if self._stage_key(active) == self._stage_key(latest):
+            return False
+
+        with self._lock:
+            self._pending = active
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(active)
+            except Exception as e:
+                print(f"⚠️  阶段切换回调失败: {e}")
+        return True
+
+    def start(self) -> 'StageWatcher':
+        """启动后台监听线程"""
+        if self._thread is not None:
+            return self
+
+        self._backend = None
+        if self.use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._backend = _InotifyBackend(self.active_stage_path)
+            except (OSError, AttributeError):
+                self._backend = None
+        if self._backend is None:
+            self._backend = _PollingBackend(self.active_stage_path)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stage-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台监听线程"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._backend.close()
+        self._backend = None
+
+    def __enter__(self) -> 'StageWatcher':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._backend.wait(self.poll_interval):
+                    self.check()
+            except Exception as e:
+                print(f"⚠️  激活阶段监听出错: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _load_active(self) -> Optional[Dict[str, Any]]:
+        """读取active_stage.yaml并构建数据计划，文件或阶段配置不可用时返回None"""
+        try:
+            with open(self.active_stage_path, 'r', encoding='utf-8') as f:
+                active = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        except (OSError, yaml.YAMLError) as e:
+            print(f"⚠️  无法读取激活阶段文件: {e}")
+            return None
+        if not isinstance(active, dict) or not active.get('current_stage'):
+            return None
+
+        stage, variant = active['current_stage'], active.get('current_variant')
+        activated_at = active.get('activated_at')
+        latest = self._pending or self._current
+        if latest and self._stage_key(latest) == (stage, variant, activated_at):
+            # 同一次激活（如仅更新了指标），不重新构建计划
+            return latest
+
+        try:
+            document = self.snapshot.stage_document(stage, variant)
+        except (OSError, yaml.YAMLError) as e:
+            print(f"⚠️  阶段快照不可用: {e}")
+            return None
+        if document is None:
+            print(f"⚠️  阶段配置不可用，保持当前计划: {stage}" + (f" ({variant})" if variant else ""))
+            return None
+
+        return {
+            'stage': stage,
+            'variant': variant,
+            'activated_at': activated_at,
+            'document': document,
+            'plan': self.plan_factory(document)
+        }
+
+    @staticmethod
+    def _stage_key(active: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+        return active['stage'], active['variant'], active['activated_at']
+
+    @staticmethod
+    def _describe(active: Dict[str, Any]) -> str:
+        return active['stage'] + (f" ({active['variant']})" if active['variant'] else "")
+
+
+def main():
+    """命令行接口：持续监听并打印阶段切换"""
+    parser = argparse.ArgumentParser(description='激活阶段热更新监听')
+    parser.add_argument('--repo-root', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='数据仓库根目录')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help='轮询间隔(秒)')
+    parser.add_argument('--no-inotify', action='store_true', help='强制使用轮询')
+    args = parser.parse_args()
+
+    try:
+        watcher = StageWatcher(args.repo_root, poll_interval=args.poll_interval, use_inotify=not args.no_inotify)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    with watcher:
+        print(f"👀 监听 {watcher.active_stage_path} ({watcher.backend_name})")
+        print(f"📊 当前阶段: {watcher._describe(watcher.current)}")
+        watcher.subscribe(lambda active: print(f"📣 检测到阶段切换: {watcher._describe(active)}"))
+        try:
+            while True:
+                time.sleep(args.poll_interval)
+                watcher.epoch_boundary()
+        except KeyboardInterrupt:
+            print("\n👋 停止监听")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,44 +6,45 @@ Tag和Release创建辅助工具
 import os
 import sys
 import argparse
-import subprocess
 import json
 import yaml
 from datetime import datetime
 from typing import Dict, Optional, List, Any
 
+from git_session import GitSession, GitError
+from dataset_diff import diff_revisions, format_diff_markdown, training_tag
+
 class TagReleaseHelper:
     def __init__(self):
-        self.repo_root = self._get_repo_root()
-        
-    def _get_repo_root(self) -> str:
-        """获取Git仓库根目录"""
         try:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--show-toplevel'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
+            self.git = GitSession()
+        except GitError:
             print("❌ 当前目录不是Git仓库")
             sys.exit(1)
+        self.repo_root = self.git.repo_root
     
     def _run_git_command(self, cmd: List[str]) -> str:
         """执行Git命令"""
+        return self.git.run(cmd)
+    
+    def _create_tag(self, tag_name: str, annotation: str) -> bool:
+        """创建带注释的Tag，并询问是否推送"""
         try:
-            result = subprocess.run(
-                ['git'] + cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Git命令执行失败: {' '.join(cmd)}")
-            print(f"错误信息: {e.stderr}")
-            return ""
+            self.git.run(['tag', '-a', tag_name, '-m', annotation], check=True)
+            self.git.invalidate_tags()
+            print(f"✅ 成功创建Tag: {tag_name}")
+            
+            # 询问是否推送
+            push = input("🚀 是否推送Tag到远程仓库? (y/N): ").strip().lower()
+            if push == 'y':
+                self.git.run(['push', 'origin', tag_name], check=True)
+                print("✅ Tag已推送到远程仓库")
+            
+            return True
+            
+        except GitError as e:
+            print(f"❌ 创建Tag失败: {e}")
+            return False
     
     def get_dataset_info(self) -> Optional[Dict[str, Any]]:
         """从training_dataset.json获取数据集信息"""
@@ -70,8 +71,7 @@ class TagReleaseHelper:
         print(f"🏷️  创建专题数据交付Tag: {tag_name}")
         
         # 检查Tag是否已存在
-        existing_tags = self._run_git_command(['tag', '-l'])
-        if tag_name in existing_tags.split('\n'):
+        if self.git.tag_exists(tag_name):
             print(f"❌ Tag {tag_name} 已存在")
             return False
         
@@ -99,21 +99,7 @@ class TagReleaseHelper:
             tag_annotation = yaml.dump(tag_annotation_dict, default_flow_style=False, allow_unicode=True)
         
         # 创建带注释的Tag
-        try:
-            subprocess.run(['git', 'tag', '-a', tag_name, '-m', tag_annotation], check=True)
-            print(f"✅ 成功创建Tag: {tag_name}")
-            
-            # 询问是否推送
-            push = input("🚀 是否推送Tag到远程仓库? (y/N): ").strip().lower()
-            if push == 'y':
-                subprocess.run(['git', 'push', 'origin', tag_name], check=True)
-                print("✅ Tag已推送到远程仓库")
-            
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 创建Tag失败: {e}")
-            return False
+        return self._create_tag(tag_name, tag_annotation)
     
     def create_version_tag(self, version: str) -> bool:
         """创建大版本Tag"""
@@ -125,8 +111,7 @@ class TagReleaseHelper:
         print(f"🏷️  创建版本Tag: {tag_name}")
         
         # 检查Tag是否已存在
-        existing_tags = self._run_git_command(['tag', '-l'])
-        if tag_name in existing_tags.split('\n'):
+        if self.git.tag_exists(tag_name):
             print(f"❌ Tag {tag_name} 已存在")
             return False
         
@@ -163,21 +148,7 @@ class TagReleaseHelper:
         tag_annotation = yaml.dump(tag_annotation_dict, default_flow_style=False, allow_unicode=True)
         
         # 创建带注释的Tag
-        try:
-            subprocess.run(['git', 'tag', '-a', tag_name, '-m', tag_annotation], check=True)
-            print(f"✅ 成功创建版本Tag: {tag_name}")
-            
-            # 询问是否推送
-            push = input("🚀 是否推送Tag到远程仓库? (y/N): ").strip().lower()
-            if push == 'y':
-                subprocess.run(['git', 'push', 'origin', tag_name], check=True)
-                print("✅ Tag已推送到远程仓库")
-            
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 创建Tag失败: {e}")
-            return False
+        return self._create_tag(tag_name, tag_annotation)
     
     def generate_release_notes(self, version: str, previous_version: str = None) -> str:
         """生成Release说明"""
@@ -216,8 +187,10 @@ class TagReleaseHelper:
             release_notes += f"{i}. **{dataset_name}** - {clips_count:,} clips\n"
             release_notes += f"   - Bundle版本: {', '.join(bundle_versions)}\n"
         
-        # 变更日志 (需要手动补充)
+        # 变更日志 (数据集变更由上一个版本的Tag自动对比生成，其余需要手动补充)
         release_notes += "\n## 主要变更\n"
+        if previous_version:
+            release_notes += self._dataset_changes(version, previous_version) + "\n"
         release_notes += "### 新增功能\n"
         release_notes += "- TODO: 请补充新增功能\n\n"
         release_notes += "### 数据优化\n"
@@ -236,9 +209,8 @@ class TagReleaseHelper:
         # 获取变更历史 (如果有上一个版本)
         if previous_version:
             try:
-                previous_tag = f"training/{previous_version}"
-                current_commit = self._run_git_command(['rev-parse', 'HEAD'])
-                commits = self._run_git_command(['log', '--oneline', f'{previous_tag}..{current_commit}'])
+                previous_tag = training_tag(previous_version)
+                commits = self._run_git_command(['log', '--oneline', f'{previous_tag}..HEAD'])
                 
                 if commits:
                     release_notes += "## 提交历史\n"
@@ -254,6 +226,16 @@ class TagReleaseHelper:
         
         return release_notes
     
+    def _dataset_changes(self, version: str, previous_version: str) -> str:
+        """对比上一个版本Tag与当前版本（Tag不存在时使用工作区文件）的dataset_index"""
+        current_tag = training_tag(version)
+        new_rev = current_tag if self.git.tag_exists(current_tag) else None
+        try:
+            return format_diff_markdown(diff_revisions(self.git, training_tag(previous_version), new_rev))
+        except ValueError as e:
+            print(f"⚠️  无法生成数据集变更: {e}")
+            return "### 数据集变更\n- TODO: 请补充数据集变更\n"
+    
     def create_release_draft(self, version: str, previous_version: str = None) -> bool:
         """创建Release草稿"""
         if not version.startswith('v'):
@@ -262,8 +244,7 @@ class TagReleaseHelper:
         tag_name = f"training/{version}"
         
         # 检查Tag是否存在
-        existing_tags = self._run_git_command(['tag', '-l'])
-        if tag_name not in existing_tags.split('\n'):
+        if not self.git.tag_exists(tag_name):
             print(f"❌ Tag {tag_name} 不存在，请先创建Tag")
             return False
         
@@ -322,16 +303,12 @@ def main():
         helper.create_release_draft(args.version, args.previous)
     
     elif args.command == 'list-tags':
-        if args.pattern:
-            tags = helper._run_git_command(['tag', '-l', args.pattern])
-        else:
-            tags = helper._run_git_command(['tag', '-l'])
+        tags = helper.git.list_tags(args.pattern)
         
         if tags:
             print("📋 现有Tag列表:")
-            for tag in sorted(tags.split('\n')):
-                if tag:
-                    print(f"   • {tag}")
+            for tag in sorted(tags):
+                print(f"   • {tag}")
         else:
             print("ℹ️  没有找到Tag")
 
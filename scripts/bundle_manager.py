@@ -16,6 +16,8 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import semver
 
+from consumer_config_resolver import load_resolved_config
+
 class BundleManager:
     def __init__(self, root_path: str = "."):
         self.root_path = Path(root_path)
@@ -29,19 +31,30 @@ class BundleManager:
         if not consumer_file.exists():
             raise FileNotFoundError(f"Consumer config not found: {consumer_file}")
             
-        with open(consumer_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        # 解析latest指针和分支overlay的继承链
+        return load_resolved_config(consumer_file)
     
-    def get_available_versions(self, channel: str) -> List[str]:
-        """获取通道的所有可用版本"""
+    def _list_channel_files(self, channel: str) -> List[str]:
+        """列出通道目录中的文件名，目录不存在时返回空列表"""
         channel_dir = self.channels_path / channel
         if not channel_dir.exists():
             return []
-            
+        return [entry.name for entry in channel_dir.iterdir()]
+    
+    def _load_channel_file(self, channel: str, filename: str) -> Optional[Dict[str, Any]]:
+        """读取通道目录中的YAML文件，不存在时返回None"""
+        file_path = self.channels_path / channel / filename
+        if not file_path.exists():
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    
+    def get_available_versions(self, channel: str) -> List[str]:
+        """获取通道的所有可用版本"""
         versions = []
-        for spec_file in channel_dir.glob("spec-*.yaml"):
-            version = spec_file.stem.replace("spec-", "")
-            versions.append(version)
+        for filename in self._list_channel_files(channel):
+            if filename.startswith("spec-") and filename.endswith(".yaml"):
+                versions.append(filename[len("spec-"):-len(".yaml")])
             
         # 按语义化版本排序
         try:
@@ -52,11 +65,23 @@ class BundleManager:
             
         return versions
     
-    def resolve_version_constraint(self, channel: str, constraint: str) -> Optional[str]:
+    def resolve_version_constraint(self, channel: str, constraint) -> Optional[str]:
         """解析版本约束，返回具体版本"""
         available_versions = self.get_available_versions(channel)
         if not available_versions:
             return None
+        
+        # 候选列表（如 ["1.0.0", ">=1.0.0"]）：优先取第一个存在的具体版本，其次取第一个范围约束
+        if isinstance(constraint, list):
+            candidates = [str(item) for item in constraint]
+            for candidate in candidates:
+                if candidate in available_versions:
+                    return candidate
+            ranges = [c for c in candidates if c.startswith((">=", "^", "~"))]
+            if ranges:
+                return self.resolve_version_constraint(channel, ranges[0])
+            return available_versions[-1]
+        constraint = str(constraint)
             
         # 简化的版本解析逻辑
         if constraint.startswith(">="):
@@ -125,16 +150,11 @@ class BundleManager:
         # 简化逻辑：检查是否有明确的共存配置
         # 实际实现中应该检查通道的兼容性矩阵
         for channel, version in channels:
-            channel_dir = self.channels_path / channel
-            release_file = channel_dir / f"release-{version}.yaml"
+            release_config = self._load_channel_file(channel, f"release-{version}.yaml")
             
-            if release_file.exists():
-                with open(release_file, 'r', encoding='utf-8') as f:
-                    release_config = yaml.safe_load(f)
-                    
-                # 检查是否有共存配置
-                if 'coexistence' in release_config:
-                    return True
+            # 检查是否有共存配置
+            if release_config and 'coexistence' in release_config:
+                return True
                     
         return False
     
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+通道版本反向索引 - 回答“哪些bundle、lock文件和训练数据集用过 channel@version”
+
+索引来源:
+  - bundles/ 下的bundle YAML（channels[].version 或 available_versions，以及 resolved_versions）
+  - bundles/ 下的 *.lock.json（channels.<name>.version）
+  - data_release_repo/ 中训练数据集JSON的 dataset_index[].bundle_versions 和 meta.bundle_versions，
+    通过bundle文件的 meta.bundle_version 关联到通道版本
+
+Git历史沿主线增量索引：记录上次索引到的提交，之后只读取新提交修改过的来源文件（从Git对象批量读取），
+每个引用记录首次出现和被移除的提交；历史被改写时自动重建。
+工作区中未提交的来源文件按文件签名(mtime, size)缓存，查询时叠加在历史之上。
+索引保存在 <workspace>/.channel_usage_index.json。
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+import yaml
+
+from git_history import GitHistory, GitError
+from consumer_latest import YAML_LOADER
+
+INDEX_FILENAME = ".channel_usage_index.json"
+INDEX_FORMAT_VERSION = 2
+SOURCE_PATHS = ['bundles', 'data_release_repo']
+# 工作区扫描时跳过的目录（生成的计划、索引和缓存）
+SKIP_DIRS = {'plans', 'subsets', 'logs', 'host_profiles', '__pycache__', 'node_modules'}
+# 每批读取的历史文件版本数
+HISTORY_BATCH_SIZE = 512
+
+KIND_BUNDLE = 'bundle'
+KIND_LOCK = 'lock'
+KIND_TRAINING = 'training_dataset'
+
+
+def channel_key(channel: str, version: Any) -> str:
+    return f"channel:{channel}@{normalize_version(version)}"
+
+
+def bundle_key(bundle_version: Any) -> str:
+    return f"bundle:{bundle_version}"
+
+
+def normalize_version(version: Any) -> str:
+    """通道版本统一去掉v前缀（bundle中写作1.2.0，查询时常写作v1.2.0）"""
+    return str(version).strip().lstrip('v')
+
+
+def classify(path: str) -> Optional[str]:
+    """判断文件是否为索引来源，返回来源类型"""
+    name = os.path.basename(path)
+    if path.startswith('bundles/'):
+        if name.endswith('.lock.json'):
+            return KIND_LOCK
+        if name.endswith(('.yaml', '.yml')):
+            return KIND_BUNDLE
+    elif path.startswith('data_release_repo/') and name.endswith('.json'):
+        if name.startswith('training_dataset') or os.path.basename(os.path.dirname(path)) == 'stages':
+            return KIND_TRAINING
+    return None
+
+
+def extract_refs(kind: str, content: bytes) -> Dict[str, Any]:
+    """
+    提取文件中的引用
+
+    Returns:
+        {'refs': {key: [条目名, ...]}, 'bundle_versions': [本文件定义的bundle版本]}；无法解析时引用为空
+    """
+    refs: Dict[str, Set[str]] = {}
+    bundle_versions: List[str] = []
+    try:
+        doc = json.loads(content) if kind != KIND_BUNDLE else yaml.load(content, Loader=YAML_LOADER)
+    except (ValueError, yaml.YAMLError):
+        doc = None
+    if not isinstance(doc, dict):
+        return {'refs': {}, 'bundle_versions': []}
+
+    if kind == KIND_BUNDLE:
+        meta = doc.get('meta') or {}
+        if meta.get('bundle_version'):
+            bundle_versions.append(str(meta['bundle_version']))
+        for item in doc.get('channels') or []:
+            if not isinstance(item, dict) or not item.get('channel'):
+                continue
+            versions = [item['version']] if item.get('version') else item.get('available_versions') or []
+            for version in versions:
+                refs.setdefault(channel_key(item['channel'], version), set())
+        for channel, version in (doc.get('resolved_versions') or {}).items():
+            refs.setdefault(channel_key(channel, version), set())
+
+    elif kind == KIND_LOCK:
+        for channel, info in (doc.get('channels') or {}).items():
+            if isinstance(info, dict) and info.get('version'):
+                refs.setdefault(channel_key(channel, info['version']), set())
+
+    elif kind == KIND_TRAINING:
+        for bundle_version in (doc.get('meta') or {}).get('bundle_versions') or []:
+            refs.setdefault(bundle_key(bundle_version), set()).add('<meta>')
+        for entry in doc.get('dataset_index') or []:
+            if not isinstance(entry, dict):
+                continue
+            for bundle_version in entry.get('bundle_versions') or []:
+                refs.setdefault(bundle_key(bundle_version), set()).add(str(entry.get('name', '')))
+
+    return {'refs': {key: sorted(items) for key, items in refs.items()}, 'bundle_versions': bundle_versions}
+
+
+def _format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+
+class ChannelUsageIndex:
+    """增量维护的通道版本反向索引"""
+
+    def __init__(self, workspace: str = ".", persist: bool = True):
+        self.workspace = Path(workspace)
+        self.index_file = self.workspace / INDEX_FILENAME
+        self.persist = persist
+        self._data: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {
+            'format': INDEX_FORMAT_VERSION,
+            'head': None,
+            # 主线HEAD上各来源文件的引用 {path: {'kind', 'refs', 'bundle_versions'}}
+            'files': {},
+            # {key: {path: {'first': [sha, ts], 'removed': [sha, ts] | None, 'items': [...]}}}
+            'uses': {},
+            # bundle文件在历史上定义过的bundle版本 {path: [bundle_version, ...]}
+            'bundle_versions': {},
+            # 工作区来源文件 {path: {'signature', 'kind', 'refs', 'bundle_versions'}}
+            'worktree': {}
+        }
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            data = None
+            if self.persist and self.index_file.exists():
+                try:
+                    with open(self.index_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = None
+            if not data or data.get('format') != INDEX_FORMAT_VERSION:
+                data = self._empty()
+            self._data = data
+        return self._data
+
+    def _save(self):
+        if not self.persist:
+            return
+        tmp_file = self.index_file.with_name(f"{INDEX_FILENAME}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+    # ---- 更新 ----
+
+    def update(self, rebuild: bool = False) -> Dict[str, int]:
+        """
+        增量更新索引（Git历史 + 工作区）
+
+        Returns:
+            {'commits': 新索引的提交数, 'files': 读取的历史文件版本数, 'worktree': 重新解析的工作区文件数}
+        """
+        data = self._load()
+        stats = {'commits': 0, 'files': 0, 'worktree': 0}
+        changed = False
+
+        try:
+            with GitHistory(str(self.workspace)) as git:
+                head = git.head()
+                if rebuild or (data['head'] and head != data['head'] and
+                               (head is None or not git.is_ancestor(data['head'], head))):
+                    # 历史被改写（或要求重建）时从头索引
+                    worktree = data['worktree']
+                    data = self._data = self._empty()
+                    data['worktree'] = worktree
+                    changed = True
+                if head and head != data['head']:
+                    self._index_history(git, data, head, stats)
+                    changed = True
+        except GitError:
+            # 不在Git仓库中时只索引工作区
+            pass
+
+        if self._scan_worktree(data, stats):
+            changed = True
+        if changed:
+            self._save()
+        return stats
+
+    def _index_history(self, git: GitHistory, data: Dict[str, Any], head: str, stats: Dict[str, int]):
+        pending: List[Tuple[str, int, str, str]] = []
+
+        def flush():
+            blobs = git.read_blobs([(sha, path) for sha, _, path, _ in pending])
+            for sha, timestamp, path, kind in pending:
+                content = blobs[(sha, path)]
+                extracted = extract_refs(kind, content) if content is not None else None
+                self._apply_change(data, path, kind, extracted, [sha, timestamp])
+            stats['files'] += len(pending)
+            pending.clear()
+
+        for sha, timestamp, files in git.iter_changes(SOURCE_PATHS, since=data['head'], until=head):
+            stats['commits'] += 1
+            for path in files:
+                kind = classify(path)
+                if kind:
+                    pending.append((sha, timestamp, path, kind))
+            if len(pending) >= HISTORY_BATCH_SIZE:
+                flush()
+        flush()
+        data['head'] = head
+
+    @staticmethod
+    def _apply_change(data: Dict[str, Any], path: str, kind: str,
+                      extracted: Optional[Dict[str, Any]], commit: List[Any]):
+        """按提交时间顺序应用一个文件版本（extracted为None表示文件被删除）"""
+        old_refs = (data['files'].get(path) or {}).get('refs', {})
+        new_refs = extracted['refs'] if extracted else {}
+
+        for key, items in new_refs.items():
+            usage = data['uses'].setdefault(key, {}).get(path)
+            if usage is None:
+                data['uses'][key][path] = {'kind': kind, 'first': commit, 'removed': None, 'items': items}
+            else:
+                usage['removed'] = None
+                usage['items'] = sorted(set(usage['items']) | set(items))
+        for key in old_refs:
+            if key not in new_refs:
+                data['uses'][key][path]['removed'] = commit
+
+        if extracted:
+            data['files'][path] = {'kind': kind, 'refs': new_refs, 'bundle_versions': extracted['bundle_versions']}
+            if extracted['bundle_versions']:
+                known = data['bundle_versions'].setdefault(path, [])
+                known.extend(v for v in extracted['bundle_versions'] if v not in known)
+        else:
+            data['files'].pop(path, None)
+
+    def _scan_worktree(self, data: Dict[str, Any], stats: Dict[str, int]) -> bool:
+        """按签名增量解析工作区中的来源文件，返回索引是否变化"""
+        cached = data['worktree']
+        current = {}
+        for source in SOURCE_PATHS:
+            top = self.workspace / source
+            if not top.is_dir():
+                continue
+            for root, dirs, files in os.walk(top):
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+                for name in files:
+                    full_path = os.path.join(root, name)
+                    path = Path(os.path.relpath(full_path, self.workspace)).as_posix()
+                    kind = classify(path)
+                    if not kind:
+                        continue
+                    stat = os.stat(full_path)
+                    signature = [stat.st_mtime_ns, stat.st_size]
+                    entry = cached.get(path)
+                    if entry is None or entry['signature'] != signature:
+                        with open(full_path, 'rb') as f:
+                            extracted = extract_refs(kind, f.read())
+                        entry = {'signature': signature, 'kind': kind, **extracted}
+                        stats['worktree'] += 1
+                    current[path] = entry
+
+        changed = stats['worktree'] > 0 or set(current) != set(cached)
+        data['worktree'] = current
+        return changed
+
+    # ---- 查询 ----
+
+    def _usages(self, data: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+        """某个引用的全部使用记录：历史记录叠加工作区状态 + 只在工作区中出现的文件"""
+        results = []
+        for path, usage in data['uses'].get(key, {}).items():
+            committed = usage['removed'] is None
+            if _worktree_scanned(path):
+                worktree_entry = data['worktree'].get(path)
+                in_worktree = bool(worktree_entry and key in worktree_entry['refs'])
+            else:
+                worktree_entry, in_worktree = None, committed
+            results.append({
+                'path': path,
+                'kind': usage['kind'],
+                'items': worktree_entry['refs'][key] if in_worktree and worktree_entry else usage['items'],
+                'first_seen': usage['first'],
+                'removed': usage['removed'],
+                'current': in_worktree,
+                # 工作区与HEAD不一致：已提交的引用在工作区中被删除，或已移除的引用在工作区中重新出现
+                'worktree': in_worktree != committed
+            })
+
+        for path, entry in data['worktree'].items():
+            if key not in entry['refs'] or path in data['uses'].get(key, {}):
+                continue
+            results.append({
+                'path': path,
+                'kind': entry['kind'],
+                'items': entry['refs'][key],
+                'first_seen': None,
+                'removed': None,
+                'current': True,
+                'worktree': True
+            })
+        return sorted(results, key=lambda usage: (usage['kind'], usage['path']))
+
+    def who_uses(self, channel: str, version: str, update: bool = True) -> Dict[str, Any]:
+        """
+        查询使用过 channel@version 的bundle、lock文件和训练数据集
+
+        Returns:
+            {'channel', 'version', 'bundles': [...], 'locks': [...], 'bundle_versions': [...],
+             'training_datasets': [...]}；每条记录含 path、items、first_seen、removed、current、worktree
+        """
+        if update:
+            self.update()
+        data = self._load()
+        usages = self._usages(data, channel_key(channel, version))
+
+        bundle_versions: List[str] = []
+        for usage in usages:
+            if usage['kind'] != KIND_BUNDLE:
+                continue
+            defined = list(data['bundle_versions'].get(usage['path'], []))
+            defined += (data['worktree'].get(usage['path']) or {}).get('bundle_versions', [])
+            bundle_versions.extend(v for v in defined if v not in bundle_versions)
+
+        training = []
+        for bundle_version in bundle_versions:
+            for usage in self._usages(data, bundle_key(bundle_version)):
+                if usage['kind'] == KIND_TRAINING:
+                    training.append({**usage, 'bundle_version': bundle_version})
+
+        return {
+            'channel': channel,
+            'version': normalize_version(version),
+            'bundles': [u for u in usages if u['kind'] == KIND_BUNDLE],
+            'locks': [u for u in usages if u['kind'] == KIND_LOCK],
+            'bundle_versions': bundle_versions,
+            'training_datasets': training
+        }
+
+
+def _worktree_scanned(path: str) -> bool:
+    """路径是否在工作区扫描范围内（跳过的目录中的文件只能按HEAD状态判断）"""
+    return not any(part in SKIP_DIRS or part.startswith('.') for part in path.split('/')[:-1])
+
+
+def _parse_channel_spec(spec: str) -> Tuple[str, str]:
+    if '@' not in spec:
+        raise ValueError(f"格式应为 channel@version: {spec}")
+    channel, version = spec.split('@', 1)
+    return channel, version
+
+
+def _print_usage(usage: Dict[str, Any]):
+    if usage['worktree'] and not usage['first_seen']:
+        state = "工作区(未提交)"
+    elif usage['worktree'] and not usage['current']:
+        state = f"工作区中已移除(未提交), 自 {_format_time(usage['first_seen'][1])} ({usage['first_seen'][0][:8]})"
+    elif usage['worktree']:
+        state = f"工作区中重新使用(未提交), 曾移除于 {usage['removed'][0][:8]}"
+    elif usage['current']:
+        state = f"当前使用, 自 {_format_time(usage['first_seen'][1])} ({usage['first_seen'][0][:8]})"
+    else:
+        state = (f"历史使用 {_format_time(usage['first_seen'][1])} ~ {_format_time(usage['removed'][1])} "
+                 f"(移除于 {usage['removed'][0][:8]})")
+    line = f"   • {usage['path']} - {state}"
+    if usage.get('bundle_version'):
+        line += f" | bundle {usage['bundle_version']}"
+    print(line)
+    items = [item for item in usage['items'] if item]
+    if items:
+        shown = ', '.join(items[:10]) + (f" ... (共{len(items)}个)" if len(items) > 10 else "")
+        print(f"     数据集: {shown}")
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description="通道版本反向索引")
+    parser.add_argument('--workspace', default='.', help='工作空间根目录')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    update_parser = subparsers.add_parser('update', help='增量更新索引')
+    update_parser.add_argument('--rebuild', action='store_true', help='丢弃已有索引，从头索引全部历史')
+
+    who_parser = subparsers.add_parser('who-uses', help='查询使用过 channel@version 的bundle、lock和训练数据集')
+    who_parser.add_argument('spec', help='通道版本，如 utils_slam@1.0.0')
+    who_parser.add_argument('--current-only', action='store_true', help='只显示当前仍在使用的记录')
+    who_parser.add_argument('--json', action='store_true', help='输出JSON')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    index = ChannelUsageIndex(args.workspace)
+    try:
+        if args.command == 'update':
+            stats = index.update(rebuild=args.rebuild)
+            print(f"✅ 索引已更新: {stats['commits']} 个新提交, {stats['files']} 个历史文件版本, "
+                  f"{stats['worktree']} 个工作区文件")
+            return
+
+        channel, version = _parse_channel_spec(args.spec)
+        result = index.who_uses(channel, version)
+    except (ValueError, OSError) as e:
+        print(f"❌ 执行失败: {e}")
+        sys.exit(1)
+
+    sections = [('bundles', '📦 Bundle'), ('locks', '🔒 Lock文件'), ('training_datasets', '🎓 训练数据集')]
+    if args.current_only:
+        for name, _ in sections:
+            result[name] = [usage for usage in result[name] if usage['current']]
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"🔍 {channel}@{result['version']} 的使用情况")
+    for name, title in sections:
+        print(f"\n{title} ({len(result[name])})")
+        for usage in result[name]:
+            _print_usage(usage)
+    if result['bundle_versions']:
+        print(f"\n🏷️  相关bundle版本: {', '.join(result['bundle_versions'])}")
+    if not any(result[name] for name, _ in sections):
+        print("\n✅ 没有任何引用，可以考虑下线该版本的数据")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Consumer配置继承解析
+
+create_branch 创建的分支以 overlay 形式保存（meta.overlay: true），只记录相对
+parent_version 变化的需求:
+  - requirements / requirement_groups 中的条目按 channel 与父配置合并（字段级覆盖，新通道追加）
+  - removed_requirements 列出需要从父配置中移除的通道
+  - change_history 追加在父配置的历史之后
+  - meta 只取overlay自身的字段，父配置中仅 INHERITED_META_KEYS 列出的归属信息会被继承，
+    updated_at、expires_at 等版本自身的字段不会从父版本带入
+没有 overlay 标记的文件视为完整配置。
+
+解析结果按整条继承链的文件签名缓存（内存 + consumers/.resolved_cache/），
+继承链未变化时只需stat各文件，不再重复解析祖先配置。
+"""
+
+import os
+import json
+import copy
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+from consumer_latest import LATEST_FILENAME, resolve_consumer_path, load_consumer_config
+
+CACHE_DIRNAME = ".resolved_cache"
+MAX_INHERITANCE_DEPTH = 32
+# overlay未声明时从父配置继承的meta字段（consumer归属信息）
+INHERITED_META_KEYS = ('consumer', 'owner', 'team')
+# 解析规则变化时递增，使旧的持久化解析结果失效
+RESOLVED_CACHE_FORMAT = 2
+
+
+def collect_requirements(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """收集配置中的所有需求（兼容 requirements 和 requirement_groups）"""
+    if 'requirement_groups' in config:
+        requirements = []
+        for group_config in (config['requirement_groups'] or {}).values():
+            requirements.extend(group_config.get('requirements', []))
+        return requirements
+    return list(config.get('requirements') or [])
+
+
+def _merge_requirement_list(base: List[Dict[str, Any]],
+                            overrides: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按channel合并需求列表：已有通道字段级覆盖，新通道追加"""
+    merged = [dict(req) for req in base]
+    positions = {req['channel']: i for i, req in enumerate(merged)}
+    for req in overrides or []:
+        channel = req['channel']
+        if channel in positions:
+            merged[positions[channel]].update(req)
+        else:
+            positions[channel] = len(merged)
+            merged.append(dict(req))
+    return merged
+
+
+def apply_overlay(parent: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将overlay应用到已解析的父配置上
+
+    Args:
+        parent: 已解析的父配置
+        overlay: overlay文件内容
+
+    Returns:
+        合并后的完整配置
+    """
+    resolved = copy.deepcopy(parent)
+    removed = set(overlay.get('removed_requirements') or [])
+
+    for key, value in overlay.items():
+        if key in ('requirements', 'requirement_groups', 'removed_requirements', 'change_history'):
+            continue
+        if key == 'meta':
+            parent_meta = resolved.get('meta') or {}
+            meta = {k: parent_meta[k] for k in INHERITED_META_KEYS if k in parent_meta}
+            meta.update(value or {})
+            meta.pop('overlay', None)
+            resolved['meta'] = meta
+        else:
+            resolved[key] = copy.deepcopy(value)
+
+    if 'requirement_groups' in resolved:
+        groups = resolved['requirement_groups']
+        group_of = {req['channel']: name
+                    for name, group in groups.items()
+                    for req in group.get('requirements', [])}
+
+        # 平铺的overlay需求合并到其所在的分组
+        flat_overrides = overlay.get('requirements') or []
+        unknown = [req['channel'] for req in flat_overrides if req['channel'] not in group_of]
+        if unknown:
+            raise ValueError(f"父配置使用requirement_groups，新增通道需在overlay的requirement_groups中指定分组: {unknown}")
+        for req in flat_overrides:
+            group = groups[group_of[req['channel']]]
+            group['requirements'] = _merge_requirement_list(group.get('requirements', []), [req])
+
+        for name, group_overlay in (overlay.get('requirement_groups') or {}).items():
+            group = groups.setdefault(name, {'requirements': []})
+            for key, value in group_overlay.items():
+                if key != 'requirements':
+                    group[key] = copy.deepcopy(value)
+            group['requirements'] = _merge_requirement_list(
+                group.get('requirements', []), group_overlay.get('requirements'))
+
+        for group in groups.values():
+            group['requirements'] = [r for r in group.get('requirements', []) if r['channel'] not in removed]
+    else:
+        if overlay.get('requirement_groups'):
+            raise ValueError("父配置使用平铺的requirements，overlay不能使用requirement_groups")
+        requirements = _merge_requirement_list(resolved.get('requirements') or [], overlay.get('requirements'))
+        resolved['requirements'] = [r for r in requirements if r['channel'] not in removed]
+
+    resolved['change_history'] = (list(resolved.get('change_history') or [])
+                                  + list(overlay.get('change_history') or []))
+    return resolved
+
+
+def compute_overlay(parent: Dict[str, Any], child: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    计算child相对parent的需求差异（用于把完整配置转换为overlay）
+
+    Returns:
+        {'requirements': [...], 'removed_requirements': [...]}，只包含发生变化的需求
+    """
+    parent_reqs = {req['channel']: req for req in collect_requirements(parent)}
+    child_reqs = {req['channel']: req for req in collect_requirements(child)}
+
+    changed = []
+    for channel, req in child_reqs.items():
+        base = parent_reqs.get(channel)
+        if base is None:
+            changed.append(dict(req))
+            continue
+        diff = {k: v for k, v in req.items() if base.get(k) != v}
+        if diff:
+            changed.append({'channel': channel, **diff})
+
+    return {
+        'requirements': changed,
+        'removed_requirements': sorted(set(parent_reqs) - set(child_reqs))
+    }
+
+
+class ConsumerConfigResolver:
+    """解析consumer配置的继承链并缓存结果"""
+
+    def __init__(self, base_dir="consumers", persist: bool = True):
+        """
+        Args:
+            base_dir: consumers目录
+            persist: 是否将解析结果缓存到 base_dir/.resolved_cache/
+        """
+        self.base_dir = Path(base_dir)
+        self.cache_dir = self.base_dir / CACHE_DIRNAME
+        self.persist = persist
+        self._memory_cache: Dict[str, Tuple[List[List[Any]], Dict[str, Any]]] = {}
+
+    def version_file(self, consumer: str, version: str) -> Path:
+        """
+        定位版本文件，兼容带或不带v前缀的版本号（parent_version常写作"1.0.0"）
+        """
+        consumer_dir = self.base_dir / consumer
+        if version == 'latest':
+            return resolve_consumer_path(consumer_dir / LATEST_FILENAME)
+        for name in (version, f"v{version}", version.lstrip('v')):
+            candidate = consumer_dir / f"{name}.yaml"
+            if candidate.exists():
+                return candidate
+        raise ValueError(f"版本 '{version}' 不存在: {consumer_dir}")
+
+    def resolve(self, consumer: str, version: str) -> Dict[str, Any]:
+        """
+        获取consumer版本的完整(已合并继承链)配置
+
+        Args:
+            consumer: consumer名称
+            version: 版本文件名(不含.yaml)、parent_version形式的版本号或latest
+        """
+        return self.resolve_file(self.version_file(consumer, version))
+
+    def resolve_file(self, file_path) -> Dict[str, Any]:
+        """解析指定版本文件的完整配置"""
+        file_path = resolve_consumer_path(Path(file_path))
+        key = str(file_path)
+
+        cached = self._memory_cache.get(key) or self._load_persisted(file_path)
+        if cached and self._chain_valid(cached[0]):
+            self._memory_cache[key] = cached
+            return copy.deepcopy(cached[1])
+
+        chain, resolved = self._resolve_chain(file_path)
+        # 与持久化缓存保持一致的JSON类型（日期等转为字符串）
+        resolved = json.loads(json.dumps(resolved, default=str))
+        self._memory_cache[key] = (chain, resolved)
+        if len(chain) > 1:
+            self._save_persisted(file_path, chain, resolved)
+        return copy.deepcopy(resolved)
+
+    def chain_of(self, file_path) -> List[List[Any]]:
+        """
+        获取版本文件的继承链签名 [[path, mtime_ns, size], ...]
+
+        可作为依赖该文件解析结果的外部缓存的失效依据。
+        """
+        file_path = resolve_consumer_path(Path(file_path))
+        if str(file_path) not in self._memory_cache:
+            self.resolve_file(file_path)
+        return copy.deepcopy(self._memory_cache[str(file_path)][0])
+
+    def is_overlay(self, consumer: str, version: str) -> bool:
+        """版本文件是否为overlay形式"""
+        config = load_consumer_config(self.version_file(consumer, version))
+        return bool((config.get('meta') or {}).get('overlay'))
+
+    def _resolve_chain(self, file_path: Path) -> Tuple[List[List[Any]], Dict[str, Any]]:
+        """沿parent_version向上解析，返回(继承链签名, 合并结果)"""
+        overlays = []
+        chain = []
+        current = file_path
+        seen = set()
+
+        while True:
+            if str(current) in seen or len(seen) >= MAX_INHERITANCE_DEPTH:
+                raise ValueError(f"配置继承链存在循环或过深: {file_path}")
+            seen.add(str(current))
+
+            stat = current.stat()
+            chain.append([str(current), stat.st_mtime_ns, stat.st_size])
+            config = load_consumer_config(current)
+            meta = config.get('meta') or {}
+
+            if not meta.get('overlay'):
+                resolved = config
+                break
+            if not meta.get('parent_version'):
+                raise ValueError(f"overlay配置缺少meta.parent_version: {current}")
+
+            overlays.append(config)
+            current = self.version_file(current.parent.name, str(meta['parent_version']))
+
+        for overlay in reversed(overlays):
+            resolved = apply_overlay(resolved, overlay)
+        return chain, resolved
+
+    @staticmethod
+    def _chain_valid(chain: List[List[Any]]) -> bool:
+        """检查继承链上的文件签名是否都未变化"""
+        for path, mtime_ns, size in chain:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_mtime_ns != mtime_ns or stat.st_size != size:
+                return False
+        return True
+
+    def _cache_file(self, file_path: Path) -> Path:
+        return self.cache_dir / file_path.parent.name / f"{file_path.stem}.json"
+
+    def _load_persisted(self, file_path: Path) -> Optional[Tuple[List[List[Any]], Dict[str, Any]]]:
+        """加载持久化的解析结果"""
+        if not self.persist:
+            return None
+        cache_file = self._cache_file(file_path)
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != RESOLVED_CACHE_FORMAT:
+                return None
+            return data['chain'], data['config']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_persisted(self, file_path: Path, chain: List[List[Any]], resolved: Dict[str, Any]):
+        """原子写入解析结果缓存"""
+        if not self.persist:
+            return
+        cache_file = self._cache_file(file_path)
+        tmp_file = cache_file.with_name(cache_file.name + f".{os.getpid()}.tmp")
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'format': RESOLVED_CACHE_FORMAT, 'chain': chain, 'config': resolved}, f, ensure_ascii=False)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+
+def load_resolved_config(config_path) -> Dict[str, Any]:
+    """
+    加载consumer配置文件的完整形式（解析latest指针和overlay继承链）
+
+    Args:
+        config_path: 形如 consumers/<consumer>/<version>.yaml 的路径
+    """
+    config_path = Path(config_path)
+    resolver = ConsumerConfigResolver(config_path.parent.parent)
+    return resolver.resolve_file(config_path)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Consumer配置批量验证工具
+
+使用预编译的JSON Schema验证consumers/下的所有版本文件（overlay分支验证解析后的完整配置），
+并将每个需求的通道/版本约束与channels/下实际存在的spec版本交叉校验:
+  - 通道或满足约束的版本不存在时，required需求报错，可选需求给出警告
+文件数超过阈值时分块交给进程池并行验证。
+
+验证结果缓存在 consumers/.validation_cache.json，按文件继承链签名和channels/版本索引失效，
+未变化的文件重复验证时只需stat。
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import semver
+import yaml
+from jsonschema import Draft7Validator
+
+from consumer_config_resolver import ConsumerConfigResolver, collect_requirements
+
+VALID_ON_MISSING = ['fail', 'ignore']
+
+_REQUIREMENT_SCHEMA = {
+    "type": "object",
+    "required": ["channel", "version", "required", "on_missing"],
+    "properties": {
+        "channel": {"type": "string", "minLength": 1},
+        "version": {
+            "oneOf": [
+                {"type": "string", "minLength": 1},
+                # 按优先级排列的候选版本/约束
+                {"type": "array", "items": {"type": "string", "minLength": 1}, "minItems": 1}
+            ]
+        },
+        "required": {"type": "boolean"},
+        "on_missing": {"enum": VALID_ON_MISSING}
+    }
+}
+
+CONSUMER_CONFIG_SCHEMA = {
+    "type": "object",
+    "required": ["meta"],
+    "anyOf": [
+        {"required": ["requirements"]},
+        {"required": ["requirement_groups"]}
+    ],
+    "properties": {
+        "meta": {
+            "type": "object",
+            "required": ["consumer", "version", "owner", "description"],
+            "properties": {
+                "consumer": {"type": "string"},
+                "version": {"type": "string"},
+                "owner": {"type": "string"},
+                "description": {"type": "string"},
+                "parent_version": {"type": "string"},
+                "expires_at": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}$"}
+            }
+        },
+        "requirements": {"type": "array", "items": _REQUIREMENT_SCHEMA},
+        "requirement_groups": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "required": ["requirements"],
+                "properties": {
+                    "requirements": {"type": "array", "items": _REQUIREMENT_SCHEMA}
+                }
+            }
+        },
+        "change_history": {"type": "array"}
+    }
+}
+
+# 模块加载时编译一次，进程池中的每个worker各自持有一份
+CONSUMER_CONFIG_VALIDATOR = Draft7Validator(CONSUMER_CONFIG_SCHEMA)
+
+VALIDATION_CACHE_FILENAME = ".validation_cache.json"
+# schema或校验规则变化时递增，使旧缓存失效
+VALIDATION_CACHE_VERSION = 2
+
+# 文件数低于该值时串行验证，进程池的启动开销不划算
+PARALLEL_THRESHOLD = 64
+
+
+def _parse_version(version: str) -> Optional[semver.VersionInfo]:
+    try:
+        return semver.VersionInfo.parse(version)
+    except ValueError:
+        return None
+
+
+def version_satisfies(version: str, constraint: str) -> bool:
+    """
+    判断具体版本是否满足约束
+
+    支持精确版本、>=、>、<=、<、^、~，以及逗号分隔的组合约束（如 ">=1.0.0,<2.0.0"）。
+    非语义化版本（如 2.1.0_5cm）只做精确匹配。
+    """
+    constraint = constraint.strip()
+    if ',' in constraint:
+        return all(version_satisfies(version, part) for part in constraint.split(',') if part.strip())
+
+    for op in ('>=', '<=', '>', '<', '^', '~', '=='):
+        if constraint.startswith(op):
+            base = constraint[len(op):].strip()
+            break
+    else:
+        return version == constraint
+
+    current = _parse_version(version)
+    base_info = _parse_version(base)
+    if current is None or base_info is None:
+        return version == base
+
+    if op == '>=':
+        return current >= base_info
+    if op == '<=':
+        return current <= base_info
+    if op == '>':
+        return current > base_info
+    if op == '<':
+        return current < base_info
+    if op == '^':
+        return current.major == base_info.major and current >= base_info
+    if op == '~':
+        return (current.major, current.minor) == (base_info.major, base_info.minor) and current >= base_info
+    return current == base_info
+
+
+def scan_channel_versions(channels_dir: Path) -> Dict[str, List[str]]:
+    """扫描channels/下各通道已发布的spec版本"""
+    index: Dict[str, List[str]] = {}
+    if not channels_dir.exists():
+        return index
+
+    for channel_entry in os.scandir(channels_dir):
+        if not channel_entry.is_dir():
+            continue
+        index[channel_entry.name] = sorted(
+            entry.name[len('spec-'):-len('.yaml')]
+            for entry in os.scandir(channel_entry.path)
+            if entry.name.startswith('spec-') and entry.name.endswith('.yaml')
+        )
+    return index
+
+
+def check_channel_constraints(config: Dict[str, Any],
+                              channel_versions: Dict[str, List[str]]) -> tuple:
+    """
+    交叉校验需求中的通道和版本约束
+
+    Returns:
+        (errors, warnings)
+    """
+    errors, warnings = [], []
+
+    for req in collect_requirements(config):
+        channel = req.get('channel')
+        constraints = req.get('version')
+        if not channel or not constraints:
+            continue  # schema错误已单独报告
+        if isinstance(constraints, str):
+            constraints = [constraints]
+        report = errors if req.get('required') else warnings
+
+        available = channel_versions.get(channel)
+        if available is None:
+            report.append(f"通道不存在: {channel}")
+            continue
+        if not any(version_satisfies(v, c) for c in constraints for v in available):
+            report.append(f"{channel}: 没有满足约束 {constraints} 的版本 (可用: {available})")
+
+    return errors, warnings
+
+
+def _format_schema_error(error) -> str:
+    location = '/'.join(str(p) for p in error.absolute_path) or '<root>'
+    return f"{location}: {error.message}"
+
+
+# ---- 进程池worker状态 ----
+_worker_resolver: Optional[ConsumerConfigResolver] = None
+_worker_channels: Dict[str, List[str]] = {}
+
+
+def _init_worker(consumers_dir: str, channel_versions: Dict[str, List[str]]):
+    global _worker_resolver, _worker_channels
+    _worker_resolver = ConsumerConfigResolver(consumers_dir)
+    _worker_channels = channel_versions
+
+
+def _validate_file(file_path: str) -> Dict[str, Any]:
+    """验证单个版本文件（在worker中执行）"""
+    result = {'file': file_path, 'errors': [], 'warnings': [], 'chain': None}
+    try:
+        config = _worker_resolver.resolve_file(file_path)
+        result['chain'] = _worker_resolver.chain_of(file_path)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        result['errors'].append(f"解析失败: {e}")
+        return result
+
+    if not isinstance(config, dict):
+        result['errors'].append("配置必须是YAML对象")
+        return result
+
+    result['errors'].extend(
+        _format_schema_error(e)
+        for e in sorted(CONSUMER_CONFIG_VALIDATOR.iter_errors(config), key=lambda e: [str(p) for p in e.absolute_path])
+    )
+    errors, warnings = check_channel_constraints(config, _worker_channels)
+    result['errors'].extend(errors)
+    result['warnings'].extend(warnings)
+    return result
+
+
+class ConsumerConfigValidator:
+    """Consumer配置批量验证器"""
+
+    def __init__(self, workspace_root: str = ".", max_workers: Optional[int] = None,
+                 use_cache: bool = True):
+        """
+        Args:
+            workspace_root: 工作空间根目录
+            max_workers: 进程池大小，默认CPU核数
+            use_cache: 是否使用 consumers/.validation_cache.json 缓存验证结果
+        """
+        self.workspace_root = Path(workspace_root)
+        self.consumers_dir = self.workspace_root / "consumers"
+        self.channels_dir = self.workspace_root / "channels"
+        self.cache_file = self.consumers_dir / VALIDATION_CACHE_FILENAME
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self._channel_versions: Optional[Dict[str, List[str]]] = None
+
+    @property
+    def channel_versions(self) -> Dict[str, List[str]]:
+        if self._channel_versions is None:
+            self._channel_versions = scan_channel_versions(self.channels_dir)
+        return self._channel_versions
+
+    def collect_files(self) -> List[str]:
+        """收集consumers/下所有版本文件"""
+        files = []
+        if not self.consumers_dir.exists():
+            return files
+        for consumer_entry in os.scandir(self.consumers_dir):
+            if not consumer_entry.is_dir() or consumer_entry.name.startswith('.'):
+                continue
+            files.extend(
+                entry.path for entry in os.scandir(consumer_entry.path)
+                if entry.name.endswith('.yaml') and not entry.name.startswith('.')
+            )
+        return sorted(files)
+
+    def validate_files(self, files: List[str]) -> List[Dict[str, Any]]:
+        """
+        验证一组版本文件
+
+        Returns:
+            [{'file', 'errors', 'warnings', 'chain'}, ...]，顺序与输入一致
+        """
+        channels_signature = hashlib.sha1(
+            json.dumps(self.channel_versions, sort_keys=True).encode('utf-8')).hexdigest()
+        cache = self._load_cache(channels_signature)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        for file_path in files:
+            entry = cache.get(file_path)
+            if entry and entry['signature'] == self._file_signature(file_path) \
+                    and ConsumerConfigResolver._chain_valid(entry['result']['chain']):
+                results[file_path] = entry['result']
+            else:
+                pending.append(file_path)
+
+        for result in self._run(pending):
+            results[result['file']] = result
+            if result['chain'] is not None:
+                cache[result['file']] = {
+                    'signature': self._file_signature(result['file']),
+                    'result': result
+                }
+
+        if pending:
+            self._save_cache(channels_signature, cache)
+        return [results[f] for f in files]
+
+    def _run(self, files: List[str]) -> List[Dict[str, Any]]:
+        """串行或通过进程池验证文件"""
+        init_args = (str(self.consumers_dir), self.channel_versions)
+
+        if len(files) < PARALLEL_THRESHOLD or self.max_workers <= 1:
+            _init_worker(*init_args)
+            return [_validate_file(f) for f in files]
+
+        workers = min(self.max_workers, len(files))
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            return list(executor.map(_validate_file, files, chunksize=chunksize))
+
+    @staticmethod
+    def _file_signature(file_path: str) -> List[int]:
+        # latest.yaml可能是符号链接，签名取链接本身
+        stat = os.stat(file_path, follow_symlinks=False)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _load_cache(self, channels_signature: str) -> Dict[str, Dict[str, Any]]:
+        """加载验证结果缓存，schema版本或channels/索引变化时丢弃"""
+        if not self.use_cache or not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if (data.get('format_version') != VALIDATION_CACHE_VERSION
+                or data.get('channels_signature') != channels_signature):
+            return {}
+        return data.get('entries', {})
+
+    def _save_cache(self, channels_signature: str, entries: Dict[str, Dict[str, Any]]):
+        """原子写入验证结果缓存"""
+        if not self.use_cache or not self.consumers_dir.exists():
+            return
+        tmp_file = self.cache_file.with_name(self.cache_file.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format_version': VALIDATION_CACHE_VERSION,
+                    'channels_signature': channels_signature,
+                    'entries': entries
+                }, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+    def validate_all(self) -> List[Dict[str, Any]]:
+        """验证consumers/下的所有版本文件"""
+        return self.validate_files(self.collect_files())
+
+    def validate_one(self, consumer: str, version: str) -> Dict[str, Any]:
+        """验证单个consumer版本"""
+        return self.validate_files([str(self.consumers_dir / consumer / f"{version}.yaml")])[0]
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description="Consumer配置批量验证工具")
+    parser.add_argument('--workspace', default='.', help='工作空间根目录')
+    parser.add_argument('--workers', type=int, help='并行进程数 (默认: CPU核数)')
+    parser.add_argument('--strict', action='store_true', help='将警告视为错误')
+    parser.add_argument('--quiet', action='store_true', help='只输出有问题的文件')
+    parser.add_argument('--no-cache', action='store_true', help='忽略验证结果缓存')
+    args = parser.parse_args()
+
+    validator = ConsumerConfigValidator(args.workspace, args.workers, use_cache=not args.no_cache)
+    results = validator.validate_all()
+
+    failed = 0
+    for result in results:
+        rel = os.path.relpath(result['file'], validator.workspace_root)
+        has_error = bool(result['errors'] or (args.strict and result['warnings']))
+        failed += has_error
+
+        if has_error:
+            print(f"❌ {rel}")
+        elif result['warnings']:
+            print(f"⚠️  {rel}")
+        elif not args.quiet:
+            print(f"✅ {rel}")
+        for error in result['errors']:
+            print(f"   ❌ {error}")
+        for warning in result['warnings']:
+            print(f"   ⚠️  {warning}")
+
+    print(f"\n📊 验证完成: {len(results)} 个文件, {failed} 个失败")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+按日期回溯consumer解析结果 - 重现某一天的 consumers/<name>/latest.yaml 会解析出的通道版本
+
+  - CommitDateIndex 定位主线在该日期的提交（持久化的提交时间索引，二分查找）
+  - HistoricalView 从该提交的Git对象读取consumer和通道文件，不检出、不修改工作区；
+    YAML按blob sha缓存，相邻日期共享未变化的文件
+  - latest指针（符号链接/指针文件/完整拷贝）和overlay继承链的解析规则与当前工作区一致
+  - HistoricalBundleManager 复用 BundleManager 的版本约束解析，只替换文件来源
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, time as dtime
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Any, Tuple
+
+import yaml
+
+from git_history import GitHistory, GitError, CommitDateIndex, SYMLINK_MODE
+from consumer_latest import LATEST_FILENAME, POINTER_KEY, YAML_LOADER
+from consumer_config_resolver import apply_overlay, MAX_INHERITANCE_DEPTH
+from bundle_manager import BundleManager
+
+# 按blob sha缓存的YAML解析结果（进程内共享，历史文件内容不会变化）
+_PARSED_BLOBS: Dict[str, Any] = {}
+
+
+def parse_as_of(value: str) -> datetime:
+    """解析日期参数，只给出日期时表示当天结束时刻（本地时区）"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"无效的日期: {value}，格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM[:SS]") from None
+    if len(value.strip()) <= len("YYYY-MM-DD"):
+        parsed = datetime.combine(parsed.date(), dtime.max)
+    return parsed
+
+
+class HistoricalView:
+    """某个提交中工作空间文件的只读视图"""
+
+    def __init__(self, git: GitHistory, commit: str):
+        self.git = git
+        self.commit = commit
+        self._dirs: Dict[str, Optional[Dict[str, Tuple[str, str]]]] = {}
+
+    def list_dir(self, path: str) -> Dict[str, Tuple[str, str]]:
+        """目录的直接子项 {名称: (mode, sha)}，目录不存在时为空"""
+        if path not in self._dirs:
+            self._dirs[path] = self.git.list_dir(self.commit, path)
+        return self._dirs[path] or {}
+
+    def entry(self, path: str) -> Optional[Tuple[str, str]]:
+        posix = PurePosixPath(path)
+        return self.list_dir(str(posix.parent)).get(posix.name)
+
+    def exists(self, path: str) -> bool:
+        return self.entry(path) is not None
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        result = self.git.read_objects([entry[1]])[0]
+        return result[2] if result else None
+
+    def read_yaml(self, path: str) -> Optional[Any]:
+        """读取并解析YAML文件，不存在时为None"""
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        sha = entry[1]
+        if sha not in _PARSED_BLOBS:
+            _PARSED_BLOBS[sha] = yaml.load(self.read_bytes(path), Loader=YAML_LOADER)
+        return _PARSED_BLOBS[sha]
+
+
+class HistoricalConsumerResolver:
+    """在历史提交上解析consumer配置（latest指针 + overlay继承链）"""
+
+    def __init__(self, view: HistoricalView, base_dir: str = "consumers"):
+        self.view = view
+        self.base_dir = base_dir
+
+    def resolve_latest(self, consumer: str) -> str:
+        """latest.yaml 在该提交指向的版本文件路径"""
+        path = f"{self.base_dir}/{consumer}/{LATEST_FILENAME}"
+        entry = self.view.entry(path)
+        if entry is None:
+            raise ValueError(f"该时间点不存在 {path}")
+
+        if entry[0] == SYMLINK_MODE:
+            target = os.path.basename(self.view.read_bytes(path).decode('utf-8').strip())
+        else:
+            data = self.view.read_yaml(path)
+            if not (isinstance(data, dict) and POINTER_KEY in data and 'meta' not in data):
+                return path  # 旧格式的完整拷贝
+            target = os.path.basename(str(data[POINTER_KEY]))
+
+        resolved = f"{self.base_dir}/{consumer}/{target}"
+        if not self.view.exists(resolved):
+            raise ValueError(f"latest指向的版本文件在该时间点不存在: {resolved}")
+        return resolved
+
+    def version_file(self, consumer: str, version: str) -> str:
+        """定位版本文件，兼容带或不带v前缀的版本号"""
+        if version == 'latest':
+            return self.resolve_latest(consumer)
+        for name in (version, f"v{version}", version.lstrip('v')):
+            candidate = f"{self.base_dir}/{consumer}/{name}.yaml"
+            if self.view.exists(candidate):
+                return candidate
+        raise ValueError(f"版本 '{version}' 在该时间点不存在: {self.base_dir}/{consumer}")
+
+    def resolve(self, consumer: str, version: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        解析consumer版本的完整配置
+
+        Returns:
+            (版本文件路径, 合并继承链后的配置)
+        """
+        file_path = self.version_file(consumer, version)
+        overlays = []
+        current = file_path
+        seen = set()
+
+        while True:
+            if current in seen or len(seen) >= MAX_INHERITANCE_DEPTH:
+                raise ValueError(f"配置继承链存在循环或过深: {file_path}")
+            seen.add(current)
+
+            config = self.view.read_yaml(current)
+            if not isinstance(config, dict):
+                raise ValueError(f"无法解析consumer配置: {current}")
+            meta = config.get('meta') or {}
+            if not meta.get('overlay'):
+                resolved = config
+                break
+            if not meta.get('parent_version'):
+                raise ValueError(f"overlay配置缺少meta.parent_version: {current}")
+            overlays.append(config)
+            current = self.version_file(consumer, str(meta['parent_version']))
+
+        for overlay in reversed(overlays):
+            resolved = apply_overlay(resolved, overlay)
+        return file_path, resolved
+
+
+class HistoricalBundleManager(BundleManager):
+    """从历史提交读取consumer和通道文件的BundleManager"""
+
+    def __init__(self, view: HistoricalView):
+        super().__init__(view.git.workspace)
+        self.view = view
+        self.consumer_resolver = HistoricalConsumerResolver(view)
+        self.resolved_files: Dict[str, str] = {}
+
+    def load_consumer_config(self, consumer_name: str) -> Dict[str, Any]:
+        """consumer_name 形如 end_to_end/latest 或 end_to_end/v1.2.0"""
+        consumer, _, version = consumer_name.partition('/')
+        file_path, config = self.consumer_resolver.resolve(consumer, version or 'latest')
+        self.resolved_files[consumer_name] = file_path
+        return config
+
+    def _list_channel_files(self, channel: str) -> List[str]:
+        return list(self.view.list_dir(f"channels/{channel}"))
+
+    def _load_channel_file(self, channel: str, filename: str) -> Optional[Dict[str, Any]]:
+        return self.view.read_yaml(f"channels/{channel}/{filename}")
+
+
+def resolve_as_of(workspace: str, consumer_name: str, when: datetime,
+                  git: Optional[GitHistory] = None) -> Dict[str, Any]:
+    """
+    解析consumer在when时刻会得到的通道版本
+
+    Returns:
+        {'commit', 'committed_at', 'consumer_file', 'resolved_versions', 'bundle'}
+
+    Raises:
+        ValueError: 该时刻之前没有提交，或consumer在该提交中不存在
+    """
+    owns_git = git is None
+    git = git or GitHistory(workspace)
+    try:
+        located = CommitDateIndex(git).refresh().commit_at(when)
+        if located is None:
+            raise ValueError(f"{when:%Y-%m-%d %H:%M:%S} 之前没有提交")
+        commit, committed_at = located
+
+        manager = HistoricalBundleManager(HistoricalView(git, commit))
+        consumer, _, version = consumer_name.partition('/')
+        bundle_name = f"{consumer}-as-of-{when:%Y%m%d}"
+        bundle = manager.create_bundle_from_consumer(consumer_name, bundle_name, f"as-of-{when:%Y%m%d}")
+        bundle['meta']['as_of'] = when.isoformat()
+        bundle['meta']['source_commit'] = commit
+
+        return {
+            'commit': commit,
+            'committed_at': datetime.fromtimestamp(committed_at).isoformat(),
+            'consumer_file': manager.resolved_files.get(consumer_name),
+            'resolved_versions': bundle['resolved_versions'],
+            'bundle': bundle
+        }
+    finally:
+        if owns_git:
+            git.close()
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description="按日期回溯consumer解析结果")
+    parser.add_argument('--workspace', default='.', help='工作空间根目录')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    as_of_parser = subparsers.add_parser('as-of', help='解析consumer在指定日期会得到的通道版本')
+    as_of_parser.add_argument('date', help='日期，如 2025-02-27 (当天结束时刻) 或 "2025-02-27 12:00"')
+    as_of_parser.add_argument('consumer', help='consumer/version，如 end_to_end/latest')
+    as_of_parser.add_argument('--output', help='将解析结果保存为bundle文件')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        when = parse_as_of(args.date)
+        result = resolve_as_of(args.workspace, args.consumer, when)
+    except (ValueError, GitError) as e:
+        print(f"❌ 解析失败: {e}")
+        sys.exit(1)
+
+    print(f"🕰️  {args.consumer} @ {when:%Y-%m-%d %H:%M:%S}")
+    print(f"   提交: {result['commit'][:8]} ({result['committed_at']})")
+    print(f"   版本文件: {result['consumer_file']}")
+    print(f"\n📋 Resolved {len(result['resolved_versions'])} channels:")
+    for channel, version in result['resolved_versions'].items():
+        print(f"  - {channel}: {version}")
+
+    conflicts = result['bundle']['compatibility_matrix']['conflicts']
+    if conflicts:
+        print(f"\n⚠️  Found {len(conflicts)} conflicts:")
+        for conflict in conflicts:
+            print(f"  - {conflict['message']} (severity: {conflict['severity']})")
+
+    if args.output:
+        from pathlib import Path
+        output = Path(args.output)
+        BundleManager(args.workspace).save_bundle(result['bundle'], output)
+        print(f"\n📦 Bundle saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Consumer latest指针
+
+latest.yaml 支持三种形式:
+  1. 符号链接: latest.yaml -> v1.2.0.yaml
+  2. 指针文件: 仅包含 `points_to: v1.2.0.yaml` 的小文件，通过 rename 原子替换
+  3. 旧格式: 版本文件的完整拷贝（带注释头）
+
+读取方通过 LatestResolver 解析出真正的版本文件，解析结果按文件签名缓存。
+"""
+
+import os
+import copy
+import yaml
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Any
+
+LATEST_FILENAME = "latest.yaml"
+POINTER_KEY = "points_to"
+# 指针文件的大小上限，超过此大小的latest.yaml一定是旧格式的完整拷贝
+POINTER_MAX_SIZE = 1024
+# 优先使用libyaml的C解析器，比纯Python的SafeLoader快一个数量级
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def write_latest_pointer(consumer_dir: Path, version: str, use_symlink: bool = False) -> Path:
+    """
+    原子地将latest指向指定版本
+
+    先在同目录写入临时文件/链接，再通过 os.replace 替换 latest.yaml，
+    读取方在任何时刻看到的都是完整的旧指针或新指针。
+
+    Args:
+        consumer_dir: consumer目录
+        version: 版本文件名（不含.yaml）
+        use_symlink: 使用符号链接而不是指针文件
+
+    Returns:
+        latest.yaml路径
+    """
+    consumer_dir = Path(consumer_dir)
+    target_name = f"{version}.yaml"
+    latest_file = consumer_dir / LATEST_FILENAME
+    tmp_file = consumer_dir / f".{LATEST_FILENAME}.{os.getpid()}.tmp"
+
+    try:
+        if use_symlink:
+            os.symlink(target_name, tmp_file)
+        else:
+            content = (
+                f"# latest -> {target_name}\n"
+                f"# 由 consumer_version_manager.py update-latest 维护，请勿手动编辑\n"
+                f"{POINTER_KEY}: {target_name}\n"
+            )
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_file, latest_file)
+    finally:
+        if os.path.lexists(tmp_file):
+            os.unlink(tmp_file)
+
+    return latest_file
+
+
+def read_pointer_target(latest_file: Path) -> Optional[str]:
+    """
+    读取latest指向的版本文件名
+
+    Returns:
+        符号链接或指针文件指向的文件名；旧格式完整拷贝返回None
+    """
+    latest_file = Path(latest_file)
+    if latest_file.is_symlink():
+        return os.path.basename(os.readlink(latest_file))
+
+    if latest_file.stat().st_size > POINTER_MAX_SIZE:
+        return None
+
+    with open(latest_file, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    if isinstance(data, dict) and POINTER_KEY in data and 'meta' not in data:
+        return os.path.basename(str(data[POINTER_KEY]))
+    return None
+
+
+class LatestResolver:
+    """latest.yaml解析器，解析结果和配置内容按文件签名缓存"""
+
+    def __init__(self):
+        self._path_cache: Dict[str, Tuple[Tuple[int, int, int], Path]] = {}
+        self._config_cache: Dict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+
+    def resolve(self, config_path) -> Path:
+        """
+        将consumer配置路径解析为真正的版本文件
+
+        非latest文件和旧格式的latest.yaml原样返回。
+        """
+        config_path = Path(config_path)
+        if config_path.name != LATEST_FILENAME:
+            return config_path
+
+        signature = self._signature(config_path, follow_symlinks=False)
+        cached = self._path_cache.get(str(config_path))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        target_name = read_pointer_target(config_path)
+        resolved = config_path.parent / target_name if target_name else config_path
+        if not resolved.exists():
+            raise FileNotFoundError(f"latest指向的版本文件不存在: {resolved}")
+
+        self._path_cache[str(config_path)] = (signature, resolved)
+        return resolved
+
+    def load(self, config_path) -> Dict[str, Any]:
+        """加载consumer配置（latest会先解析到真正的版本文件）"""
+        resolved = self.resolve(config_path)
+        signature = self._signature(resolved)
+
+        cached = self._config_cache.get(str(resolved))
+        if cached and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+
+        with open(resolved, 'r', encoding='utf-8') as f:
+            config = yaml.load(f, Loader=YAML_LOADER)
+        self._config_cache[str(resolved)] = (signature, config)
+        return copy.deepcopy(config)
+
+    @staticmethod
+    def _signature(path: Path, follow_symlinks: bool = True) -> Tuple[int, int, int]:
+        stat = os.stat(path, follow_symlinks=follow_symlinks)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+_default_resolver = LatestResolver()
+
+
+def resolve_consumer_path(config_path) -> Path:
+    """使用进程级缓存解析consumer配置路径"""
+    return _default_resolver.resolve(config_path)
+
+
+def load_consumer_config(config_path) -> Dict[str, Any]:
+    """使用进程级缓存加载consumer配置，兼容指针和旧格式的latest.yaml"""
+    return _default_resolver.load(config_path)
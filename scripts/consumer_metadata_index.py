@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Consumer元数据索引
+
+只解析版本文件开头的meta块（读到meta块结束即停止），并按文件签名(mtime, size)缓存，
+用于回答列表、过期和latest查询，避免对consumers/下的每个文件做完整的YAML解析。
+"""
+
+import os
+import json
+import yaml
+from datetime import datetime, date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+from consumer_latest import LATEST_FILENAME, read_pointer_target
+
+INDEX_FILENAME = ".meta_index.json"
+INDEX_FORMAT_VERSION = 2
+
+
+def extract_meta_block(file_path: Path) -> Dict[str, Any]:
+    """
+    流式提取YAML文件中顶层的meta块
+
+    逐行读取，找到顶层 `meta:` 后收集其缩进内容，遇到下一个顶层键即停止读取。
+
+    Returns:
+        meta字典，文件没有meta块时返回空字典
+    """
+    block: List[str] = []
+    in_meta = False
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not in_meta:
+                if line.startswith('meta:'):
+                    in_meta = True
+                    block.append(line)
+                continue
+
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#') and not line[0].isspace():
+                break  # 下一个顶层键
+            block.append(line)
+
+    if not block:
+        return {}
+
+    data = yaml.safe_load(''.join(block)) or {}
+    meta = data.get('meta') or {}
+    return meta if isinstance(meta, dict) else {}
+
+
+class ConsumerMetadataIndex:
+    """按文件签名缓存的consumer元数据索引"""
+
+    def __init__(self, base_dir="consumers", persist: bool = True):
+        """
+        Args:
+            base_dir: consumers目录
+            persist: 是否将索引持久化到 base_dir/.meta_index.json
+        """
+        self.base_dir = Path(base_dir)
+        self.index_file = self.base_dir / INDEX_FILENAME
+        self.persist = persist
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """
+        刷新索引：只对签名变化的文件重新提取meta
+
+        Returns:
+            {"<consumer>/<file_stem>": {"signature": [mtime_ns, size], "meta": {...}}}
+            latest条目额外记录 "points_to"（指针/符号链接指向的文件名，旧格式为None）
+        """
+        cached = self._entries if self._entries is not None else self._load_index()
+        entries = {}
+        changed = False
+
+        if self.base_dir.exists():
+            for consumer_entry in os.scandir(self.base_dir):
+                if not consumer_entry.is_dir():
+                    continue
+                for file_entry in os.scandir(consumer_entry.path):
+                    if not file_entry.name.endswith('.yaml') or not file_entry.is_file():
+                        continue
+
+                    key = f"{consumer_entry.name}/{file_entry.name[:-len('.yaml')]}"
+                    is_latest = file_entry.name == LATEST_FILENAME
+                    # latest可能是符号链接，签名取链接本身，重新指向时签名随之变化
+                    stat = file_entry.stat(follow_symlinks=not is_latest)
+                    signature = [stat.st_mtime_ns, stat.st_size]
+
+                    entry = cached.get(key)
+                    if entry is None or entry.get('signature') != signature:
+                        entry = self._build_entry(Path(file_entry.path), signature, is_latest)
+                        changed = True
+                    entries[key] = entry
+
+        if changed or set(entries) != set(cached):
+            self._save_index(entries)
+        self._entries = entries
+        return entries
+
+    def list_consumers(self) -> Dict[str, List[str]]:
+        """列出所有consumer及其版本（不含latest）"""
+        consumers: Dict[str, List[str]] = {}
+        for key in self.refresh():
+            consumer, version = key.split('/', 1)
+            consumers.setdefault(consumer, [])
+            if version != 'latest':
+                consumers[consumer].append(version)
+        return consumers
+
+    def get_meta(self, consumer: str, version: str) -> Optional[Dict[str, Any]]:
+        """获取指定版本文件的meta"""
+        entry = self.refresh().get(f"{consumer}/{version}")
+        return entry['meta'] if entry else None
+
+    def find_expired(self, today: Optional[date] = None) -> List[Tuple[str, str]]:
+        """
+        查找已过期的分支
+
+        Returns:
+            [(consumer, version), ...]
+        """
+        today = today or datetime.now().date()
+        expired = []
+
+        for key, entry in sorted(self.refresh().items()):
+            consumer, version = key.split('/', 1)
+            if version == 'latest':
+                continue
+
+            expires_at = entry['meta'].get('expires_at')
+            if not expires_at:
+                continue
+            try:
+                expire_date = datetime.strptime(str(expires_at), "%Y-%m-%d").date()
+            except ValueError:
+                print(f"⚠️  {key} 的expires_at格式无效: {expires_at}")
+                continue
+            if expire_date < today:
+                expired.append((consumer, version))
+
+        return expired
+
+    def latest_version(self, consumer: str) -> Optional[str]:
+        """
+        获取latest当前指向的版本文件名（不含.yaml）
+
+        指针/符号链接形式直接返回指向的文件名；旧格式的latest.yaml是版本文件的完整拷贝，
+        通过meta.version匹配对应的版本文件，找不到对应文件时返回meta.version本身。
+        """
+        entries = self.refresh()
+        latest = entries.get(f"{consumer}/latest")
+        if not latest:
+            return None
+        if latest.get('points_to'):
+            return Path(latest['points_to']).stem
+
+        latest_meta_version = str(latest['meta'].get('version', ''))
+        if not latest_meta_version:
+            return None
+
+        prefix = f"{consumer}/"
+        for key, entry in entries.items():
+            if not key.startswith(prefix) or key == f"{consumer}/latest":
+                continue
+            if str(entry['meta'].get('version', '')) == latest_meta_version:
+                return key[len(prefix):]
+        return latest_meta_version
+
+    def _build_entry(self, file_path: Path, signature: List[int], is_latest: bool) -> Dict[str, Any]:
+        """构建单个文件的索引条目"""
+        if is_latest:
+            points_to = read_pointer_target(file_path)
+            if points_to:
+                # 指针形式的meta以目标版本文件为准，这里不重复记录
+                return {'signature': signature, 'points_to': points_to, 'meta': {}}
+            return {'signature': signature, 'points_to': None, 'meta': self._read_meta(file_path)}
+        return {'signature': signature, 'meta': self._read_meta(file_path)}
+
+    def _read_meta(self, file_path: Path) -> Dict[str, Any]:
+        """提取meta并转换为可JSON序列化的形式"""
+        try:
+            meta = extract_meta_block(file_path)
+        except yaml.YAMLError as e:
+            print(f"⚠️  读取 {file_path} 的meta失败: {e}")
+            return {}
+        return json.loads(json.dumps(meta, default=str))
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """加载持久化的索引"""
+        if not self.persist or not self.index_file.exists():
+            return {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('format_version') != INDEX_FORMAT_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def _save_index(self, entries: Dict[str, Dict[str, Any]]):
+        """原子写入索引文件"""
+        if not self.persist or not self.base_dir.exists():
+            return
+        tmp_file = self.index_file.with_name(self.index_file.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'format_version': INDEX_FORMAT_VERSION, 'entries': entries},
+                          f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except OSError:
+            # 只读工作区中索引仅保留在内存
+            if tmp_file.exists():
+                tmp_file.unlink()
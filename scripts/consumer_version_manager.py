@@ -8,72 +8,74 @@ Consumer版本管理工具
 import os
 import yaml
 import argparse
-import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
 
+from consumer_metadata_index import ConsumerMetadataIndex
+from consumer_latest import LATEST_FILENAME, write_latest_pointer, load_consumer_config
+from consumer_config_resolver import (ConsumerConfigResolver, compute_overlay, collect_requirements,
+                                      INHERITED_META_KEYS)
+from consumer_config_validator import ConsumerConfigValidator
+
 class ConsumerVersionManager:
     def __init__(self, base_dir="consumers"):
         self.base_dir = Path(base_dir)
+        self.meta_index = ConsumerMetadataIndex(self.base_dir)
+        self.resolver = ConsumerConfigResolver(self.base_dir)
+        self.validator = ConsumerConfigValidator(self.base_dir.parent)
         
     def list_consumers(self):
         """列出所有consumer及其版本"""
-        consumers = {}
-        for consumer_dir in self.base_dir.iterdir():
-            if consumer_dir.is_dir():
-                versions = []
-                for version_file in consumer_dir.glob("*.yaml"):
-                    if version_file.name != "latest.yaml":
-                        versions.append(version_file.name.replace(".yaml", ""))
-                consumers[consumer_dir.name] = versions
-        return consumers
+        return self.meta_index.list_consumers()
     
     def create_branch(self, consumer, base_version, new_version, description="", branch_type="experiment", expires_days=30):
-        """创建新的配置分支"""
+        """
+        创建新的配置分支
+
+        分支以overlay形式保存，只记录相对base_version变化的需求，
+        完整配置由 ConsumerConfigResolver 沿parent_version解析得到。
+        """
         consumer_dir = self.base_dir / consumer
         if not consumer_dir.exists():
             raise ValueError(f"Consumer '{consumer}' 不存在")
             
-        base_file = consumer_dir / f"{base_version}.yaml"
-        if not base_file.exists():
-            raise ValueError(f"基础版本 '{base_version}' 不存在")
+        # parent_version固定为具体版本，基于latest创建的分支不随latest移动
+        try:
+            base_version = self._concrete_version(consumer, base_version)
+        except (ValueError, FileNotFoundError):
+            raise ValueError(f"基础版本 '{base_version}' 不存在") from None
             
         new_file = consumer_dir / f"{new_version}.yaml"
         if new_file.exists():
             raise ValueError(f"版本 '{new_version}' 已存在")
             
-        # 复制基础版本
-        shutil.copy2(base_file, new_file)
-        
-        # 更新metadata
-        with open(new_file, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-            
-        config['meta']['version'] = new_version
-        config['meta']['parent_version'] = base_version
-        config['meta']['branch_type'] = branch_type
-        config['meta']['created_at'] = datetime.now().strftime("%Y-%m-%d")
+        # 只沿用基础版本的归属信息，版本自身的字段（updated_at、expires_at等）不带入分支
+        base_meta = self.resolver.resolve(consumer, base_version).get('meta', {})
+        meta = {key: base_meta[key] for key in INHERITED_META_KEYS if key in base_meta}
+        meta['description'] = description or base_meta.get('description', '')
+        meta['version'] = new_version
+        meta['parent_version'] = base_version
+        meta['overlay'] = True
+        meta['branch_type'] = branch_type
+        meta['created_at'] = datetime.now().strftime("%Y-%m-%d")
         
         if expires_days:
             expire_date = datetime.now() + timedelta(days=expires_days)
-            config['meta']['expires_at'] = expire_date.strftime("%Y-%m-%d")
-            
-        if description:
-            config['meta']['description'] = description
+            meta['expires_at'] = expire_date.strftime("%Y-%m-%d")
             
-        # 添加变更历史
-        if 'change_history' not in config:
-            config['change_history'] = []
-            
-        config['change_history'].append({
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'version': new_version,
-            'changes': f"基于{base_version}创建{branch_type}分支: {description}"
-        })
+        config = {
+            'meta': meta,
+            # 只写入相对parent_version变化的需求，按channel与父配置合并
+            'requirements': [],
+            'change_history': [{
+                'date': datetime.now().strftime("%Y-%m-%d"),
+                'version': new_version,
+                'changes': f"基于{base_version}创建{branch_type}分支: {description}"
+            }]
+        }
         
-        with open(new_file, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f, default_flow_style=False, allow_unicode=True, indent=2)
+        self._write_config(new_file, config)
             
         print(f"✅ 成功创建分支: {consumer}/{new_version}")
         return new_file
@@ -87,66 +89,29 @@ class ConsumerVersionManager:
             raise ValueError(f"版本 '{version}' 不存在")
             
         # 检查是否为latest
-        latest_file = consumer_dir / "latest.yaml"
-        if latest_file.exists():
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                latest_config = yaml.safe_load(f)
-                if latest_config.get('meta', {}).get('version') == version:
-                    if not force:
-                        raise ValueError(f"版本 '{version}' 是当前latest版本，使用 --force 强制删除")
-                    
+        if self.meta_index.latest_version(consumer) == version and not force:
+            raise ValueError(f"版本 '{version}' 是当前latest版本，使用 --force 强制删除")
+            
+        # 以该版本为parent的overlay分支需要先脱离继承关系
+        self._detach_children(consumer, version)
         version_file.unlink()
         print(f"✅ 已删除分支: {consumer}/{version}")
     
-    def update_latest(self, consumer, version):
-        """更新latest指向"""
+    def update_latest(self, consumer, version, use_symlink=False):
+        """更新latest指向（原子替换为指针文件或符号链接）"""
         consumer_dir = self.base_dir / consumer
         version_file = consumer_dir / f"{version}.yaml"
-        latest_file = consumer_dir / "latest.yaml"
         
         if not version_file.exists():
             raise ValueError(f"版本 '{version}' 不存在")
             
-        # 复制配置内容到latest.yaml
-        shutil.copy2(version_file, latest_file)
-        
-        # 在latest.yaml顶部添加注释
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        header = f"# This file points to the current recommended version: {version}\n"
-        header += f"# In production, this would be a symbolic link: ln -s {version}.yaml latest.yaml\n\n"
-        
-        with open(latest_file, 'w', encoding='utf-8') as f:
-            f.write(header + content)
+        write_latest_pointer(consumer_dir, version, use_symlink)
             
         print(f"✅ 已更新latest指向: {consumer}/{version}")
     
     def clean_expired(self, dry_run=True):
         """清理过期的分支"""
-        today = datetime.now().date()
-        expired_branches = []
-        
-        for consumer_dir in self.base_dir.iterdir():
-            if not consumer_dir.is_dir():
-                continue
-                
-            for version_file in consumer_dir.glob("*.yaml"):
-                if version_file.name == "latest.yaml":
-                    continue
-                    
-                try:
-                    with open(version_file, 'r', encoding='utf-8') as f:
-                        config = yaml.safe_load(f)
-                        
-                    expire_date_str = config.get('meta', {}).get('expires_at')
-                    if expire_date_str:
-                        expire_date = datetime.strptime(expire_date_str, "%Y-%m-%d").date()
-                        if expire_date < today:
-                            expired_branches.append((consumer_dir.name, version_file.stem))
-                            
-                except Exception as e:
-                    print(f"⚠️  读取 {version_file} 失败: {e}")
+        expired_branches = self.meta_index.find_expired(datetime.now().date())
                     
         if not expired_branches:
             print("✅ 没有发现过期的分支")
@@ -167,51 +132,136 @@ class ConsumerVersionManager:
             print("\n🔍 这是预览模式，使用 --execute 执行实际删除")
     
     def validate_config(self, consumer, version):
-        """验证配置文件"""
+        """验证配置文件（overlay分支验证解析后的完整配置）"""
         consumer_dir = self.base_dir / consumer
         version_file = consumer_dir / f"{version}.yaml"
         
         if not version_file.exists():
             raise ValueError(f"版本文件不存在: {version_file}")
             
-        try:
-            with open(version_file, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+        result = self.validator.validate_one(consumer, version)
+        for warning in result['warnings']:
+            print(f"⚠️  {warning}")
+        if result['errors']:
+            raise ValueError("配置验证失败:\n  " + "\n  ".join(result['errors']))
+                        
+        print(f"✅ 配置验证通过: {consumer}/{version}")
+        return True
+    
+    def validate_all(self):
+        """并行验证所有consumer版本文件，返回失败的文件数"""
+        results = self.validator.validate_all()
+        failed = 0
+        for result in results:
+            rel = os.path.relpath(result['file'], self.base_dir)
+            if result['errors']:
+                failed += 1
+                print(f"❌ {rel}")
+            elif result['warnings']:
+                print(f"⚠️  {rel}")
+            for error in result['errors']:
+                print(f"   ❌ {error}")
+            for warning in result['warnings']:
+                print(f"   ⚠️  {warning}")
                 
-            # 验证必需字段
-            required_fields = ['meta', 'requirements']
-            for field in required_fields:
-                if field not in config:
-                    raise ValueError(f"缺少必需字段: {field}")
-                    
-            # 验证meta字段
-            meta = config['meta']
-            required_meta = ['consumer', 'version', 'owner', 'description']
-            for field in required_meta:
-                if field not in meta:
-                    raise ValueError(f"meta缺少必需字段: {field}")
-                    
-            # 验证requirements
-            requirements = config['requirements']
-            if not isinstance(requirements, list):
-                raise ValueError("requirements必须是列表")
+        print(f"📊 验证完成: {len(results)} 个文件, {failed} 个失败")
+        return failed
+    
+    def diff_versions(self, consumer, from_version, to_version):
+        """
+        比较两个版本解析后的需求差异
+        
+        Returns:
+            {'added': [...], 'removed': [...], 'changed': {channel: {field: [old, new]}}}
+        """
+        old_reqs = {r['channel']: r for r in collect_requirements(self.resolver.resolve(consumer, from_version))}
+        new_reqs = {r['channel']: r for r in collect_requirements(self.resolver.resolve(consumer, to_version))}
+        
+        changed = {}
+        for channel in sorted(set(old_reqs) & set(new_reqs)):
+            old, new = old_reqs[channel], new_reqs[channel]
+            fields = {k: [old.get(k), new.get(k)] for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k)}
+            if fields:
+                changed[channel] = fields
                 
-            for req in requirements:
-                required_req = ['channel', 'version', 'required', 'on_missing']
-                for field in required_req:
-                    if field not in req:
-                        raise ValueError(f"requirement缺少必需字段: {field}")
-                        
-                # 验证on_missing值
-                valid_on_missing = ['interrupt', 'skip_frame', 'continue', 'fetch_latest']
-                if req['on_missing'] not in valid_on_missing:
-                    raise ValueError(f"无效的on_missing值: {req['on_missing']}，必须是 {valid_on_missing} 之一")
-                        
-            print(f"✅ 配置验证通过: {consumer}/{version}")
-            return True
+        return {
+            'added': sorted(set(new_reqs) - set(old_reqs)),
+            'removed': sorted(set(old_reqs) - set(new_reqs)),
+            'changed': changed
+        }
+    
+    def _detach_children(self, consumer, version):
+        """
+        将以version为parent的overlay分支改写为不依赖version的形式
+        
+        version本身是overlay时，子分支重新基于version的parent计算overlay；
+        否则子分支物化为完整配置。
+        """
+        parent_names = {version, version.lstrip('v'), f"v{version.lstrip('v')}"}
+        # 旧版本创建的分支可能以latest为parent
+        try:
+            if self._concrete_version(consumer, 'latest') == version:
+                parent_names.add('latest')
+        except (ValueError, FileNotFoundError):
+            pass
+        children = [
+            child for child, meta in (
+                (v, self.meta_index.get_meta(consumer, v) or {})
+                for v in self.meta_index.list_consumers().get(consumer, [])
+            )
+            if meta.get('overlay') and str(meta.get('parent_version')) in parent_names
+        ]
+        if not children:
+            return
             
-        except yaml.YAMLError as e:
-            raise ValueError(f"YAML格式错误: {e}")
+        consumer_dir = self.base_dir / consumer
+        version_file = consumer_dir / f"{version}.yaml"
+        with open(version_file, 'r', encoding='utf-8') as f:
+            version_config = yaml.safe_load(f)
+        version_meta = version_config.get('meta') or {}
+        
+        for child in children:
+            child_file = consumer_dir / f"{child}.yaml"
+            with open(child_file, 'r', encoding='utf-8') as f:
+                child_config = yaml.safe_load(f)
+            resolved_child = self.resolver.resolve(consumer, child)
+            
+            grandparent = str(version_meta.get('parent_version', ''))
+            if grandparent == 'latest':
+                grandparent = self._concrete_version(consumer, grandparent)
+            if version_meta.get('overlay') and 'requirement_groups' not in resolved_child:
+                # 祖先上的变化合并进子分支的overlay
+                diff = compute_overlay(self.resolver.resolve(consumer, grandparent), resolved_child)
+                child_config['meta']['parent_version'] = grandparent
+                child_config['requirements'] = diff['requirements']
+                child_config.pop('removed_requirements', None)
+                if diff['removed_requirements']:
+                    child_config['removed_requirements'] = diff['removed_requirements']
+                child_config['change_history'] = (list(version_config.get('change_history') or [])
+                                                  + list(child_config.get('change_history') or []))
+                print(f"🔗 {consumer}/{child} 的parent_version改为 {grandparent}")
+            else:
+                child_config = resolved_child
+                print(f"📄 {consumer}/{child} 已物化为完整配置")
+                
+            self._write_config(child_file, child_config)
+    
+    def _concrete_version(self, consumer, version):
+        """将版本号（含latest）解析为具体的版本文件名（不含.yaml）"""
+        version_file = self.resolver.version_file(consumer, version)
+        if version_file.name == LATEST_FILENAME:
+            # 旧格式的latest是完整拷贝，按其meta.version定位版本文件
+            meta = load_consumer_config(version_file).get('meta') or {}
+            version_file = self.resolver.version_file(consumer, str(meta.get('version', '')))
+        return version_file.stem
+    
+    @staticmethod
+    def _write_config(file_path, config):
+        """原子写入配置文件"""
+        tmp_file = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            yaml.dump(config, f, default_flow_style=False, allow_unicode=True, indent=2, sort_keys=False)
+        os.replace(tmp_file, file_path)
 
 def main():
     parser = argparse.ArgumentParser(description="Consumer版本管理工具")
@@ -241,6 +291,7 @@ def main():
     latest_parser = subparsers.add_parser('update-latest', help='更新latest指向')
     latest_parser.add_argument('--consumer', required=True, help='Consumer名称')
     latest_parser.add_argument('--version', required=True, help='版本名称')
+    latest_parser.add_argument('--symlink', action='store_true', help='使用符号链接代替指针文件')
     
     # clean命令
     clean_parser = subparsers.add_parser('clean', help='清理过期分支')
@@ -251,6 +302,20 @@ def main():
     validate_parser.add_argument('--consumer', required=True, help='Consumer名称')
     validate_parser.add_argument('--version', required=True, help='版本名称')
     
+    # validate-all命令
+    subparsers.add_parser('validate-all', help='并行验证所有consumer配置文件')
+    
+    # resolve命令
+    resolve_parser = subparsers.add_parser('resolve', help='输出解析继承链后的完整配置')
+    resolve_parser.add_argument('--consumer', required=True, help='Consumer名称')
+    resolve_parser.add_argument('--version', required=True, help='版本名称')
+    
+    # diff命令
+    diff_parser = subparsers.add_parser('diff', help='比较两个版本的需求差异')
+    diff_parser.add_argument('--consumer', required=True, help='Consumer名称')
+    diff_parser.add_argument('--from-version', required=True, help='起始版本')
+    diff_parser.add_argument('--to-version', required=True, help='目标版本')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -278,7 +343,7 @@ def main():
             manager.delete_branch(args.consumer, args.version, args.force)
             
         elif args.command == 'update-latest':
-            manager.update_latest(args.consumer, args.version)
+            manager.update_latest(args.consumer, args.version, args.symlink)
             
         elif args.command == 'clean':
             manager.clean_expired(dry_run=not args.execute)
@@ -286,6 +351,27 @@ def main():
         elif args.command == 'validate':
             manager.validate_config(args.consumer, args.version)
             
+        elif args.command == 'validate-all':
+            if manager.validate_all():
+                sys.exit(1)
+            
+        elif args.command == 'resolve':
+            config = manager.resolver.resolve(args.consumer, args.version)
+            print(yaml.dump(config, default_flow_style=False, allow_unicode=True, indent=2, sort_keys=False))
+            
+        elif args.command == 'diff':
+            diff = manager.diff_versions(args.consumer, args.from_version, args.to_version)
+            print(f"📊 {args.consumer}: {args.from_version} -> {args.to_version}")
+            for channel in diff['added']:
+                print(f"  + {channel}")
+            for channel in diff['removed']:
+                print(f"  - {channel}")
+            for channel, fields in diff['changed'].items():
+                changes = ', '.join(f"{k}: {old} -> {new}" for k, (old, new) in fields.items())
+                print(f"  ~ {channel} ({changes})")
+            if not any(diff.values()):
+                print("  (无差异)")
+            
     except Exception as e:
         print(f"❌ 错误: {e}")
         sys.exit(1)
@@ -16,6 +16,7 @@ import json
 # 导入现有的核心模块
 from bundle_manager import BundleManager
 from database_query_helper import DatabaseQueryHelper
+from consumer_config_resolver import load_resolved_config
 
 class DatabaseBundleGenerator:
     """基于数据库的简化Bundle生成器"""
@@ -77,8 +78,8 @@ class DatabaseBundleGenerator:
         if not full_path.exists():
             raise FileNotFoundError(f"Consumer配置不存在: {consumer_path}")
             
-        with open(full_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        # latest.yaml 可能是指向版本文件的指针，分支版本可能是overlay
+        return load_resolved_config(full_path)
     
     def _extract_consumer_name(self, consumer_config: Dict[str, Any]) -> str:
         """提取Consumer名称"""
@@ -8,11 +8,11 @@ import argparse
 import sys
 from pathlib import Path
 from typing import Optional
-import yaml
 
 # 导入我们的管理器
 from consumer_alias_manager import ConsumerAliasManager
 from production_cycle_manager import ProductionCycleManager
+from consumer_latest import load_consumer_config
 
 class DataSpecCLI:
     """DataSpec 简化命令行工具"""
@@ -87,11 +87,10 @@ class DataSpecCLI:
             if consumer_dir.is_dir():
                 latest_file = consumer_dir / "latest.yaml"
                 if latest_file.exists():
-                    # 读取版本信息
-                    with open(latest_file, 'r', encoding='utf-8') as f:
-                        config = yaml.safe_load(f)
-                        version = config.get('meta', {}).get('version', 'unknown')
-                        description = config.get('meta', {}).get('description', '')
+                    # 读取版本信息 (latest.yaml 可能是指针)
+                    config = load_consumer_config(latest_file)
+                    version = config.get('meta', {}).get('version', 'unknown')
+                    description = config.get('meta', {}).get('description', '')
                     
                     status = self.cycle_manager.get_user_friendly_status(consumer_dir.name)
                     print(f"  • {consumer_dir.name}@{version}")
@@ -120,9 +119,8 @@ class DataSpecCLI:
             )
             
             # 3. 读取consumer版本
-            with open(consumer_file, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-                consumer_version = config.get('meta', {}).get('version', 'latest')
+            config = load_consumer_config(consumer_file)
+            consumer_version = config.get('meta', {}).get('version', 'latest')
             
             # 4. 注册到别名管理器
             self.alias_manager.register_consumer_version(
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Git历史访问层 - 不检出工作区，直接从Git对象读取历史版本的文件
+
+  - 对象通过 git_cat_file.CatFileReader 的常驻进程批量读取（data_release_repo 的 GitSession 使用同一文件的副本），
+    目录通过解析tree对象列出，不再启动 ls-tree
+  - iter_changes 用一次 git log 取出主线(first-parent)上每个提交修改过的文件，NUL分隔；
+    关闭重命名检测，重命名记为旧路径删除 + 新路径新增
+  - CommitDateIndex 把主线提交按时间索引并持久化，按日期定位提交只需二分查找
+  - 路径均相对于构造时传入的工作空间根目录
+"""
+
+import os
+import json
+import bisect
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional, Iterator, Iterable, Tuple
+
+from git_cat_file import CatFileReader, GitError
+
+# git log 输出中每个提交以该字符开头，提交内各字段和文件名以NUL分隔
+RECORD_SEPARATOR = b'\x1e'
+COMMIT_INDEX_FILENAME = ".history_index.json"
+COMMIT_INDEX_FORMAT_VERSION = 1
+SYMLINK_MODE = '120000'
+
+
+class GitHistory:
+    """工作空间所在Git仓库的历史视图（非线程安全）"""
+
+    def __init__(self, workspace: str = "."):
+        """
+        Raises:
+            GitError: workspace不在Git仓库中
+        """
+        self.workspace = os.path.abspath(workspace)
+        self.repo_root = self.run(['rev-parse', '--show-toplevel'])
+        self._reader = CatFileReader(self.workspace)
+
+    def __enter__(self) -> 'GitHistory':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """结束常驻的cat-file进程"""
+        self._reader.close()
+
+    def run(self, args: List[str], binary: bool = False):
+        """执行Git命令，返回stdout（文本模式下去掉首尾空白）"""
+        try:
+            result = subprocess.run(['git'] + args, cwd=self.workspace, capture_output=True, check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = getattr(e, 'stderr', None)
+            detail = stderr.decode('utf-8', 'replace').strip() if stderr else str(e)
+            raise GitError(f"git {' '.join(args)}: {detail}") from None
+        return result.stdout if binary else result.stdout.decode('utf-8', 'replace').strip()
+
+    def head(self) -> Optional[str]:
+        """HEAD的提交sha，空仓库时为None"""
+        try:
+            return self.run(['rev-parse', '--verify', '-q', 'HEAD'])
+        except GitError:
+            return None
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        try:
+            self.run(['merge-base', '--is-ancestor', ancestor, descendant])
+            return True
+        except GitError:
+            return False
+
+    def iter_changes(self, paths: Iterable[str], since: Optional[str] = None,
+                     until: str = 'HEAD') -> Iterator[Tuple[str, int, List[str]]]:
+        """
+        按时间正序列出主线上修改过paths的提交
+
+        Args:
+            paths: 路径过滤（相对工作空间）
+            since: 只列出该提交之后的提交（不含）
+
+        Yields:
+            (提交sha, 提交时间戳, 修改过的文件列表)；合并提交列出相对第一个父提交的变更，
+            重命名的文件同时列出旧路径和新路径
+        """
+        revision = f"{since}..{until}" if since else until
+        output = self.run(['log', '--reverse', '--first-parent', '-z', '--name-only', '--no-renames', '--relative',
+                           '--format=%x1e%H%x00%ct%x00', revision, '--'] + list(paths), binary=True)
+        for record in output.split(RECORD_SEPARATOR):
+            if not record:
+                continue
+            sha, timestamp, files = record.split(b'\0', 2)
+            yield (sha.decode(), int(timestamp),
+                   [name.decode('utf-8', 'replace') for name in files.strip(b'\n\0').lstrip(b'\n').split(b'\0') if name])
+
+    # ---- 对象读取 ----
+
+    def read_objects(self, specs: List[str]) -> List[Optional[Tuple[str, str, bytes]]]:
+        """批量读取对象，返回与specs一一对应的 (sha, type, 内容) 或None(不存在)"""
+        return self._reader.read_objects(specs)
+
+    def read_blobs(self, requests: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[bytes]]:
+        """批量读取 (rev, 相对工作空间的路径) 的文件内容，不存在时为None"""
+        requests = list(dict.fromkeys(requests))
+        results = self.read_objects([f"{rev}:./{path}" for rev, path in requests])
+        return {request: (result[2] if result and result[1] == 'blob' else None)
+                for request, result in zip(requests, results)}
+
+    def read_blob(self, rev: str, path: str) -> Optional[bytes]:
+        return self.read_blobs([(rev, path)])[(rev, path)]
+
+    def list_dir(self, rev: str, path: str) -> Optional[Dict[str, Tuple[str, str]]]:
+        """
+        列出rev中目录的直接子项
+
+        Returns:
+            {名称: (mode, sha)}，目录不存在时为None；符号链接的mode为120000
+        """
+        spec = f"{rev}:./{path}" if path not in ('', '.') else f"{rev}^{{tree}}"
+        result = self.read_objects([spec])[0]
+        if result is None or result[1] != 'tree':
+            return None
+
+        # tree对象: 重复的 "<mode> <name>\0<二进制sha>"，sha长度与对象名一致(SHA-1为20字节)
+        sha_size = len(result[0]) // 2
+        data = result[2]
+        entries = {}
+        position = 0
+        while position < len(data):
+            space = data.index(b' ', position)
+            nul = data.index(b'\0', space)
+            mode = data[position:space].decode()
+            name = data[space + 1:nul].decode('utf-8', 'replace')
+            entries[name] = (mode.zfill(6), data[nul + 1:nul + 1 + sha_size].hex())
+            position = nul + 1 + sha_size
+        return entries
+
+
+class CommitDateIndex:
+    """主线(first-parent)提交的时间索引，持久化在 <workspace>/.history_index.json，随HEAD增量更新"""
+
+    def __init__(self, git: GitHistory, persist: bool = True):
+        self.git = git
+        self.index_file = os.path.join(git.workspace, COMMIT_INDEX_FILENAME)
+        self.persist = persist
+        self.head: Optional[str] = None
+        self.commits: List[List] = []  # [[timestamp, sha], ...] 由旧到新
+        self._ceiling: List[int] = []
+
+    def refresh(self) -> 'CommitDateIndex':
+        """同步到当前HEAD：HEAD是已索引提交的后代时只追加新提交，否则重建"""
+        head = self.git.head()
+        if self.head is None:
+            self._load()
+        if head == self.head:
+            return self
+
+        since = self.head if self.head and head and self.git.is_ancestor(self.head, head) else None
+        if since is None:
+            self.commits = []
+        if head:
+            revision = f"{since}..{head}" if since else head
+            output = self.git.run(['log', '--first-parent', '--reverse', '--format=%ct %H', revision])
+            for line in output.split('\n'):
+                if line:
+                    timestamp, sha = line.split(' ', 1)
+                    self.commits.append([int(timestamp), sha])
+        self.head = head
+        self._build_ceiling()
+        self._save()
+        return self
+
+    def commit_at(self, when: datetime) -> Optional[Tuple[str, int]]:
+        """
+        主线在when时刻的提交
+
+        提交时间不严格递增时（rebase、时钟偏差），取所有更早提交都不晚于when的最新提交
+
+        Returns:
+            (sha, 提交时间戳)，when早于第一个提交时为None
+        """
+        position = bisect.bisect_right(self._ceiling, when.timestamp())
+        if position == 0:
+            return None
+        timestamp, sha = self.commits[position - 1]
+        return sha, timestamp
+
+    def _build_ceiling(self):
+        # 前缀最大值单调不减，可以直接二分
+        self._ceiling = []
+        ceiling = 0
+        for timestamp, _ in self.commits:
+            ceiling = max(ceiling, timestamp)
+            self._ceiling.append(ceiling)
+
+    def _load(self):
+        if not self.persist:
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('format') == COMMIT_INDEX_FORMAT_VERSION:
+            self.head = data.get('head')
+            self.commits = data.get('commits') or []
+            self._build_ceiling()
+
+    def _save(self):
+        if not self.persist:
+            return
+        tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'format': COMMIT_INDEX_FORMAT_VERSION, 'head': self.head, 'commits': self.commits},
+                      f, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
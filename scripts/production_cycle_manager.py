@@ -11,6 +11,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+from production_eta import ProductionETAModel, ETAPrediction
+
 class ProductionStatus(Enum):
     """生产状态"""
     PLANNING = "planning"      # 规划中
@@ -44,6 +46,7 @@ class ProductionCycleManager:
     def __init__(self, workspace_root: str = "."):
         self.workspace_root = Path(workspace_root)
         self.cycles_file = self.workspace_root / "production_cycles.yaml"
+        self.throughput_file = self.workspace_root / "production_throughput.yaml"
         
     def register_production_cycle(self, consumer_name: str, consumer_version: str,
                                 start_date: str, duration_days: int) -> ProductionCycle:
@@ -106,7 +109,9 @@ class ProductionCycleManager:
         
     def schedule_version_transition(self, consumer_name: str, 
                                   from_version: str, to_version: str,
-                                  transition_date: str) -> Dict:
+                                  transition_date: str,
+                                  from_bundle: Optional[str] = None,
+                                  to_bundle: Optional[str] = None) -> Dict:
         """
         安排版本切换计划
         
@@ -115,6 +120,8 @@ class ProductionCycleManager:
             from_version: 当前版本
             to_version: 目标版本
             transition_date: 切换日期
+            from_bundle: 当前版本使用的bundle (可选，默认从生产周期推断)
+            to_bundle: 目标版本使用的bundle (可选，默认从生产周期推断)
         """
         transition = {
             'consumer_name': consumer_name,
@@ -124,6 +131,10 @@ class ProductionCycleManager:
             'status': 'scheduled',
             'created_at': datetime.datetime.now().isoformat()
         }
+        if from_bundle:
+            transition['from_bundle'] = from_bundle
+        if to_bundle:
+            transition['to_bundle'] = to_bundle
         
         transitions = self._load_transitions()
         transitions.append(transition)
@@ -195,6 +206,161 @@ class ProductionCycleManager:
         else:
             return f"✅ {consumer_name}@{active_version}: 生产完成，可使用"
     
+    def record_throughput(self, channel: str, date: str, samples: int,
+                          size_gb: float = 0.0, version: Optional[str] = None) -> Dict:
+        """
+        记录通道单日实际产能
+        
+        Args:
+            channel: 通道名称
+            date: 生产日期 (YYYY-MM-DD)
+            samples: 当日生产的样本数
+            size_gb: 当日生产的数据量(GB)
+            version: 生产的通道版本 (可选)
+        """
+        datetime.datetime.strptime(date, "%Y-%m-%d")  # 校验日期格式
+        
+        record = {
+            'channel': channel,
+            'date': date,
+            'samples': samples,
+            'size_gb': size_gb
+        }
+        if version:
+            record['version'] = version
+            
+        records = self._load_throughput()
+        records.append(record)
+        
+        with open(self.throughput_file, 'w', encoding='utf-8') as f:
+            yaml.dump(records, f, default_flow_style=False, allow_unicode=True)
+            
+        return record
+        
+    def predict_completion(self, consumer_name: str, consumer_version: str,
+                           confidence: float = 0.9) -> ETAPrediction:
+        """
+        基于Bundle数据量和历史产能预测生产周期完成时间
+        
+        Args:
+            consumer_name: 消费者名称
+            consumer_version: 消费者版本
+            confidence: 置信水平
+            
+        Returns:
+            ETAPrediction
+        """
+        cycle = next((c for c in self._load_cycles()
+                      if c.consumer_name == consumer_name
+                      and c.consumer_version == consumer_version), None)
+        if not cycle:
+            raise ValueError(f"未注册的生产周期: {consumer_name}@{consumer_version}")
+            
+        return self._predict_cycle(cycle, self._create_eta_model(), confidence)
+        
+    def check_overruns(self, confidence: float = 0.9) -> List[ETAPrediction]:
+        """
+        检查所有未完成的生产周期，返回预计会超期的周期
+        
+        Args:
+            confidence: 置信水平
+        """
+        model = self._create_eta_model()
+        at_risk = []
+        
+        for cycle in self._load_cycles():
+            if cycle.status not in (ProductionStatus.PLANNING, ProductionStatus.PRODUCING):
+                continue
+            prediction = self._predict_cycle(cycle, model, confidence)
+            if prediction.will_overrun:
+                at_risk.append(prediction)
+                
+        return at_risk
+        
+    def get_cycle_bundle(self, consumer_name: str, consumer_version: str,
+                         prefer_next: bool = False) -> Optional[str]:
+        """
+        获取生产周期关联的bundle
+        
+        Args:
+            consumer_name: 消费者名称
+            consumer_version: 消费者版本
+            prefer_next: 优先返回正在生产的next_bundle
+        """
+        cycle = next((c for c in self._load_cycles()
+                      if c.consumer_name == consumer_name
+                      and c.consumer_version == consumer_version), None)
+        if not cycle:
+            return None
+        if prefer_next:
+            return cycle.next_bundle or cycle.current_bundle
+        return cycle.current_bundle or cycle.next_bundle
+        
+    def get_bundle_resolved_versions(self, bundle_path: str) -> Dict[str, str]:
+        """
+        读取Bundle中各通道的解析版本，兼容各Bundle生成器的输出格式
+        
+        Args:
+            bundle_path: Bundle文件路径 (相对工作空间根目录)
+            
+        Returns:
+            {channel: version}
+        """
+        bundle_file = self.workspace_root / bundle_path
+        if not bundle_file.exists():
+            return {}
+            
+        with open(bundle_file, 'r', encoding='utf-8') as f:
+            bundle = yaml.safe_load(f) or {}
+            
+        # bundle_manager 格式
+        if bundle.get('resolved_versions'):
+            return dict(bundle['resolved_versions'])
+            
+        # database_bundle_generator 格式
+        if bundle.get('resolved_channels'):
+            return {channel: info['version']
+                    for channel, info in bundle['resolved_channels'].items()}
+                    
+        # bundle_generator 格式: 取首选的可用版本
+        resolved = {}
+        for channel_config in bundle.get('channels', []):
+            version = channel_config.get('version')
+            if not version and channel_config.get('available_versions'):
+                version = channel_config['available_versions'][0]
+            if version:
+                resolved[channel_config['channel']] = str(version)
+        return resolved
+        
+    def _predict_cycle(self, cycle: ProductionCycle, model: ProductionETAModel,
+                       confidence: float) -> ETAPrediction:
+        """预测单个生产周期"""
+        bundle_path = cycle.next_bundle or cycle.current_bundle
+        resolved_versions = self.get_bundle_resolved_versions(bundle_path) if bundle_path else {}
+        
+        prediction = model.predict(
+            cycle.consumer_name, cycle.consumer_version,
+            cycle.start_date, cycle.expected_end_date,
+            resolved_versions, confidence
+        )
+        if not bundle_path:
+            prediction.reason = "生产周期未关联Bundle"
+        return prediction
+        
+    def _create_eta_model(self) -> ProductionETAModel:
+        """创建ETA模型"""
+        from database_query_helper import DatabaseQueryHelper
+        db_helper = DatabaseQueryHelper(str(self.workspace_root))
+        return ProductionETAModel(db_helper, self._load_throughput())
+        
+    def _load_throughput(self) -> List[Dict]:
+        """加载历史产能记录"""
+        if not self.throughput_file.exists():
+            return []
+            
+        with open(self.throughput_file, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or []
+    
     def _load_cycles(self) -> List[ProductionCycle]:
         """加载生产周期数据"""
         if not self.cycles_file.exists():
@@ -264,6 +430,18 @@ class ProductionCycleManager:
         bundle_file = self.workspace_root / bundle_path
         return bundle_file.exists()
 
+def _print_prediction(prediction: ETAPrediction):
+    """打印ETA预测结果"""
+    icons = {'on_track': '✅', 'at_risk': '⚠️ ', 'overrun': '🚨', 'unknown': '❓'}
+    print(f"{icons.get(prediction.status, '❓')} {prediction.consumer_name}@{prediction.consumer_version}")
+    print(f"   计划完成: {prediction.expected_end_date}")
+    if prediction.predicted_end_date:
+        print(f"   预计完成: {prediction.predicted_end_date} "
+              f"({prediction.confidence:.0%}区间: {prediction.lower_bound_date} ~ {prediction.upper_bound_date})")
+        print(f"   瓶颈通道: {prediction.bottleneck_channel}")
+    if prediction.reason:
+        print(f"   说明: {prediction.reason}")
+
 def main():
     """命令行接口"""
     import argparse
@@ -286,6 +464,33 @@ def main():
     status_parser = subparsers.add_parser('status', help='查询状态')
     status_parser.add_argument('--consumer', required=True, help='消费者名称')
     
+    # 安排版本切换
+    transition_parser = subparsers.add_parser('schedule-transition', help='安排版本切换计划')
+    transition_parser.add_argument('--consumer', required=True, help='消费者名称')
+    transition_parser.add_argument('--from-version', required=True, help='当前版本')
+    transition_parser.add_argument('--to-version', required=True, help='目标版本')
+    transition_parser.add_argument('--date', required=True, help='切换日期 (YYYY-MM-DD)')
+    transition_parser.add_argument('--from-bundle', help='当前版本使用的bundle路径')
+    transition_parser.add_argument('--to-bundle', help='目标版本使用的bundle路径')
+    
+    # 记录产能
+    throughput_parser = subparsers.add_parser('record-throughput', help='记录通道单日产能')
+    throughput_parser.add_argument('--channel', required=True, help='通道名称')
+    throughput_parser.add_argument('--date', required=True, help='生产日期 (YYYY-MM-DD)')
+    throughput_parser.add_argument('--samples', type=int, required=True, help='当日生产样本数')
+    throughput_parser.add_argument('--size-gb', type=float, default=0.0, help='当日生产数据量(GB)')
+    throughput_parser.add_argument('--channel-version', help='生产的通道版本')
+    
+    # 预测完成时间
+    eta_parser = subparsers.add_parser('eta', help='预测生产周期完成时间')
+    eta_parser.add_argument('--consumer', required=True, help='消费者名称')
+    eta_parser.add_argument('--version', required=True, help='消费者版本')
+    eta_parser.add_argument('--confidence', type=float, default=0.9, help='置信水平 (默认: 0.9)')
+    
+    # 超期检查
+    overrun_parser = subparsers.add_parser('check-overruns', help='检查预计超期的生产周期')
+    overrun_parser.add_argument('--confidence', type=float, default=0.9, help='置信水平 (默认: 0.9)')
+    
     args = parser.parse_args()
     manager = ProductionCycleManager()
     
@@ -302,6 +507,25 @@ def main():
     elif args.command == 'status':
         status = manager.get_user_friendly_status(args.consumer)
         print(status)
+    elif args.command == 'schedule-transition':
+        manager.schedule_version_transition(
+            args.consumer, args.from_version, args.to_version, args.date,
+            args.from_bundle, args.to_bundle
+        )
+    elif args.command == 'record-throughput':
+        manager.record_throughput(
+            args.channel, args.date, args.samples, args.size_gb, args.channel_version
+        )
+        print(f"✅ 已记录产能: {args.channel} {args.date} {args.samples} samples")
+    elif args.command == 'eta':
+        prediction = manager.predict_completion(args.consumer, args.version, args.confidence)
+        _print_prediction(prediction)
+    elif args.command == 'check-overruns':
+        predictions = manager.check_overruns(args.confidence)
+        if not predictions:
+            print("✅ 没有预计超期的生产周期")
+        for prediction in predictions:
+            _print_prediction(prediction)
     else:
         parser.print_help()
 
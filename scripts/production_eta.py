@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+生产周期ETA模型 - 基于数据量和历史产能预测完成时间
+结合Bundle各通道的 sample_count/size_gb 与按通道统计的历史日产能，
+给出带置信区间的预计完成日期，并提前标记可能超期的生产周期
+"""
+
+import datetime
+import math
+import statistics
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+from database_query_helper import DatabaseQueryHelper
+
+
+@dataclass
+class ChannelETA:
+    """单个通道的完成时间估计"""
+    channel: str
+    version: str
+    unit: str                  # samples | size_gb
+    target: float              # 需要的数据总量
+    produced: float            # 周期开始以来已生产的数据量
+    daily_rate: float          # 平均日产能
+    daily_rate_std: float      # 日产能标准差
+    history_days: int          # 参与统计的历史天数
+    expected_days: float
+    lower_days: float
+    upper_days: float
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.target - self.produced)
+
+
+@dataclass
+class ETAPrediction:
+    """生产周期完成时间预测"""
+    consumer_name: str
+    consumer_version: str
+    expected_end_date: datetime.date           # 按 expected_duration_days 计算的计划完成日期
+    predicted_end_date: Optional[datetime.date] = None
+    lower_bound_date: Optional[datetime.date] = None
+    upper_bound_date: Optional[datetime.date] = None
+    confidence: float = 0.9
+    bottleneck_channel: Optional[str] = None
+    status: str = "unknown"                    # on_track | at_risk | overrun | unknown
+    reason: str = ""
+    channels: Dict[str, ChannelETA] = field(default_factory=dict)
+
+    @property
+    def will_overrun(self) -> bool:
+        return self.status in ("at_risk", "overrun")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典"""
+        def _fmt(d: Optional[datetime.date]) -> Optional[str]:
+            return d.strftime("%Y-%m-%d") if d else None
+
+        return {
+            'consumer_name': self.consumer_name,
+            'consumer_version': self.consumer_version,
+            'expected_end_date': _fmt(self.expected_end_date),
+            'predicted_end_date': _fmt(self.predicted_end_date),
+            'lower_bound_date': _fmt(self.lower_bound_date),
+            'upper_bound_date': _fmt(self.upper_bound_date),
+            'confidence': self.confidence,
+            'bottleneck_channel': self.bottleneck_channel,
+            'status': self.status,
+            'reason': self.reason,
+            'channels': {
+                name: {
+                    'version': est.version,
+                    'unit': est.unit,
+                    'target': est.target,
+                    'produced': est.produced,
+                    'remaining': est.remaining,
+                    'daily_rate': round(est.daily_rate, 2),
+                    'expected_days': round(est.expected_days, 1),
+                    'lower_days': round(est.lower_days, 1),
+                    'upper_days': round(est.upper_days, 1)
+                }
+                for name, est in self.channels.items()
+            }
+        }
+
+
+class ProductionETAModel:
+    """
+    基于吞吐量的ETA模型
+
+    每条产能记录表示某通道某天实际生产的数据量:
+        {channel, date, samples, size_gb, version(可选)}
+
+    设日产能服从 N(μ, σ²)，则 D 天累计产量近似 N(Dμ, Dσ²)。
+    令累计产量的置信上/下界等于剩余量 R，即 μx² ∓ zσx - R = 0 (x = √D)，
+    可直接解出预计完成天数及其置信区间。各通道并行生产，周期完成时间取最慢通道。
+    """
+
+    def __init__(self, db_helper: DatabaseQueryHelper,
+                 throughput_records: List[Dict[str, Any]],
+                 window_days: int = 30):
+        """
+        Args:
+            db_helper: 数据库查询助手，用于获取各通道版本的数据量
+            throughput_records: 历史产能记录
+            window_days: 统计产能时使用的最近天数窗口
+        """
+        self.db_helper = db_helper
+        self.window_days = window_days
+        self._records = [self._normalize_record(r) for r in throughput_records]
+
+    def predict(self, consumer_name: str, consumer_version: str,
+                start_date: datetime.date, expected_end_date: datetime.date,
+                resolved_versions: Dict[str, str], confidence: float = 0.9,
+                as_of: Optional[datetime.date] = None) -> ETAPrediction:
+        """
+        预测生产周期完成时间
+
+        Args:
+            consumer_name: 消费者名称
+            consumer_version: 消费者版本
+            start_date: 生产开始日期
+            expected_end_date: 计划完成日期
+            resolved_versions: Bundle解析后的 {channel: version}
+            confidence: 置信水平 (0-1)
+            as_of: 预测基准日期，默认今天
+
+        Returns:
+            ETAPrediction
+        """
+        as_of = as_of or datetime.date.today()
+        prediction = ETAPrediction(
+            consumer_name=consumer_name,
+            consumer_version=consumer_version,
+            expected_end_date=expected_end_date,
+            confidence=confidence
+        )
+
+        if not resolved_versions:
+            prediction.reason = "Bundle中没有可预测的通道"
+            return prediction
+
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        missing_history = []
+        unknown_volume = []
+
+        for channel, version in resolved_versions.items():
+            target = self._target_volume(channel, version)
+            if target is None:
+                # 数据库中没有该通道版本的数据量信息，无法参与预测
+                unknown_volume.append(channel)
+                continue
+            estimate = self._estimate_channel(channel, version, target, start_date, as_of, z)
+            if estimate is None:
+                missing_history.append(channel)
+            else:
+                prediction.channels[channel] = estimate
+
+        if missing_history:
+            prediction.reason = f"缺少历史产能数据: {', '.join(sorted(missing_history))}"
+            return prediction
+        if not prediction.channels:
+            prediction.reason = f"数据库中没有数据量信息: {', '.join(sorted(unknown_volume))}"
+            return prediction
+
+        # 生产尚未开始时从start_date起算
+        base_date = max(as_of, start_date)
+        bottleneck = max(prediction.channels.values(), key=lambda e: e.expected_days)
+
+        prediction.bottleneck_channel = bottleneck.channel
+        prediction.predicted_end_date = base_date + datetime.timedelta(
+            days=math.ceil(bottleneck.expected_days))
+        prediction.lower_bound_date = base_date + datetime.timedelta(
+            days=math.ceil(max(e.lower_days for e in prediction.channels.values())))
+        prediction.upper_bound_date = base_date + datetime.timedelta(
+            days=math.ceil(max(e.upper_days for e in prediction.channels.values())))
+
+        if prediction.predicted_end_date > expected_end_date:
+            prediction.status = "overrun"
+            prediction.reason = f"预计完成日期晚于计划 {(prediction.predicted_end_date - expected_end_date).days} 天"
+        elif prediction.upper_bound_date > expected_end_date:
+            prediction.status = "at_risk"
+            prediction.reason = f"置信上界超出计划 {(prediction.upper_bound_date - expected_end_date).days} 天"
+        else:
+            prediction.status = "on_track"
+
+        if unknown_volume:
+            note = f"未计入预测的通道: {', '.join(sorted(unknown_volume))}"
+            prediction.reason = f"{prediction.reason}; {note}" if prediction.reason else note
+
+        return prediction
+
+    def channel_rate(self, channel: str, unit: str, as_of: Optional[datetime.date] = None,
+                     version: Optional[str] = None) -> Optional[tuple]:
+        """
+        统计通道的日产能
+
+        观测期从窗口起点（或通道在窗口内的第一条记录）到产能数据的最新日期，期间没有产出的日子按0计入；
+        指定version时只统计该版本和未标注版本的记录，与已生产量的统计口径一致。
+
+        Returns:
+            (均值, 标准差, 统计天数)，无历史数据时返回None
+        """
+        as_of = as_of or datetime.date.today()
+        window_start = as_of - datetime.timedelta(days=self.window_days)
+
+        daily: Dict[datetime.date, float] = {}
+        for record in self._records:
+            if record['channel'] != channel:
+                continue
+            if not (window_start <= record['date'] <= as_of):
+                continue
+            if version is not None and record['version'] not in (None, version):
+                continue
+            daily[record['date']] = daily.get(record['date'], 0.0) + record[unit]
+
+        if not any(v > 0 for v in daily.values()):
+            return None
+
+        # 以所有通道中不晚于as_of的最新记录日期为观测终点，当天数据尚未上报时不算作0产出
+        last_day = max(r['date'] for r in self._records if r['date'] <= as_of)
+        first_day = min(daily)
+        rates = [daily.get(first_day + datetime.timedelta(days=offset), 0.0)
+                 for offset in range((last_day - first_day).days + 1)]
+
+        std = statistics.stdev(rates) if len(rates) > 1 else 0.0
+        return statistics.fmean(rates), std, len(rates)
+
+    def _target_volume(self, channel: str, version: str) -> Optional[tuple]:
+        """
+        查询通道版本需要生产的数据总量
+
+        Returns:
+            (单位, 总量)，优先使用样本数，数据库没有样本数时退化为数据量(GB)
+        """
+        availability = self.db_helper.query_data_availability(channel, version)
+
+        if availability.get('sample_count'):
+            return 'samples', float(availability['sample_count'])
+        if availability.get('size_gb'):
+            return 'size_gb', float(availability['size_gb'])
+        return None
+
+    def _estimate_channel(self, channel: str, version: str, target_volume: tuple,
+                          start_date: datetime.date, as_of: datetime.date,
+                          z: float) -> Optional[ChannelETA]:
+        """估计单个通道的剩余生产天数"""
+        unit, target = target_volume
+
+        stats = self.channel_rate(channel, unit, as_of, version)
+        if stats is None:
+            return None
+        mean, std, days = stats
+
+        produced = sum(
+            r[unit] for r in self._records
+            if r['channel'] == channel
+            and start_date <= r['date'] <= as_of
+            and r['version'] in (None, version)
+        )
+        remaining = max(0.0, target - produced)
+
+        return ChannelETA(
+            channel=channel,
+            version=version,
+            unit=unit,
+            target=target,
+            produced=produced,
+            daily_rate=mean,
+            daily_rate_std=std,
+            history_days=days,
+            expected_days=remaining / mean,
+            lower_days=self._solve_days(remaining, mean, std, z),
+            upper_days=self._solve_days(remaining, mean, std, -z)
+        )
+
+    @staticmethod
+    def _solve_days(remaining: float, mean: float, std: float, z: float) -> float:
+        """求解 mean*x^2 + z*std*x - remaining = 0 的正根 x，返回天数 x^2"""
+        if remaining <= 0:
+            return 0.0
+        zs = z * std
+        discriminant = zs * zs + 4 * mean * remaining
+        x = (-zs + math.sqrt(discriminant)) / (2 * mean)
+        return x * x
+
+    @staticmethod
+    def _normalize_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """规范化产能记录"""
+        date = record['date']
+        if isinstance(date, str):
+            date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        return {
+            'channel': record['channel'],
+            'date': date,
+            'samples': float(record.get('samples', 0) or 0),
+            'size_gb': float(record.get('size_gb', 0) or 0),
+            'version': record.get('version')
+        }
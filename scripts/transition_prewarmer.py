@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+版本切换预热执行器 - 在计划切换日期之前把目标bundle的数据预取到训练节点本地磁盘
+只预取与当前bundle不同的通道，并按带宽上限限速，避免切换当天所有节点同时冷读数据
+"""
+
+import os
+import sys
+import time
+import socket
+import shutil
+import datetime
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import yaml
+
+from production_cycle_manager import ProductionCycleManager
+from database_query_helper import DatabaseQueryHelper
+
+# 预热完成标记文件
+COMPLETE_MARKER = ".prewarm_complete"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BandwidthLimiter:
+    """令牌桶限速器"""
+
+    def __init__(self, bandwidth_mbps: Optional[float]):
+        """
+        Args:
+            bandwidth_mbps: 带宽上限 (MB/s)，None或0表示不限速
+        """
+        self.rate = bandwidth_mbps * 1024 * 1024 if bandwidth_mbps else None
+        self.capacity = self.rate  # 最多积累1秒的突发流量
+        self.tokens = self.capacity or 0.0
+        self.last_refill = time.monotonic()
+
+    def consume(self, nbytes: int):
+        """消耗nbytes的带宽，超出上限时阻塞等待"""
+        if not self.rate:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+        self.tokens -= nbytes
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+
+
+class TransitionPrewarmer:
+    """版本切换预热执行器"""
+
+    def __init__(self, workspace_root: str = ".", cache_dir: str = "/data/local_cache",
+                 bandwidth_mbps: Optional[float] = None, lead_days: int = 2):
+        """
+        Args:
+            workspace_root: 工作空间根目录
+            cache_dir: 训练节点本地缓存目录
+            bandwidth_mbps: 预取带宽上限 (MB/s)
+            lead_days: 提前多少天开始预热
+        """
+        self.workspace_root = Path(workspace_root)
+        self.cache_dir = Path(cache_dir)
+        self.bandwidth_mbps = bandwidth_mbps
+        self.lead_days = lead_days
+        self.cycle_manager = ProductionCycleManager(workspace_root)
+        self._db_helper = None
+
+    @property
+    def db_helper(self) -> DatabaseQueryHelper:
+        if self._db_helper is None:
+            self._db_helper = DatabaseQueryHelper(str(self.workspace_root))
+        return self._db_helper
+
+    def get_pending_transitions(self, as_of: Optional[datetime.date] = None) -> List[Dict]:
+        """
+        获取进入预热窗口的切换计划
+
+        Args:
+            as_of: 基准日期，默认今天
+        """
+        as_of = as_of or datetime.date.today()
+        pending = []
+
+        for transition in self.cycle_manager._load_transitions():
+            if transition.get('status') != 'scheduled':
+                continue
+            transition_date = self._parse_date(transition['transition_date'])
+            if transition_date - datetime.timedelta(days=self.lead_days) <= as_of:
+                pending.append(transition)
+
+        return pending
+
+    def plan_transition(self, transition: Dict) -> Dict[str, Any]:
+        """
+        计算切换需要预取的通道
+
+        Returns:
+            {'to_bundle', 'from_bundle', 'channels': {channel: {version, source, target}}, 'unchanged': [...]}
+        """
+        consumer = transition['consumer_name']
+        from_bundle = transition.get('from_bundle') or self.cycle_manager.get_cycle_bundle(
+            consumer, transition['from_version'])
+        to_bundle = transition.get('to_bundle') or self.cycle_manager.get_cycle_bundle(
+            consumer, transition['to_version'], prefer_next=True)
+
+        if not to_bundle:
+            raise ValueError(f"找不到目标版本的bundle: {consumer}@{transition['to_version']}")
+
+        from_versions = self.cycle_manager.get_bundle_resolved_versions(from_bundle) if from_bundle else {}
+        to_versions = self.cycle_manager.get_bundle_resolved_versions(to_bundle)
+
+        changed = {channel: version for channel, version in to_versions.items()
+                   if from_versions.get(channel) != version}
+        data_paths = self.db_helper.query_production_data_paths(changed)
+
+        plan = {
+            'from_bundle': from_bundle,
+            'to_bundle': to_bundle,
+            'channels': {},
+            'unchanged': sorted(set(to_versions) - set(changed))
+        }
+        for channel, version in changed.items():
+            plan['channels'][channel] = {
+                'version': version,
+                'source': data_paths.get(channel, ''),
+                'target': str(self._channel_cache_dir(channel, version))
+            }
+        return plan
+
+    def prewarm_transition(self, transition: Dict) -> Dict[str, Any]:
+        """
+        预取单个切换计划的数据到本地缓存
+
+        Returns:
+            预热结果报告
+        """
+        plan = self.plan_transition(transition)
+        limiter = BandwidthLimiter(self.bandwidth_mbps)
+        report = {'prewarmed': [], 'cached': [], 'failed': {}, 'bytes_copied': 0}
+
+        for channel, info in plan['channels'].items():
+            target = Path(info['target'])
+            if (target / COMPLETE_MARKER).exists():
+                report['cached'].append(channel)
+                continue
+
+            # data_path为空时 Path('') 会变成当前目录，必须先排除
+            source_path = (info['source'] or '').strip()
+            if not source_path:
+                report['failed'][channel] = '数据路径未知'
+                continue
+            source = Path(source_path)
+            if source_path.startswith('ERROR') or not source.exists():
+                report['failed'][channel] = source_path
+                continue
+
+            try:
+                report['bytes_copied'] += self._copy_tree(source, target, limiter)
+                (target / COMPLETE_MARKER).write_text(
+                    datetime.datetime.now().isoformat(), encoding='utf-8')
+                report['prewarmed'].append(channel)
+            except OSError as e:
+                report['failed'][channel] = str(e)
+
+        self._record_node_state(transition, plan, report)
+        return report
+
+    def prewarm_pending(self, as_of: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+        """预热所有进入预热窗口的切换计划"""
+        results = []
+        for transition in self.get_pending_transitions(as_of):
+            label = f"{transition['consumer_name']}: {transition['from_version']} -> {transition['to_version']}"
+            print(f"🔥 预热切换: {label} (计划日期: {transition['transition_date']})")
+            try:
+                report = self.prewarm_transition(transition)
+            except ValueError as e:
+                print(f"   ❌ {e}")
+                continue
+
+            print(f"   新预取: {len(report['prewarmed'])} | 已缓存: {len(report['cached'])} | "
+                  f"失败: {len(report['failed'])} | 传输: {report['bytes_copied'] / 1024 ** 3:.2f} GB")
+            for channel, reason in report['failed'].items():
+                print(f"   ❌ {channel}: {reason}")
+            results.append({'transition': transition, 'report': report})
+        return results
+
+    def execute_due_transitions(self, as_of: Optional[datetime.date] = None) -> List[Dict]:
+        """
+        执行已到切换日期的计划，标记为completed
+        本节点缓存未完成的通道会给出警告（切换后这些通道将从远端读取）
+        """
+        as_of = as_of or datetime.date.today()
+        transitions = self.cycle_manager._load_transitions()
+        executed = []
+
+        for transition in transitions:
+            if transition.get('status') != 'scheduled':
+                continue
+            if self._parse_date(transition['transition_date']) > as_of:
+                continue
+
+            try:
+                plan = self.plan_transition(transition)
+                cold = [c for c, info in plan['channels'].items()
+                        if not (Path(info['target']) / COMPLETE_MARKER).exists()]
+            except ValueError as e:
+                print(f"⚠️  {e}")
+                cold = []
+            if cold:
+                print(f"⚠️  以下通道未完成预热，将从远端读取: {', '.join(cold)}")
+
+            transition['status'] = 'completed'
+            transition['executed_at'] = datetime.datetime.now().isoformat()
+            executed.append(transition)
+            print(f"✅ 已执行切换: {transition['consumer_name']} "
+                  f"{transition['from_version']} -> {transition['to_version']}")
+
+        if executed:
+            self.cycle_manager._save_transitions(transitions)
+        return executed
+
+    def _channel_cache_dir(self, channel: str, version: str) -> Path:
+        """通道版本的本地缓存目录"""
+        return self.cache_dir / channel / f"v{version}"
+
+    def _copy_tree(self, source: Path, target: Path, limiter: BandwidthLimiter) -> int:
+        """限速复制目录，已存在且大小一致的文件跳过，返回复制的字节数"""
+        copied = 0
+        files = [source] if source.is_file() else sorted(p for p in source.rglob('*') if p.is_file())
+
+        for src_file in files:
+            rel = src_file.name if source.is_file() else src_file.relative_to(source)
+            dst_file = target / rel
+            if dst_file.exists() and dst_file.stat().st_size == src_file.stat().st_size:
+                continue
+
+            dst_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = dst_file.with_name(dst_file.name + ".partial")
+            with open(src_file, 'rb') as fin, open(tmp_file, 'wb') as fout:
+                while True:
+                    chunk = fin.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    limiter.consume(len(chunk))
+                    fout.write(chunk)
+                    copied += len(chunk)
+            shutil.copystat(src_file, tmp_file)
+            os.replace(tmp_file, dst_file)
+
+        return copied
+
+    def _record_node_state(self, transition: Dict, plan: Dict, report: Dict):
+        """记录本节点的预热状态（保存在本地缓存目录，不修改共享的切换计划）"""
+        state_file = self.cache_dir / ".prewarm_state.yaml"
+        state = {}
+        if state_file.exists():
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = yaml.safe_load(f) or {}
+
+        key = f"{transition['consumer_name']}:{transition['from_version']}->{transition['to_version']}"
+        state[key] = {
+            'hostname': socket.gethostname(),
+            'to_bundle': plan['to_bundle'],
+            'transition_date': str(transition['transition_date']),
+            'updated_at': datetime.datetime.now().isoformat(),
+            'ready': not report['failed'],
+            'channels': sorted(plan['channels']),
+            'failed': report['failed']
+        }
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(state_file, 'w', encoding='utf-8') as f:
+            yaml.dump(state, f, default_flow_style=False, allow_unicode=True)
+
+    @staticmethod
+    def _parse_date(value) -> datetime.date:
+        if isinstance(value, datetime.date):
+            return value
+        return datetime.datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def main():
+    """命令行接口"""
+    parser = argparse.ArgumentParser(description="版本切换预热执行器")
+    parser.add_argument('--workspace', default='.', help='工作空间根目录')
+    parser.add_argument('--cache-dir', default='/data/local_cache', help='训练节点本地缓存目录')
+    parser.add_argument('--lead-days', type=int, default=2, help='提前预热天数 (默认: 2)')
+    subparsers = parser.add_subparsers(dest='command', help='命令')
+
+    # 查看预热计划
+    subparsers.add_parser('plan', help='查看进入预热窗口的切换计划')
+
+    # 执行预热
+    prewarm_parser = subparsers.add_parser('prewarm', help='预取目标bundle数据到本地缓存')
+    prewarm_parser.add_argument('--bandwidth-mbps', type=float, help='带宽上限 (MB/s)')
+
+    # 执行切换
+    subparsers.add_parser('execute', help='执行已到期的切换计划')
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        return
+
+    try:
+        prewarmer = TransitionPrewarmer(
+            args.workspace, args.cache_dir,
+            getattr(args, 'bandwidth_mbps', None), args.lead_days
+        )
+
+        if args.command == 'plan':
+            transitions = prewarmer.get_pending_transitions()
+            if not transitions:
+                print("✅ 没有进入预热窗口的切换计划")
+            for transition in transitions:
+                plan = prewarmer.plan_transition(transition)
+                print(f"📋 {transition['consumer_name']}: {transition['from_version']} -> "
+                      f"{transition['to_version']} ({transition['transition_date']})")
+                print(f"   目标bundle: {plan['to_bundle']}")
+                for channel, info in plan['channels'].items():
+                    print(f"   • {channel}@{info['version']}: {info['source']} -> {info['target']}")
+                if plan['unchanged']:
+                    print(f"   未变化通道: {', '.join(plan['unchanged'])}")
+
+        elif args.command == 'prewarm':
+            prewarmer.prewarm_pending()
+
+        elif args.command == 'execute':
+            if not prewarmer.execute_due_transitions():
+                print("✅ 没有到期的切换计划")
+
+    except Exception as e:
+        print(f"❌ 错误: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()